@@ -166,7 +166,7 @@ export const invoices = sqliteTable('invoices', {
   itemName: text('item_name'),
   remark: text('remark'),
   issuer: text('issuer'),
-  parseSource: text('parse_source'),       // metadata / textlayer / both / none
+  parseSource: text('parse_source'),       // metadata / template / ofd / xml / textlayer / both / none
   sourceFilePath: text('source_file_path'),
 }, (table) => ({
   batchIdIdx: index('idx_invoice_batch_id').on(table.batchId),
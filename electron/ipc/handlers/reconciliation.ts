@@ -827,11 +827,27 @@ async function handleExportInvoicesExcel(
   params: { folderPath: string; outputPath?: string }
 ) {
   try {
-    const { batchParsePdfInvoices, exportInvoicesToExcel } = await import('../../services/invoiceParseService')
+    const { parseAndExportInvoicesToExcel } = await import('../../services/invoiceParseService')
 
-    // 先解析
-    const parseResult = await batchParsePdfInvoices(
+    // 确定输出路径
+    let outputPath = params.outputPath
+    if (!outputPath) {
+      // 自动保存到发票文件夹同级，不弹框提示
+      const now = new Date()
+      // 格式：YYYY-MM-DD_HH-mm-ss
+      const dateStr = now.getFullYear() + '-' +
+        String(now.getMonth() + 1).padStart(2, '0') + '-' +
+        String(now.getDate()).padStart(2, '0') + '_' +
+        String(now.getHours()).padStart(2, '0') + '-' +
+        String(now.getMinutes()).padStart(2, '0') + '-' +
+        String(now.getSeconds()).padStart(2, '0')
+      outputPath = path.join(params.folderPath, `发票清单_${dateStr}.xlsx`)
+    }
+
+    // 流式解析：每批解析出的发票直接写入 Excel，不等整批解析结束
+    const { parseResult, ...exportResult } = await parseAndExportInvoicesToExcel(
       params.folderPath,
+      outputPath,
       (current, total, fileName) => {
         sendProgress(RECONCILIATION_CHANNELS.PROGRESS, {
           type: 'parse_pdf_invoices',
@@ -842,7 +858,7 @@ async function handleExportInvoicesExcel(
       }
     )
 
-    if (!parseResult.success || parseResult.invoices.length === 0) {
+    if (parseResult.successCount === 0) {
       // Include error details from parseResult for better debugging
       const errorDetails = parseResult.errors && parseResult.errors.length > 0
         ? ': ' + parseResult.errors.map(e => e.error).join('; ')
@@ -850,28 +866,9 @@ async function handleExportInvoicesExcel(
       return { success: false, error: '没有成功解析任何发票' + errorDetails, parseResult }
     }
 
-    // 确定输出路径
-    let outputPath = params.outputPath
-    if (!outputPath) {
-      // 自动保存到发票文件夹同级，不弹框提示
-      const now = new Date()
-      // 格式：YYYY-MM-DD_HH-mm-ss
-      const dateStr = now.getFullYear() + '-' +
-        String(now.getMonth() + 1).padStart(2, '0') + '-' +
-        String(now.getDate()).padStart(2, '0') + '_' +
-        String(now.getHours()).padStart(2, '0') + '-' +
-        String(now.getMinutes()).padStart(2, '0') + '-' +
-        String(now.getSeconds()).padStart(2, '0')
-      outputPath = path.join(params.folderPath, `发票清单_${dateStr}.xlsx`)
-    }
-
-    // 导出 Excel
-    const exportResult = await exportInvoicesToExcel(parseResult.invoices, outputPath)
-
     console.log('exportResult', exportResult)
     return {
       ...exportResult,
-      invoices: parseResult.invoices,  // 返回解析后的发票数据供前端直接入库
       parseResult: {
         totalFiles: parseResult.totalFiles,
         successCount: parseResult.successCount,
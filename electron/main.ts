@@ -4,6 +4,7 @@ import { fileURLToPath } from 'node:url'
 import { configStore, updateWindowState } from './config/store'
 import { closeDatabase } from './database'
 import { registerAllIpcHandlers } from './ipc'
+import { pythonService } from './services/pythonService'
 import { ensureAppDirs } from './utils/paths'
 
 const __dirname = path.dirname(fileURLToPath(import.meta.url))
@@ -167,5 +168,8 @@ app.on('before-quit', () => {
   // 关闭数据库连接
   closeDatabase()
 
+  // 停止常驻 Python 解析进程
+  pythonService.stopDaemon()
+
   console.log('[App] Cleanup done')
 })
@@ -464,7 +464,6 @@ contextBridge.exposeInMainWorld('electron', {
     exportInvoicesExcel: (folderPath: string, outputPath?: string): Promise<{
       success: boolean
       filePath?: string
-      invoices?: any[]
       parseResult?: {
         totalFiles: number
         successCount: number
@@ -0,0 +1,245 @@
+"""
+Invoice inputs packed in zip bundles and .eml mail exports.
+
+Nothing is unpacked into the workspace. A member is addressed by the archive
+on disk plus the member names leading to it (zip in eml in zip ...), printed
+as `bundle.zip!/inner.zip!/a.pdf`, which is what ends up in
+InvoiceInfo.file_path. ArchiveMember is only that locator, so it pickles
+cheaply to pool workers, and each process opens the members it parses.
+
+Opening a member gives pdfplumber / the OFD-XML readers an in-memory
+BytesIO. Members larger than spill_bytes are copied to a temp file instead,
+and the file is removed when the parse is done. Nested archives go through
+the same rule and the last few opened ones are kept, since files of one
+bundle are parsed one after another.
+"""
+import email
+import io
+import multiprocessing.util
+import os
+import posixpath
+import shutil
+import tempfile
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from email import policy
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple, Union
+
+ARCHIVE_EXTENSIONS = (".zip", ".eml")
+MEMBER_SEP = "!/"
+DEFAULT_SPILL_MB = 32
+# Archives nested deeper than this are ignored (zip bombs, mail loops)
+MAX_DEPTH = 4
+# Opened archives kept per process
+OPEN_ARCHIVES = 4
+
+Source = Union[str, IO[bytes]]
+
+
+def is_archive(file_name: str) -> bool:
+    return file_name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class ArchiveMember:
+    """A file inside a zip / eml, possibly nested: the archive path plus the member names down to it."""
+    __slots__ = ("archive", "chain", "spill_bytes")
+
+    def __init__(self, archive: str, chain: Tuple[str, ...], spill_bytes: int = DEFAULT_SPILL_MB << 20):
+        self.archive = archive
+        self.chain = chain
+        self.spill_bytes = spill_bytes
+
+    @property
+    def path(self) -> str:
+        return self.archive + "".join(MEMBER_SEP + name for name in self.chain)
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.chain[-1])
+
+    def __repr__(self) -> str:
+        return f"ArchiveMember({self.path!r})"
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _zip_name(info: zipfile.ZipInfo) -> str:
+    """Names from Chinese Windows zip tools are GBK without the UTF-8 flag; zipfile reads them as cp437."""
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode("cp437").decode("gbk")
+    except UnicodeError:
+        return info.filename
+
+
+def _unique(names: Dict[str, object], name: str) -> str:
+    stem, ext = posixpath.splitext(name)
+    n = 1
+    while name in names:
+        n += 1
+        name = f"{stem}~{n}{ext}"
+    return name
+
+
+class _Archive:
+    """An opened zip or eml: member name -> (size, opener)."""
+
+    def __init__(self, name: str, source: Source, spill_path: Optional[str] = None):
+        self.spill_path = spill_path
+        self.zip: Optional[zipfile.ZipFile] = None
+        self.members: Dict[str, Tuple[int, Callable[[], IO[bytes]]]] = {}
+        try:
+            if name.lower().endswith(".eml"):
+                self._open_eml(source)
+            else:
+                self.zip = zipfile.ZipFile(source)
+                for info in self.zip.infolist():
+                    if not info.is_dir():
+                        self.members[_unique(self.members, _zip_name(info))] = (
+                            info.file_size, lambda info=info: self.zip.open(info))
+        except BaseException:
+            self.close()
+            raise
+
+    def _open_eml(self, source: Source):
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                msg = email.message_from_binary_file(f, policy=policy.default)
+        else:
+            msg = email.message_from_binary_file(source, policy=policy.default)
+        # walk() also descends into attached messages (message/rfc822)
+        for part in msg.walk():
+            file_name = part.get_filename()
+            if part.is_multipart() or not file_name:
+                continue
+            data = part.get_payload(decode=True) or b""
+            self.members[_unique(self.members, posixpath.basename(file_name.replace("\\", "/")))] = (
+                len(data), lambda data=data: io.BytesIO(data))
+
+    def materialize(self, name: str, spill_bytes: int) -> Tuple[Source, Optional[str]]:
+        """(source, temp path to remove): a BytesIO, or a temp file path above spill_bytes."""
+        size, opener = self.members[name]
+        with opener() as src:
+            if size <= spill_bytes:
+                return io.BytesIO(src.read()), None
+            fd, tmp = tempfile.mkstemp(prefix="invoice-member-", suffix=posixpath.splitext(name)[1])
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    shutil.copyfileobj(src, out)
+            except BaseException:
+                _remove(tmp)
+                raise
+            return tmp, tmp
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+        if self.spill_path:
+            _remove(self.spill_path)
+
+
+_open_archives: "OrderedDict[Tuple[str, Tuple[str, ...]], _Archive]" = OrderedDict()
+_cleanup_pid: Optional[int] = None
+
+
+def _archive(path: str, chain: Tuple[str, ...], spill_bytes: int) -> _Archive:
+    _own_archives()
+    key = (path, chain)
+    opened = _open_archives.get(key)
+    if opened is not None:
+        _open_archives.move_to_end(key)
+        return opened
+    if chain:
+        source, spill = _archive(path, chain[:-1], spill_bytes).materialize(chain[-1], spill_bytes)
+        try:
+            opened = _Archive(chain[-1], source, spill)
+        except BaseException:
+            if spill:
+                _remove(spill)
+            raise
+    else:
+        opened = _Archive(path, path)
+    _open_archives[key] = opened
+    while len(_open_archives) > OPEN_ARCHIVES:
+        _open_archives.popitem(last=False)[1].close()
+    return opened
+
+
+def close_archives():
+    while _open_archives:
+        _open_archives.popitem()[1].close()
+
+
+def _own_archives():
+    """
+    Per-process archive cache. A forked worker drops the parent's entries
+    (their file offsets and spill files belong to the parent) and closes its
+    own on exit.
+    """
+    global _cleanup_pid
+    if _cleanup_pid != os.getpid():
+        _cleanup_pid = os.getpid()
+        _open_archives.clear()
+        # Unlike atexit, also runs in pool workers, which leave through os._exit
+        multiprocessing.util.Finalize(None, close_archives, exitpriority=0)
+
+
+@contextmanager
+def open_member(member: ArchiveMember) -> Iterator[Source]:
+    """The member as a BytesIO, or as a temp file path that is removed on exit."""
+    source, spill = _archive(member.archive, member.chain[:-1], member.spill_bytes).materialize(
+        member.chain[-1], member.spill_bytes)
+    try:
+        yield source
+    finally:
+        if spill:
+            _remove(spill)
+
+
+def list_inputs(
+    path: str,
+    extensions: Tuple[str, ...],
+    spill_bytes: int = DEFAULT_SPILL_MB << 20,
+) -> Tuple[List[Tuple[str, Union[str, ArchiveMember]]], Dict[str, str]]:
+    """
+    Files to parse under a folder, or inside a single zip / eml.
+
+    Returns ([(name, entry)], {name: error}) in sorted order. entry is a
+    path for plain files and an ArchiveMember for files in archives; name
+    is relative to the folder (`bundle.zip!/a.pdf`). Archives that cannot
+    be opened are reported in the error map under their own name.
+    """
+    entries: List[Tuple[str, Union[str, ArchiveMember]]] = []
+    errors: Dict[str, str] = {}
+
+    def walk(archive: str, chain: Tuple[str, ...], name: str):
+        try:
+            members = sorted(_archive(archive, chain, spill_bytes).members)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile, zipfile.LargeZipFile) as e:
+            errors[name] = f"Unreadable archive: {e or type(e).__name__}"
+            entries.append((name, archive))
+            return
+        for member in members:
+            lower = member.lower()
+            if lower.endswith(ARCHIVE_EXTENSIONS):
+                if len(chain) < MAX_DEPTH:
+                    walk(archive, chain + (member,), name + MEMBER_SEP + member)
+            elif lower.endswith(extensions):
+                entries.append((name + MEMBER_SEP + member, ArchiveMember(archive, chain + (member,), spill_bytes)))
+
+    if os.path.isdir(path):
+        for f in sorted(os.listdir(path)):
+            if is_archive(f):
+                walk(os.path.join(path, f), (), f)
+            elif f.lower().endswith(extensions):
+                entries.append((f, os.path.join(path, f)))
+    else:
+        walk(path, (), os.path.basename(path))
+    return entries, errors
@@ -0,0 +1,328 @@
+"""
+Chunked bank transaction import for `main.py import_bank`.
+
+Python counterpart of parseBankTransactions in parseService.ts for exports
+too large to load whole: xlsx is read row by row with openpyxl's read-only
+mode, csv with the csv module, and rows are handed on in chunks of
+`chunk_size`. The header row is found once in the first rows (the same
+keyword score as smartReadSheet), the field -> column mapping is fixed from
+it, and each chunk is normalized with vectorized pandas operations that
+mirror normalizeName / normalizeAmount / normalizeDate.
+
+Output records use the camelCase fields of ParsedBankTransaction; `row` is
+the 1-based row number in the sheet.
+"""
+import csv
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+# Same lists and order as BANK_FIELD_MAPPINGS in parseService.ts
+BANK_FIELD_MAPPINGS: Dict[str, List[str]] = {
+    "transactionDate": ["交易日期", "日期", "记账日期", "Date", "Transaction Date", "交易时间"],
+    "payerName": ["对方户名", "交易对手", "付款人", "收款人", "对方名称", "Payer", "Counterparty"],
+    "payerAccount": ["对方账号", "账号", "对方账户", "Account"],
+    "amount": ["交易金额", "金额", "发生额", "收入", "支出", "Amount"],
+    "remark": ["备注", "摘要", "附言", "用途", "Remark", "Memo"],
+    "transactionNo": ["流水号", "交易流水号", "凭证号", "Transaction No"],
+}
+HEADER_SCAN_ROWS = 30
+DEFAULT_CHUNK_SIZE = 5000
+CSV_ENCODINGS = ("utf-8-sig", "gb18030")
+
+_KEYWORDS = [k.lower() for keys in BANK_FIELD_MAPPINGS.values() for k in keys]
+# Excel serial day of 1970-01-01
+_EXCEL_EPOCH = 25569
+# parseFloat: the longest numeric prefix
+_FLOAT_PREFIX = r'^\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)'
+
+
+# ============================================
+# READERS (raw rows)
+# ============================================
+
+def _iter_xlsx(path: str, sheet: Optional[str]) -> Tuple[Iterator[tuple], Optional[int], Any]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    ws = wb[sheet] if sheet else wb.worksheets[0]
+    # max_row comes from the sheet's <dimension>, which some exporters omit
+    return ws.iter_rows(values_only=True), ws.max_row, wb
+
+
+def _csv_encoding(path: str) -> str:
+    with open(path, "rb") as f:
+        head = f.read(1 << 16)
+    for encoding in CSV_ENCODINGS:
+        try:
+            head.decode(encoding)
+            return encoding
+        except UnicodeDecodeError as e:
+            # A multi-byte char cut off at the end of the sample is fine
+            if e.start >= len(head) - 4:
+                return encoding
+    return CSV_ENCODINGS[-1]
+
+
+def _iter_csv(path: str) -> Tuple[Iterator[list], None, Any]:
+    f = open(path, "r", encoding=_csv_encoding(path), newline="")
+    return csv.reader(f), None, f
+
+
+# ============================================
+# HEADER
+# ============================================
+
+def find_header(rows: List[tuple]) -> int:
+    """Index of the row matching the most mapping keywords (first wins on ties), like smartReadSheet."""
+    best, best_score = 0, 0
+    for i, row in enumerate(rows[:HEADER_SCAN_ROWS]):
+        cells = [str(c).lower() for c in row if c is not None and c != '']
+        score = sum(1 for kw in _KEYWORDS if any(kw in cell for cell in cells))
+        if score > best_score:
+            best, best_score = i, score
+    return best
+
+
+def map_columns(header: tuple) -> Dict[str, List[int]]:
+    """
+    Candidate columns per field in extractField order: for each alias the
+    exact header, then case-insensitive matches.
+    """
+    names = ['' if h is None else str(h) for h in header]
+    mapping: Dict[str, List[int]] = {}
+    for field, aliases in BANK_FIELD_MAPPINGS.items():
+        cols: List[int] = []
+        for alias in aliases:
+            for i, name in enumerate(names):
+                if name == alias and i not in cols:
+                    cols.append(i)
+            for i, name in enumerate(names):
+                if name.lower() == alias.lower() and i not in cols:
+                    cols.append(i)
+        mapping[field] = cols
+    return mapping
+
+
+# ============================================
+# VECTORIZED NORMALIZATION
+# ============================================
+
+def _blank_to_na(s: pd.Series) -> pd.Series:
+    return s.where(s.notna() & (s.astype(str) != ''), None)
+
+
+def _coalesce(frame: pd.DataFrame, cols: List[int]) -> pd.Series:
+    """First non-empty value across `cols` per row (extractField)."""
+    out = pd.Series([None] * len(frame), index=frame.index, dtype=object)
+    for c in cols:
+        if c < frame.shape[1]:
+            out = out.where(out.notna(), _blank_to_na(frame[c]))
+    return out
+
+
+def _is_number(s: pd.Series) -> pd.Series:
+    return s.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+
+
+def normalize_names(s: pd.Series) -> pd.Series:
+    text = s.where(s.notna(), '').astype(str)
+    return (text.str.strip()
+            .str.replace(r'\s+', '', regex=True)
+            .str.replace('（', '(', regex=False)
+            .str.replace('）', ')', regex=False)
+            .str.replace(r'[·•]', '', regex=True))
+
+
+def normalize_amounts(s: pd.Series) -> pd.Series:
+    numeric = _is_number(s)
+    out = pd.to_numeric(s.where(numeric), errors='coerce')
+    text = s.where(~numeric & s.notna(), '').astype(str)
+    cleaned = text.str.replace(r'[¥$€￥,，]', '', regex=True).str.strip()
+    parsed = pd.to_numeric(cleaned.str.extract(_FLOAT_PREFIX, expand=False), errors='coerce')
+    return out.fillna(parsed).abs().fillna(0.0)
+
+
+def normalize_dates(s: pd.Series) -> pd.Series:
+    """ISO yyyy-mm-dd strings (None when unparseable), same formats as normalizeDate."""
+    out = pd.Series([None] * len(s), index=s.index, dtype=object)
+
+    is_dt = s.map(lambda v: hasattr(v, 'strftime'))
+    if is_dt.any():
+        out[is_dt] = s[is_dt].map(lambda v: v.strftime('%Y-%m-%d'))
+
+    # 0 and NaN are falsy in normalizeDate
+    numeric = _is_number(s) & s.map(lambda v: bool(v) and v == v)
+    if numeric.any():
+        days = pd.to_numeric(s[numeric]).astype(float).floordiv(1) - _EXCEL_EPOCH
+        dates = pd.to_datetime(days, unit='D', errors='coerce')
+        out[numeric] = dates.dt.strftime('%Y-%m-%d').where(dates.notna(), None)
+
+    is_text = s.map(lambda v: isinstance(v, str)) & ~is_dt
+    if is_text.any():
+        text = s[is_text].str.strip()
+        iso = pd.Series([None] * len(text), index=text.index, dtype=object)
+        for pattern, order in (
+            (r'^(\d{4})-(\d{2})-(\d{2})$', (0, 1, 2)),
+            (r'^(\d{4})/(\d{2})/(\d{2})$', (0, 1, 2)),
+            (r'^(\d{4})(\d{2})(\d{2})$', (0, 1, 2)),
+            (r'^(\d{2})[-/](\d{2})[-/](\d{4})$', (2, 0, 1)),
+        ):
+            parts = text.str.extract(pattern)
+            hit = parts[0].notna() & iso.isna()
+            if hit.any():
+                y, m, d = (parts.loc[hit, k] for k in order)
+                iso[hit] = y + '-' + m + '-' + d
+        # Anything else: the generic parser (new Date(cleaned))
+        rest = iso.isna() & (text != '')
+        iso_dates = pd.to_datetime(iso, format='%Y-%m-%d', errors='coerce')
+        if rest.any():
+            iso_dates[rest] = _parse_loose(text[rest])
+        out[is_text] = iso_dates.dt.strftime('%Y-%m-%d').where(iso_dates.notna(), None)
+    return out
+
+
+def _parse_loose(text: pd.Series) -> pd.Series:
+    try:
+        parsed = pd.to_datetime(text, errors='coerce', format='mixed')
+        if getattr(parsed.dt, 'tz', None) is not None:
+            parsed = parsed.dt.tz_localize(None)
+        return parsed
+    except (TypeError, ValueError):
+        # Mixed time zones and the like: one value at a time
+        def one(v):
+            ts = pd.to_datetime(v, errors='coerce')
+            return ts.tz_localize(None) if ts is not pd.NaT and ts.tzinfo else ts
+        return pd.to_datetime(text.map(one), errors='coerce')
+
+
+def _to_text(s: pd.Series) -> pd.Series:
+    """value?.toString() || null, with whole floats printed without '.0' as JS does."""
+    def text(v):
+        if v is None or (isinstance(v, float) and v != v):
+            return None
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)
+        v = str(v)
+        return v or None
+    return s.map(text)
+
+
+# ============================================
+# IMPORTER
+# ============================================
+
+class BankImporter:
+    def __init__(self, file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE, sheet: Optional[str] = None):
+        self.file_path = file_path
+        self.chunk_size = max(1, chunk_size)
+        self.sheet = sheet
+
+    def _open(self):
+        ext = os.path.splitext(self.file_path)[1].lower()
+        if ext == ".csv":
+            return _iter_csv(self.file_path)
+        if ext == ".xlsx":
+            return _iter_xlsx(self.file_path, self.sheet)
+        raise ValueError(f"不支持的文件格式: {ext}")
+
+    @staticmethod
+    def normalize_chunk(rows: List[tuple], row_numbers: List[int], columns: Dict[str, List[int]]) -> pd.DataFrame:
+        frame = pd.DataFrame.from_records(rows) if rows else pd.DataFrame(index=range(0))
+        raw = {field: _coalesce(frame, cols) for field, cols in columns.items()}
+        return pd.DataFrame({
+            "row": row_numbers,
+            "transactionDate": normalize_dates(raw["transactionDate"]),
+            "payerName": normalize_names(raw["payerName"]),
+            "payerAccount": _to_text(raw["payerAccount"]),
+            "amount": normalize_amounts(raw["amount"]),
+            "remark": _to_text(raw["remark"]),
+            "transactionNo": _to_text(raw["transactionNo"]),
+        }, index=frame.index)
+
+    def run(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Yields ("header", {...}) once, then per chunk ("rows", valid frame),
+        ("errors", [...]) and ("progress", {...}), then ("summary", {...}).
+        """
+        start = time.perf_counter()
+        rows_iter, total, handle = self._open()
+        try:
+            # Header detection only needs the first rows
+            head: List[tuple] = []
+            for row in rows_iter:
+                head.append(row)
+                if len(head) >= HEADER_SCAN_ROWS:
+                    break
+            header_idx = find_header(head)
+            header = head[header_idx] if head else ()
+            columns = map_columns(header)
+            yield "header", {
+                "row": header_idx + 1,
+                "columns": {field: [header[c] for c in cols] for field, cols in columns.items() if cols},
+            }
+
+            total_rows = valid = chunks = 0
+            error_count = 0
+            pending = head[header_idx + 1:]
+            next_row = header_idx + 2
+            while True:
+                while len(pending) < self.chunk_size:
+                    row = next(rows_iter, None)
+                    if row is None:
+                        break
+                    pending.append(row)
+                if not pending:
+                    break
+                chunk, pending = pending[:self.chunk_size], pending[self.chunk_size:]
+                # Fully blank rows are skipped, as sheet_to_json does
+                numbered = [(next_row + i, r) for i, r in enumerate(chunk)
+                            if any(c is not None and c != '' for c in r)]
+                next_row += len(chunk)
+                frame = self.normalize_chunk([r for _, r in numbered], [n for n, _ in numbered], columns)
+
+                missing_name = frame["payerName"] == ''
+                bad_amount = ~missing_name & (frame["amount"] <= 0)
+                errors = (
+                    [{"row": int(r), "column": "对方户名", "message": "对方户名不能为空"}
+                     for r in frame.loc[missing_name, "row"]]
+                    + [{"row": int(r), "column": "金额", "message": "金额必须大于 0"}
+                       for r in frame.loc[bad_amount, "row"]]
+                )
+                good = frame[~missing_name & ~bad_amount]
+
+                chunks += 1
+                total_rows += len(frame)
+                valid += len(good)
+                error_count += len(errors)
+                yield "rows", good
+                if errors:
+                    yield "errors", sorted(errors, key=lambda e: e["row"])
+                yield "progress", {
+                    "type": "progress",
+                    "chunk": chunks,
+                    "current": next_row - 1,
+                    "total": total,
+                    "validRows": valid,
+                    "errorCount": error_count,
+                }
+        finally:
+            handle.close()
+
+        yield "summary", {
+            "totalRows": total_rows,
+            "validRows": valid,
+            "errorCount": error_count,
+            "chunks": chunks,
+            "duration": int((time.perf_counter() - start) * 1000),
+        }
+
+
+def rows_to_ndjson(frame: pd.DataFrame) -> str:
+    """One {"type": "row", "data": {...}} line per row, serialized by pandas in one call."""
+    if frame.empty:
+        return ""
+    lines = frame.to_json(orient="records", lines=True).rstrip("\n").split("\n")
+    return "".join('{"type": "row", "data": ' + line + '}\n' for line in lines)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the result models: object size and serialization.
+
+Builds N synthetic invoices and compares
+  - memory: plain dataclass (the old InvoiceInfo) vs the slotted one vs
+    InvoiceColumns, counting only what the containers add (field values
+    are shared by all variants)
+  - dataclasses.asdict vs InvoiceInfo.to_dict
+  - json.dumps vs fast_json (orjson when installed), rows vs columns
+  - InvoiceInfo(**d) vs InvoiceInfo.from_dict
+
+Usage:
+    python3 electron/python/bench/bench_models.py [--n 100000] [--repeat 3]
+
+Times are the best of --repeat runs, in ms. Output is one JSON object.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, fields, make_dataclass
+from typing import Callable, Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import fast_json
+from models import INVOICE_FIELDS, InvoiceColumns, InvoiceInfo
+
+# The pre-slots model: same fields, ordinary per-instance __dict__
+PlainInvoiceInfo = make_dataclass(
+    "PlainInvoiceInfo", [(f.name, f.type, f) for f in fields(InvoiceInfo)])
+
+
+def synth_values(n: int) -> List[tuple]:
+    rows = []
+    for i in range(n):
+        total = round(100 + i * 1.37, 2)
+        rows.append((
+            f"/ws/invoices/{i:06d}.pdf", f"{i:06d}.pdf", None, f"2433200{i:013d}", "2024-05-06",
+            f"买方公司{i % 500}有限公司", f"91110000MA{i % 500:08d}", f"销售方{i % 2000}科技有限公司",
+            f"91320100MA{i % 2000:08d}", round(total / 1.13, 2), round(total - total / 1.13, 2), total,
+            "13%", "电子发票（增值税专用发票）", "*信息技术服务*软件开发", None, None, "张三", "metadata",
+        ))
+    return rows
+
+
+def best_ms(fn: Callable, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        ms = (time.perf_counter() - t0) * 1000
+        best = ms if best is None else min(best, ms)
+    return round(best, 1)
+
+
+def traced_mb(build: Callable) -> float:
+    """Memory held by what build() returns, in MB."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return round(size / (1024 * 1024), 2)
+
+
+def run(n: int, repeat: int) -> Dict:
+    values = synth_values(n)
+    plain = [PlainInvoiceInfo(*v) for v in values]
+    slotted = [InvoiceInfo(*v) for v in values]
+    columns = InvoiceColumns.from_invoices(slotted)
+    row_dicts = [inv.to_dict() for inv in slotted]
+
+    memory = {
+        "plain_dataclass_mb": traced_mb(lambda: [PlainInvoiceInfo(*v) for v in values]),
+        "slotted_mb": traced_mb(lambda: [InvoiceInfo(*v) for v in values]),
+        "columns_mb": traced_mb(lambda: InvoiceColumns.from_invoices(slotted)),
+    }
+
+    to_dict = {
+        "asdict_ms": best_ms(lambda: [asdict(inv) for inv in plain], repeat),
+        "to_dict_ms": best_ms(lambda: [inv.to_dict() for inv in slotted], repeat),
+    }
+
+    rows_json = fast_json.dumpb(row_dicts)
+    columns_json = fast_json.dumpb(columns.to_dict())
+    serialize = {
+        "backend": fast_json.BACKEND,
+        "old_asdict_json_ms": best_ms(lambda: json.dumps([asdict(inv) for inv in plain]), repeat),
+        "stdlib_rows_ms": best_ms(lambda: json.dumps([inv.to_dict() for inv in slotted], ensure_ascii=False), repeat),
+        "fast_rows_ms": best_ms(lambda: fast_json.dumpb([inv.to_dict() for inv in slotted]), repeat),
+        "fast_columns_ms": best_ms(lambda: fast_json.dumpb(columns.to_dict()), repeat),
+        "rows_bytes": len(rows_json),
+        "columns_bytes": len(columns_json),
+    }
+
+    rows_text = rows_json.decode("utf-8")
+    load = {
+        "old_json_kwargs_ms": best_ms(lambda: [InvoiceInfo(**d) for d in json.loads(rows_text)], repeat),
+        "fast_from_dict_ms": best_ms(lambda: [InvoiceInfo.from_dict(d) for d in fast_json.loads(rows_json)], repeat),
+    }
+
+    # Round trips must agree with the old path
+    assert [inv.to_dict() for inv in slotted] == [asdict(inv) for inv in plain]
+    assert [InvoiceInfo.from_dict(d) for d in fast_json.loads(rows_json)] == slotted
+    assert list(columns) == slotted and list(columns.to_dict()) == list(INVOICE_FIELDS)
+
+    return {"n": n, "python": sys.version.split()[0], "memory": memory, "to_dict": to_dict,
+            "serialize": serialize, "load": load}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    print(json.dumps(run(args.n, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+End-to-end throughput benchmark for InvoiceParser.batch_parse.
+
+Generates a synthetic corpus (see synth_invoices.py), then for every corpus
+size x worker count runs batch_parse in a fresh interpreter and reports
+files/sec, p50/p95/p99 per-file latency, peak RSS and per-field accuracy
+against truth.json. Results are written as JSON so runs from different
+commits can be diffed.
+
+Usage:
+    python3 electron/python/bench/run_bench.py [--sizes 60,300] [--workers 1,4]
+                                               [--corpus DIR] [--out FILE] [--seed N]
+
+Per-file latency is the parse time of each PDF measured inside whichever
+process parsed it; the parse cache is always off so every file is parsed.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from synth_invoices import expected_fields, generate_corpus
+
+
+# ============================================
+# SINGLE RUN (child interpreter)
+# ============================================
+
+def _peak_rss_mb(children: bool = False) -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(parse_pdf, sink):
+    def wrapper(file_path, *args):
+        t0 = time.perf_counter()
+        try:
+            return parse_pdf(file_path, *args)
+        finally:
+            sink((time.perf_counter() - t0) * 1000)
+    return wrapper
+
+
+def _bench_worker_init(parser_kwargs: dict, queue):
+    import invoice_parser
+    invoice_parser._init_worker(parser_kwargs)
+    parser = invoice_parser._worker_parser
+    parser._parse_pdf = _timed(parser._parse_pdf, queue.put)
+
+
+def run_once(folder: str, workers: int) -> dict:
+    """One batch_parse over `folder`; meant to run in its own interpreter so peak RSS is per run."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from invoice_parser import InvoiceParser
+
+    parser = InvoiceParser(cache=None)
+    latencies: List[float] = []
+    n_files = sum(1 for f in os.listdir(folder) if f.lower().endswith(".pdf"))
+
+    t0 = time.perf_counter()
+    if workers <= 1:
+        parser._parse_pdf = _timed(parser._parse_pdf, latencies.append)
+        result = parser.batch_parse(folder, workers=1, on_progress=lambda e: None)
+    else:
+        queue = multiprocessing.Queue()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_bench_worker_init,
+                                 initargs=(parser._worker_kwargs(), queue)) as pool:
+            result = parser.batch_parse(folder, workers=workers, on_progress=lambda e: None, executor=pool)
+            # Drain before shutdown so no worker blocks flushing its queue at exit
+            for _ in range(n_files):
+                latencies.append(queue.get(timeout=60))
+    wall = time.perf_counter() - t0
+
+    return {
+        "wall_s": round(wall, 3),
+        "latencies_ms": latencies,
+        "peak_rss_mb": _peak_rss_mb(),
+        # Largest single worker process (reaped pool workers only)
+        "peak_worker_rss_mb": _peak_rss_mb(children=True) if workers > 1 else None,
+        "result": {k: v for k, v in result.to_dict().items() if k not in ("errors", "duplicates")},
+    }
+
+
+# ============================================
+# REPORTING
+# ============================================
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo), 3)
+
+
+def _same(expected, actual) -> bool:
+    if isinstance(expected, float):
+        return actual is not None and abs(expected - actual) < 0.005
+    return expected == actual
+
+
+def score(invoices: List[dict], truth: Dict[str, Dict]) -> dict:
+    """Per-field, per-variant and overall share of expected fields parsed exactly."""
+    by_name = {inv["file_name"]: inv for inv in invoices}
+    fields: Dict[str, List[int]] = {}
+    variants: Dict[str, List[int]] = {}
+    hits = total = 0
+    for name, t in truth.items():
+        inv = by_name.get(name, {})
+        variant = t["layout"] + ("+metadata" if t["metadata"] else "")
+        for key, expected in expected_fields(t).items():
+            ok = int(_same(expected, inv.get(key)))
+            fields.setdefault(key, [0, 0])
+            variants.setdefault(variant, [0, 0])
+            fields[key][0] += ok
+            fields[key][1] += 1
+            variants[variant][0] += ok
+            variants[variant][1] += 1
+            hits += ok
+            total += 1
+    ratio = lambda h, n: round(h / n, 4) if n else None
+    return {
+        "overall": ratio(hits, total),
+        "fields": {k: ratio(*v) for k, v in sorted(fields.items())},
+        "variants": {k: ratio(*v) for k, v in sorted(variants.items())},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _subset(corpus: str, size: int, files: List[str], truth: Dict[str, Dict]) -> str:
+    folder = os.path.join(corpus, f"n{size}")
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    for name in files[:size]:
+        src, dst = os.path.join(corpus, "all", name), os.path.join(folder, name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+    with open(os.path.join(folder, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump({n: truth[n] for n in files[:size]}, f, ensure_ascii=False)
+    return folder
+
+
+def main():
+    ap = argparse.ArgumentParser(description="InvoiceParser throughput benchmark")
+    ap.add_argument("--sizes", default="60,300", help="Comma-separated corpus sizes")
+    ap.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts")
+    ap.add_argument("--seed", type=int, default=0, help="Corpus RNG seed")
+    ap.add_argument("--corpus", help="Corpus directory (default: a temp dir, removed afterwards)")
+    ap.add_argument("--out", help="Result JSON path (default: bench/results/bench-<commit>-<time>.json)")
+    ap.add_argument("--run_once", help=argparse.SUPPRESS)
+    ap.add_argument("--run_workers", type=int, default=1, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.run_once:
+        print(json.dumps(run_once(args.run_once, args.run_workers)))
+        return
+
+    sizes = sorted({int(s) for s in args.sizes.split(",") if s.strip()})
+    worker_counts = sorted({int(w) for w in args.workers.split(",") if w.strip()})
+    corpus = args.corpus or tempfile.mkdtemp(prefix="invoice_bench_")
+    commit = _git_commit()
+
+    try:
+        generated = generate_corpus(os.path.join(corpus, "all"), max(sizes), args.seed)
+        names = [name for name, _ in generated]
+        truth = dict(generated)
+
+        runs = []
+        for size in sizes:
+            folder = _subset(corpus, size, names, truth)
+            subset_truth = {n: truth[n] for n in names[:size]}
+            for workers in worker_counts:
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--run_once", folder, "--run_workers", str(workers)],
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    raise RuntimeError(f"size={size} workers={workers} failed:\n{proc.stderr}")
+                once = json.loads(proc.stdout.strip().splitlines()[-1])
+                lat = once["latencies_ms"]
+                res = once["result"]
+                run = {
+                    "size": size,
+                    "workers": workers,
+                    "wall_s": once["wall_s"],
+                    "files_per_sec": round(size / once["wall_s"], 2) if once["wall_s"] else None,
+                    "latency_ms": {
+                        "p50": percentile(lat, 50),
+                        "p95": percentile(lat, 95),
+                        "p99": percentile(lat, 99),
+                        "max": round(max(lat), 3) if lat else None,
+                        "mean": round(sum(lat) / len(lat), 3) if lat else None,
+                    },
+                    "peak_rss_mb": once["peak_rss_mb"],
+                    "peak_worker_rss_mb": once["peak_worker_rss_mb"],
+                    "success_count": res["success_count"],
+                    "fail_count": res["fail_count"],
+                    "duplicate_count": res["duplicate_count"],
+                    "tier_counts": res.get("tier_counts"),
+                    "accuracy": score(res["invoices"], subset_truth),
+                }
+                runs.append(run)
+                summary = {k: run[k] for k in ("size", "workers", "files_per_sec", "latency_ms", "peak_rss_mb")}
+                summary["accuracy"] = run["accuracy"]["overall"]
+                print(json.dumps(summary), file=sys.stderr)
+    finally:
+        if not args.corpus:
+            shutil.rmtree(corpus, ignore_errors=True)
+
+    from invoice_parser import PARSER_VERSION
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "parser_version": PARSER_VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+        },
+        "runs": runs,
+    }
+    out = args.out or os.path.join(
+        HERE, "results", f"bench-{commit or 'nogit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({"output": out}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Synthetic multi-page bank statement PDF for exercising parse_statement.
+
+Every page repeats the column header and carries ROWS_PER_PAGE transactions
+(交易日期 | 对方户名 | 对方账号 | 收入 | 支出 | 余额 | 摘要). "ruled" draws
+the table grid, "text" leaves only aligned text, like statements exported
+without borders. Content streams are Flate-compressed as in real files.
+
+Usage: python3 electron/python/bench/synth_statement.py OUT.pdf [PAGES] [ruled|text] [SEED]
+"""
+import json
+import os
+import random
+import sys
+import zlib
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth_invoices import MARGIN, PAGE_HEIGHT, PAGE_WIDTH, _company, _line, _text
+
+ROWS_PER_PAGE = 24
+ROW_HEIGHT = 14
+HEADER = ["交易日期", "对方户名", "对方账号", "收入", "支出", "余额", "摘要"]
+# Column left edges; the last entry is the table's right edge
+COLUMNS = [MARGIN, MARGIN + 62, MARGIN + 212, MARGIN + 312, MARGIN + 372, MARGIN + 432, MARGIN + 492,
+           PAGE_WIDTH - MARGIN]
+_REMARKS = ["货款", "服务费", "货款收入", "转账", "手续费"]
+
+
+def make_rows(pages: int, rng: random.Random) -> List[Dict]:
+    rows = []
+    balance = 100000.0
+    for i in range(pages * ROWS_PER_PAGE):
+        amount = round(rng.uniform(10, 20000), 2)
+        incoming = rng.random() < 0.55
+        balance = round(balance + (amount if incoming else -amount), 2)
+        rows.append({
+            "transactionDate": f"2024-{1 + i // 2000 % 12:02d}-{1 + i // 80 % 28:02d}",
+            "payerName": _company(rng),
+            "payerAccount": "".join(rng.choice("0123456789") for _ in range(16)),
+            "amount": amount,
+            "direction": "in" if incoming else "out",
+            "balance": balance,
+            "remark": rng.choice(_REMARKS),
+        })
+    return rows
+
+
+def _page_content(rows: List[Dict], ruled: bool) -> str:
+    top = 40
+    out = _text(MARGIN, 16, "中国某某银行 账户交易明细")
+    lines = [HEADER] + [[
+        r["transactionDate"], r["payerName"], r["payerAccount"],
+        f"{r['amount']:,.2f}" if r["direction"] == "in" else "",
+        f"{r['amount']:,.2f}" if r["direction"] == "out" else "",
+        f"{r['balance']:,.2f}", r["remark"],
+    ] for r in rows]
+    for i, cells in enumerate(lines):
+        y = top + i * ROW_HEIGHT
+        for x, cell in zip(COLUMNS, cells):
+            if cell:
+                out += _text(x + 2, y + 2, cell)
+    if ruled:
+        bottom = top + len(lines) * ROW_HEIGHT
+        for i in range(len(lines) + 1):
+            out += _line(COLUMNS[0], top + i * ROW_HEIGHT, COLUMNS[-1], top + i * ROW_HEIGHT)
+        for x in COLUMNS:
+            out += _line(x, top, x, bottom)
+    return out
+
+
+def build_statement(pages: int, ruled: bool = True, seed: int = 0) -> Tuple[bytes, List[Dict]]:
+    rng = random.Random(seed)
+    rows = make_rows(pages, rng)
+    # 1 catalog, 2 pages, 3-5 font, then (page, content) pairs
+    font = [
+        b"<< /Type /Font /Subtype /Type0 /BaseFont /STSong-Light /Encoding /UniGB-UCS2-H "
+        b"/DescendantFonts [4 0 R] >>",
+        b"<< /Type /Font /Subtype /CIDFontType0 /BaseFont /STSong-Light "
+        b"/CIDSystemInfo << /Registry (Adobe) /Ordering (GB1) /Supplement 4 >> "
+        b"/FontDescriptor 5 0 R /DW 1000 /W [1 95 500] >>",
+        b"<< /Type /FontDescriptor /FontName /STSong-Light /Flags 6 /FontBBox [-25 -254 1000 880] "
+        b"/ItalicAngle 0 /Ascent 880 /Descent -120 /CapHeight 880 /StemV 93 >>",
+    ]
+    objects: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b""] + font
+    kids = []
+    for p in range(pages):
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_id} 0 R")
+        content = _page_content(rows[p * ROWS_PER_PAGE:(p + 1) * ROWS_PER_PAGE], ruled)
+        stream = zlib.compress(content.encode("latin-1"))
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                        f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode())
+        objects.append(f"<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n".encode()
+                       + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n").encode()
+    return bytes(out), rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(2)
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    ruled = (sys.argv[3] if len(sys.argv) > 3 else "ruled") == "ruled"
+    pdf, rows = build_statement(pages, ruled, int(sys.argv[4]) if len(sys.argv) > 4 else 0)
+    with open(sys.argv[1], "wb") as f:
+        f.write(pdf)
+    print(json.dumps({"file": sys.argv[1], "pages": pages, "rows": len(rows)}))
@@ -1,36 +1,92 @@
-
 import sys
+import os
 import json
-import importlib
+import hashlib
+import importlib.util
+
+REQUIRED_PACKAGES = ["pdfplumber", "pandas", "openpyxl"]
+REQUIREMENTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "requirements.txt")
+
+
+def _cache_path() -> str:
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "electron-bank", "env_probe.json")
+
+
+def _cache_key() -> str:
+    """Interpreter + requirements.txt: a different venv or pin set means a fresh probe."""
+    h = hashlib.sha256()
+    h.update(os.path.realpath(sys.executable).encode("utf-8"))
+    h.update(sys.version.encode("utf-8"))
+    try:
+        with open(REQUIREMENTS_FILE, "rb") as f:
+            h.update(f.read())
+    except OSError:
+        pass
+    return h.hexdigest()
+
+
+def probe() -> dict:
+    """Locate packages and read their versions without importing them."""
+    from importlib.metadata import PackageNotFoundError, version
 
-def check_env():
     result = {
         "available": False,
         "python_version": sys.version,
         "missing": [],
-        "errors": {}
+        "errors": {},
+        "versions": {}
     }
-    
-    # Check dependencies
-    required_packages = ["pdfplumber", "pandas", "openpyxl"]
+
     missing = []
-    
-    for package in required_packages:
+    for package in REQUIRED_PACKAGES:
         try:
-            importlib.import_module(package)
-        except ImportError as e:
-            missing.append(package)
-            result["errors"][package] = str(e)
+            if importlib.util.find_spec(package) is None:
+                raise ImportError(f"No module named '{package}'")
+            try:
+                result["versions"][package] = version(package)
+            except PackageNotFoundError:
+                result["versions"][package] = None
         except Exception as e:
             missing.append(package)
             result["errors"][package] = str(e)
-            
+
     if not missing:
         result["available"] = True
     else:
         result["missing"] = missing
-        
+    return result
+
+
+def check_env(refresh: bool = False):
+    cache_path = _cache_path()
+    key = _cache_key()
+
+    if not refresh:
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                print(json.dumps({**cached["result"], "cached": True}))
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+    result = probe()
+    # Only a passing probe is cached: after a failed one the app installs
+    # the missing packages and re-checks with the same interpreter/requirements.
+    if result["available"]:
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "result": result}, f)
+        except OSError:
+            pass
+
     print(json.dumps(result))
 
 if __name__ == "__main__":
-    check_env()
+    check_env(refresh="--refresh" in sys.argv[1:])
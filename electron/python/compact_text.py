@@ -0,0 +1,125 @@
+"""
+Compact invoice text for AI prompts (`extract_text --compact`).
+
+pdfplumber's layout text of an invoice page is mostly padding: runs of
+spaces that keep columns aligned, the tax bureau stamp, cipher-area noise
+and page footers. compact_invoice_text() collapses whitespace, drops those
+boilerplate lines and reorders what is left so the regions an extraction
+prompt asks about come first:
+
+    header  - invoice code / number / date / type
+    parties - buyer and seller block (names, tax ids)
+    amounts - totals, tax, amount in words
+    items   - line items (the 项目名称 header and *category*name rows)
+    other   - everything else (remarks, issuer, ...)
+
+A line is placed by its keywords; one without any (a row of tax IDs under
+their labels, a wrapped item name) stays in the region of the line before
+it. The vertical 购买方信息 / 销售方信息 side labels, which the text layer
+splits into one-character lines between the rows they flank, are dropped.
+Lines keep their original order inside a region, and the result is cut at a
+line boundary once `max_chars` is reached. Repeated header and party lines
+(a title or buyer block printed twice) are kept once; amount, item and other
+lines are never merged, since two identical item rows are two items.
+"""
+import re
+from typing import List, Optional
+
+_CJK = r'㐀-鿿＀-￯　-〿'
+_SINGLE_CJK = re.compile(rf'^[{_CJK}]$')
+
+_BOILERPLATE = [
+    re.compile(r'^(第\d+页|共\d+页|第\d+页共\d+页|\d+/\d+)$'),
+    re.compile(r'监制|国家税务总局|下载次数|机器编号|校验码'),
+    # Cipher area of paper-style invoices: long runs of digits and operators
+    # (a bare 20-digit 全电 invoice number has no operators and stays)
+    re.compile(r'^(?=.*[<>*+\-/])[0-9<>*+\-/]{20,}$'),
+    # Nothing but punctuation / box-drawing
+    re.compile(rf'^[^0-9A-Za-z{_CJK}]*$'),
+]
+
+# Checked in this order; the first match names the line's region. Item
+# headers mention 金额 and remarks can mention anything, so both go first.
+_REGIONS = [
+    ("other", re.compile(r'^备\s*注|^开\s*票\s*人|收\s*款\s*人|复\s*核')),
+    ("items", re.compile(r'^\*|\*[^*\s]+\*|项目名称|货物或应税劳务')),
+    ("header", re.compile(r'发票代码|发票号码|开票日期|普通发票|专用发票|电子发票'
+                          r'|^\d{20}$|^\d{4}年\d{1,2}月\d{1,2}日$')),
+    ("parties", re.compile(r'购买方|销售方|购方|销方|(?<!项目)名称|纳税人识别号|统一社会信用代码'
+                           r'|^[0-9A-Z]{15,20}( [0-9A-Z]{15,20})*$')),
+    ("amounts", re.compile(r'价税合计|合计|小写|大写|[¥￥]|金额|税额|[圆元]整')),
+]
+REGION_ORDER = ["header", "parties", "amounts", "items", "other"]
+# Regions whose exact repeats carry no information
+_DEDUPED_REGIONS = ("header", "parties")
+# Characters of the vertical 购买方信息 / 销售方信息 / 备注 side labels, which
+# the text layer prints a character (or a buyer/seller pair) per line
+_SIDE_LABEL_CHARS = set('购买销售方信息备注')
+_SIDE_LABEL_WORDS = {'购买方', '销售方', '购买方信息', '销售方信息'}
+
+
+def compact_line(line: str) -> str:
+    """
+    Squeeze whitespace runs to one space and re-join letter-spaced labels
+    ("买 名 称" -> "买名称"). Spaces next to longer tokens stay, so the
+    buyer and seller halves of a shared line remain separate.
+    """
+    out: List[str] = []
+    prev_single = False
+    for token in line.split():
+        single = bool(_SINGLE_CJK.match(token))
+        if single and prev_single:
+            out[-1] += token
+        else:
+            out.append(token)
+        prev_single = single
+    return ' '.join(out)
+
+
+def is_side_label(raw: str) -> bool:
+    """A line of the vertical side labels: single characters like "购 销" or "方 方"."""
+    tokens = raw.split()
+    return (bool(tokens) and all(len(t) == 1 and t in _SIDE_LABEL_CHARS for t in tokens)
+            and ''.join(tokens) not in _SIDE_LABEL_WORDS)
+
+
+def is_boilerplate(line: str) -> bool:
+    squeezed = line.replace(' ', '')
+    return any(p.search(squeezed) for p in _BOILERPLATE)
+
+
+def region_of(line: str) -> Optional[str]:
+    """The region a line's keywords name, or None for a line without any."""
+    for name, pattern in _REGIONS:
+        if pattern.search(line):
+            return name
+    return None
+
+
+def compact_invoice_text(text: str, max_chars: Optional[int] = None) -> str:
+    buckets = {name: [] for name in REGION_ORDER}
+    seen = set()
+    region = "other"
+    for raw in text.splitlines():
+        if is_side_label(raw):
+            continue
+        line = compact_line(raw)
+        if not line or is_boilerplate(line):
+            continue
+        # A line without keywords (tax IDs, a wrapped item name) continues
+        # the region of the line before it
+        region = region_of(line) or region
+        if region in _DEDUPED_REGIONS:
+            if line in seen:
+                continue
+            seen.add(line)
+        buckets[region].append(line)
+
+    lines: List[str] = [line for name in REGION_ORDER for line in buckets[name]]
+    out = "\n".join(lines)
+    if max_chars is None or len(out) <= max_chars:
+        return out
+
+    # Cut at a line boundary; a single oversized first line is cut mid-line
+    cut = out.rfind("\n", 0, max_chars + 1)
+    return out[:cut] if cut > 0 else out[:max_chars]
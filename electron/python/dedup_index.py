@@ -0,0 +1,126 @@
+"""
+Cross-batch duplicate index.
+
+batch_parse only de-duplicates within one run. This index remembers every
+invoice handed out by earlier runs, under three kinds of key:
+
+    hash:<sha256>                   file bytes, checked before parsing
+    num:<code>-<number>             invoice code (if any) and number
+    fuzzy:<seller>|<amount>|<date>  NFKC-folded seller without spaces or
+                                    punctuation, total to 2 decimals, date
+
+Each key points at the batch and file where the invoice was first seen.
+Keys are the primary key of a WITHOUT ROWID table, so every lookup is one
+B-tree probe no matter how many invoices have been indexed.
+
+Seeing the same file again in the batch that recorded it (a re-run) is not
+a duplicate.
+"""
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import List, NamedTuple, Optional
+
+from models import InvoiceInfo
+
+INDEX_FILE_NAME = ".dedup_index.sqlite"
+COMMIT_EVERY = 1000
+
+_PUNCT = re.compile(r"[\s()（）\[\]【】.,，。·•\-_/\\'\"“”]+")
+
+
+class FirstSeen(NamedTuple):
+    batch_id: str
+    file_path: str
+    invoice_number: Optional[str]
+
+
+def default_index_path(folder_path: str) -> str:
+    """Index lives in the workspace root, next to the parse cache."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder_path)), INDEX_FILE_NAME)
+
+
+def invoice_keys(inv: InvoiceInfo) -> List[str]:
+    keys = []
+    number = unicodedata.normalize("NFKC", inv.invoice_number or "").replace(" ", "")
+    if number:
+        code = unicodedata.normalize("NFKC", inv.invoice_code or "").replace(" ", "")
+        keys.append(f"num:{code}-{number}")
+    seller = _PUNCT.sub("", unicodedata.normalize("NFKC", inv.seller_name or "")).lower()
+    amount = inv.total_amount if inv.total_amount is not None else inv.amount
+    if seller and amount is not None and inv.invoice_date:
+        keys.append(f"fuzzy:{seller}|{amount:.2f}|{inv.invoice_date}")
+    return keys
+
+
+class DedupIndex:
+    def __init__(self, db_path: str, batch_id: str):
+        self.db_path = db_path
+        self.batch_id = batch_id
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS dedup_keys (
+                key TEXT PRIMARY KEY,
+                batch_id TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                invoice_number TEXT,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+        self.pending = 0
+
+    def _get(self, key: str, file_path: str) -> Optional[FirstSeen]:
+        row = self.conn.execute(
+            "SELECT batch_id, file_path, invoice_number FROM dedup_keys WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[0] == self.batch_id and row[1] == file_path):
+            return None
+        return FirstSeen(*row)
+
+    def find_file(self, content_hash: str, file_path: str) -> Optional[FirstSeen]:
+        """Earlier invoice with exactly these bytes."""
+        return self._get(f"hash:{content_hash}", file_path)
+
+    def find(self, inv: InvoiceInfo) -> Optional[FirstSeen]:
+        """Earlier invoice with the same number, or the same seller / amount / date."""
+        for key in invoice_keys(inv):
+            first = self._get(key, inv.file_path)
+            if first is not None:
+                return first
+        return None
+
+    def add(self, inv: InvoiceInfo, content_hash: Optional[str] = None, first: Optional[FirstSeen] = None):
+        """
+        Index an invoice handed out by this batch. For a duplicate, pass
+        the first sighting so only its file hash is added, pointing there.
+        """
+        if first is None:
+            first = FirstSeen(self.batch_id, inv.file_path, inv.invoice_number)
+            keys = invoice_keys(inv)
+        else:
+            keys = []
+        if content_hash:
+            keys.append(f"hash:{content_hash}")
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO dedup_keys (key, batch_id, file_path, invoice_number, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(key, first.batch_id, first.file_path, first.invoice_number, now) for key in keys]
+        )
+        self.pending += 1
+        if self.pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
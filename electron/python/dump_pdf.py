@@ -3,8 +3,9 @@
 import sys, os, json
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import pdfplumber
+import pdf_engine
 
-folder = "/Users/taolijun/Downloads/对账/01发票"
+folder = sys.argv[1] if len(sys.argv) > 1 else "/Users/taolijun/Downloads/对账/01发票"
 pdfs = sorted([f for f in os.listdir(folder) if f.lower().endswith('.pdf')])
 
 for f in pdfs:
@@ -12,8 +13,7 @@ for f in pdfs:
     try:
         with pdfplumber.open(fp) as pdf:
             page = pdf.pages[0]
-            text = page.extract_text() or ""
-            tables = page.extract_tables()
+            text, tables = pdf_engine.extract_page(page)
             
             print(f"=== FILE: {f} ===")
             print(f"TEXT_LENGTH: {len(text)}")
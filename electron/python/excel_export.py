@@ -0,0 +1,161 @@
+"""
+Constant-memory Excel export of invoice records.
+
+Records are read one at a time from a JSON array or NDJSON stream and
+written with openpyxl's write-only workbook, so neither the input nor the
+sheet is ever held in memory as a whole.
+
+Write-only sheets emit their column widths before the first row, so each
+sheet buffers its first WIDTH_SAMPLE_ROWS rows, sizes the columns from
+everything seen so far, and then streams the rest. Widths keep being
+tracked across the whole export and are applied to each new sheet when
+the row limit rolls the output over.
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+# (header, InvoiceInfo field); None = running row number
+EXPORT_COLUMNS: List[Tuple[str, Optional[str]]] = [
+    ("序号", None),
+    ("发票号码", "invoice_number"),
+    ("购方名称", "buyer_name"),
+    ("购方税号", "buyer_tax_id"),
+    ("销方名称", "seller_name"),
+    ("销方税号", "seller_tax_id"),
+    ("开票日期", "invoice_date"),
+    ("项目名称", "item_name"),
+    ("金额", "amount"),
+    ("税率", "tax_rate"),
+    ("税额", "tax_amount"),
+    ("价税合计", "total_amount"),
+    ("备注", "remark"),
+    ("开票人", "issuer"),
+    ("价税合计(大写)", "total_amount_chinese"),
+    ("源文件", "file_path"),
+]
+
+SHEET_NAME = "发票清单"
+# Excel's hard limit is 1,048,576 rows including the header
+EXCEL_MAX_DATA_ROWS = 1_048_575
+WIDTH_SAMPLE_ROWS = 1000
+MAX_COLUMN_WIDTH = 50
+
+
+def iter_json_records(stream: TextIO, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield values from a JSON array or NDJSON text stream without reading it whole."""
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+
+    def more() -> bool:
+        nonlocal buf, pos
+        chunk = stream.read(chunk_size)
+        buf, pos = buf[pos:] + chunk, 0
+        return bool(chunk)
+
+    def skip(separators: str):
+        nonlocal pos
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] in separators):
+                pos += 1
+            if pos < len(buf) or not more():
+                return
+
+    skip("")
+    if pos >= len(buf):
+        return
+    in_array = buf[pos] == "["
+    if in_array:
+        pos += 1
+
+    while True:
+        skip("," if in_array else "")
+        if pos >= len(buf):
+            if in_array:
+                raise ValueError("Unterminated JSON array")
+            return
+        if in_array and buf[pos] == "]":
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                # Most likely the record is cut at the chunk boundary
+                if not more():
+                    raise
+        pos = end
+        yield value
+
+
+class StreamingExcelWriter:
+    def __init__(self, output_path: str, max_rows_per_sheet: Optional[int] = None):
+        self.output_path = output_path
+        self.max_rows_per_sheet = max(1, min(max_rows_per_sheet or EXCEL_MAX_DATA_ROWS, EXCEL_MAX_DATA_ROWS))
+        self.workbook = Workbook(write_only=True)
+        self.widths = [len(header) for header, _ in EXPORT_COLUMNS]
+        self.row_count = 0
+        self.sheet_count = 0
+        self._sheet = None
+        self._sheet_rows = 0
+        self._pending: List[list] = []
+
+    def write(self, record: Dict[str, Any]):
+        if self._sheet_rows >= self.max_rows_per_sheet:
+            self._flush_pending()
+            self._sheet = None
+            self._sheet_rows = 0
+        if self._sheet_rows == 0:
+            self.sheet_count += 1
+
+        self.row_count += 1
+        row = [self.row_count if field is None else record.get(field) for _, field in EXPORT_COLUMNS]
+        for i, value in enumerate(row):
+            if value is not None:
+                n = len(str(value))
+                if n > self.widths[i]:
+                    self.widths[i] = n
+
+        self._sheet_rows += 1
+        if self._sheet is not None:
+            self._sheet.append(row)
+            return
+        self._pending.append(row)
+        if len(self._pending) >= WIDTH_SAMPLE_ROWS:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        """Open the current sheet (widths sized from all rows so far) and write buffered rows."""
+        if self._sheet is not None or not self._pending:
+            return
+        name = SHEET_NAME if self.sheet_count <= 1 else f"{SHEET_NAME}_{self.sheet_count}"
+        sheet = self.workbook.create_sheet(name)
+        for i, width in enumerate(self.widths):
+            sheet.column_dimensions[get_column_letter(i + 1)].width = min(width + 2, MAX_COLUMN_WIDTH)
+        sheet.append([header for header, _ in EXPORT_COLUMNS])
+        for row in self._pending:
+            sheet.append(row)
+        self._pending = []
+        self._sheet = sheet
+
+    def close(self) -> int:
+        """Finish the workbook and return the number of data rows written."""
+        self._flush_pending()
+        if self.sheet_count == 0:
+            # Keep the old behaviour of an empty sheet with headers
+            sheet = self.workbook.create_sheet(SHEET_NAME)
+            sheet.append([header for header, _ in EXPORT_COLUMNS])
+        os.makedirs(os.path.dirname(self.output_path) or '.', exist_ok=True)
+        self.workbook.save(self.output_path)
+        return self.row_count
+
+
+def export_records(records, output_path: str, max_rows_per_sheet: Optional[int] = None) -> Dict[str, int]:
+    writer = StreamingExcelWriter(output_path, max_rows_per_sheet)
+    for record in records:
+        writer.write(record)
+    rows = writer.close()
+    return {"rows": rows, "sheets": max(1, writer.sheet_count)}
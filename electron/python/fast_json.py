@@ -0,0 +1,49 @@
+"""
+JSON for the stdout protocol and the parse cache.
+
+Uses orjson when it is installed (`pip install orjson`, not required) and
+the stdlib json module otherwise. Both produce the same UTF-8 text, not
+ASCII escapes, so write_line sends bytes straight to stdout instead of
+through the console code page (pythonService decodes stdout as UTF-8).
+"""
+import json
+import sys
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+# json.dumps accepts int / float dict keys (e.g. histogram buckets); orjson only with this flag
+_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj, option=_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def dumpb(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Any) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def write_line(obj: Any, flush: bool = False, stream=None):
+    """One NDJSON line as UTF-8 bytes on stdout (or `stream`, a binary file)."""
+    if stream is None:
+        # Text written with print() must come out first
+        sys.stdout.flush()
+        stream = sys.stdout.buffer
+    stream.write(dumpb(obj) + b"\n")
+    if flush:
+        stream.flush()
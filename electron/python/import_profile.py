@@ -0,0 +1,69 @@
+"""
+Per-module import timing for `main.py --import-profile`.
+
+Wraps builtins.__import__ for the rest of the process and records, for
+every module imported for the first time, its self time (excluding the
+modules it pulled in) and cumulative time - the same split as
+`python -X importtime`, but available as JSON from inside main.py.
+"""
+import builtins
+import sys
+import time
+from typing import Dict, List, Optional
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.modules: Dict[str, Dict[str, float]] = {}
+        self.total = 0.0
+        self._stack: List[List[float]] = []
+        self._original = None
+
+    def install(self):
+        self._original = builtins.__import__
+        original = self._original
+
+        def profiled_import(name, globals=None, locals=None, fromlist=(), level=0):
+            # Relative and already-loaded imports are bookkeeping only
+            if level or name in sys.modules:
+                return original(name, globals, locals, fromlist, level)
+            # Child time is subtracted from the parent's self time
+            frame = [0.0]
+            self._stack.append(frame)
+            t0 = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - t0
+                self._stack.pop()
+                if self._stack:
+                    self._stack[-1][0] += elapsed
+                else:
+                    self.total += elapsed
+                if name not in self.modules:
+                    self.modules[name] = {
+                        "self_ms": round((elapsed - frame[0]) * 1000, 3),
+                        "cumulative_ms": round(elapsed * 1000, 3),
+                    }
+
+        builtins.__import__ = profiled_import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def report(self, budget_ms: Optional[float] = None, top: int = 30) -> dict:
+        total_ms = round(self.total * 1000, 3)
+        ranked = sorted(self.modules.items(), key=lambda kv: kv[1]["self_ms"], reverse=True)
+        report = {
+            "total_import_ms": total_ms,
+            "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "module_count": len(self.modules),
+            "modules": [{"module": name, **times} for name, times in ranked[:top]],
+        }
+        if budget_ms is not None:
+            report["budget_ms"] = budget_ms
+            report["over_budget"] = total_ms > budget_ms
+        return report
@@ -1,11 +1,69 @@
 
+import hashlib
 import pdfplumber
-import re
 import os
 import json
-from dataclasses import asdict
-from typing import List, Optional, Tuple, Dict
-from models import InvoiceInfo, BatchParseResult, DuplicateRecord, ErrorRecord
+import time
+import zipfile
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple, Dict, Iterator, Union
+from models import InvoiceInfo, InvoiceColumns, BatchParseResult, DuplicateRecord, ErrorRecord
+from parse_cache import ParseCache, hash_file
+import layout_templates
+import pdf_engine
+from rules import KEYWORD_SETS, RuleRunner, RuleStats
+from keyword_matcher import Hit, KeywordMatcher, keyword_sets_digest
+from stage_profile import NULL_STAGE, StageReport, StageTimer
+from parse_watchdog import WatchdogPool
+from layout_templates import TemplateRegistry
+from structured_invoice import FIELD_TAGS, STRUCTURED_EXTENSIONS, is_structured, normalize_field, read_structured_invoice
+from archive_inputs import DEFAULT_SPILL_MB, ArchiveMember, Source, list_inputs, open_member
+from dedup_index import DedupIndex, FirstSeen
+from layout_snapshots import NO_LAYOUT, LayoutSnapshot, PdfLayout, SnapshotEntry, SnapshotStore
+
+# Bump whenever extraction heuristics change so cached parse results are redone.
+PARSER_VERSION = "5"
+
+# Per-field policy for the metadata fast path:
+#   "required" - must be present in the PDF Custom metadata, otherwise fall back
+#                to text/table extraction
+#   "optional" - may be left empty when the required fields are complete
+# Identity and amounts are required. The rest are filled from whatever the
+# metadata carries under the e-invoice XML tag names (ItemName, TaxRate,
+# Remark, Drawer, ...) and otherwise left empty.
+METADATA_FIELD_POLICY: Dict[str, str] = {
+    "invoice_number": "required",
+    "invoice_date": "required",
+    "seller_name": "required",
+    "seller_tax_id": "required",
+    "buyer_name": "required",
+    "amount": "required",
+    "tax_amount": "required",
+    "total_amount": "required",
+    "buyer_tax_id": "optional",
+    "invoice_code": "optional",
+    "invoice_type": "optional",
+    "item_name": "optional",
+    "tax_rate": "optional",
+    "total_amount_chinese": "optional",
+    "remark": "optional",
+    "issuer": "optional",
+}
+
+ParseOutcome = Tuple[bool, Optional[InvoiceInfo], Optional[str]]
+# A file on disk, a file inside a zip / eml bundle, or (iter_reextract) a
+# file known only by its layout snapshot
+InputEntry = Union[str, ArchiveMember, SnapshotEntry]
+ProgressCallback = Callable[[dict], None]
+
+# Built once per process and shared by every parser using the built-in keyword sets
+DEFAULT_KEYWORDS = KeywordMatcher(KEYWORD_SETS)
+
+
+def print_progress(event: dict):
+    """Default progress sink: one JSON line on stdout for pythonService.runScript."""
+    print(json.dumps(event), flush=True)
 
 
 class InvoiceParser:
@@ -28,63 +86,256 @@ class InvoiceParser:
         ['购|买|方|信|息', '名称：万亚飞|税号：...', '', '销|售|方|信|息', '名称：松下...|税号：...']
     """
 
-    def __init__(self):
-        pass
-
-    def parse_single_invoice(self, file_path: str) -> Tuple[bool, Optional[InvoiceInfo], Optional[str]]:
+    def __init__(
+        self,
+        cache: Optional[ParseCache] = None,
+        metadata_fast_path: bool = True,
+        metadata_policy: Optional[Dict[str, str]] = None,
+        rule_stats: bool = False,
+        profile: bool = False,
+        file_timeout: Optional[float] = None,
+        max_memory_mb: Optional[float] = None,
+        batch_timeout: Optional[float] = None,
+        templates: Optional[TemplateRegistry] = None,
+        spill_mb: float = DEFAULT_SPILL_MB,
+        dedup_index: Optional[DedupIndex] = None,
+        keyword_sets: Optional[Dict[str, List[str]]] = None,
+        snapshots: Optional[SnapshotStore] = None,
+    ):
+        self.cache = cache
+        self.metadata_fast_path = metadata_fast_path
+        self.metadata_policy = metadata_policy if metadata_policy is not None else METADATA_FIELD_POLICY
+        self.rule_stats = RuleStats() if rule_stats else None
+        self.rules = RuleRunner(self.rule_stats)
+        # Per-file stage timings; the report is rebuilt for every batch
+        self.stage_timer = StageTimer() if profile else None
+        self.stage_report: Optional[StageReport] = None
+        # Limits enforced by watchdog.WatchdogPool; any of them moves parsing
+        # into killable worker processes
+        self.file_timeout = file_timeout
+        self.max_memory_mb = max_memory_mb
+        self.batch_timeout = batch_timeout
+        self.latency_report: Optional[dict] = None
+        # Learned layout templates; None = always run the full heuristics
+        self.templates = templates
+        # Archive members above this size are parsed from a temp file instead of memory
+        self.spill_bytes = int(spill_mb * 1024 * 1024)
+        # Invoices handed out by earlier batches; None = dedup within the batch only
+        self.dedup_index = dedup_index
+        # Company-name / org-suffix keywords; None = the built-in KEYWORD_SETS
+        self.keyword_sets = keyword_sets
+        self.keywords = DEFAULT_KEYWORDS if keyword_sets is None else KeywordMatcher(keyword_sets)
+        # Layout snapshots by file hash: extraction runs from the snapshot
+        # when there is one, and every PDF parsed leaves one behind
+        self.snapshots = snapshots
+
+    @staticmethod
+    def cache_version(
+        keyword_sets: Optional[Dict[str, List[str]]] = None,
+        metadata_fast_path: bool = True,
+        metadata_policy: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        Version stamp for ParseCache entries (parser rules + pdfplumber + custom
+        keywords + metadata fast path), so a result is only reused by a parser
+        that would have produced the same one.
+        """
+        version = f"{PARSER_VERSION}+pdfplumber-{pdfplumber.__version__}"
+        if keyword_sets is not None and keyword_sets != KEYWORD_SETS:
+            version += f"+kw-{keyword_sets_digest(keyword_sets)}"
+        if not metadata_fast_path:
+            version += "+nofast"
+        elif metadata_policy is not None and metadata_policy != METADATA_FIELD_POLICY:
+            required = ",".join(sorted(f for f, p in metadata_policy.items() if p == "required"))
+            version += f"+meta-{hashlib.sha1(required.encode('utf-8')).hexdigest()[:8]}"
+        return version
+
+    def parse_single_invoice(self, file_path: InputEntry) -> Tuple[bool, Optional[InvoiceInfo], Optional[str]]:
+        if isinstance(file_path, SnapshotEntry):
+            return self._parse_stored(file_path)
+        if isinstance(file_path, ArchiveMember):
+            return _parse_member(file_path, self._parse_source)
         if not os.path.exists(file_path):
             return False, None, f"File not found: {file_path}"
-
+        return self._parse_source(file_path, file_path)
+
+    def _parse_source(self, file_path: str, source: Source, use_cache: bool = True) -> ParseOutcome:
+        """parse_single_invoice for an opened file; source is the path itself or an archive member's buffer."""
+        # OFD / XML carry their fields as data; reading them is cheaper than hashing
+        if is_structured(file_path):
+            return read_structured_invoice(file_path, source)
+
+        cache = self.cache if use_cache else None
+        if not cache and self.snapshots is None:
+            return self._parse_pdf(file_path, source)
+
+        content_hash = hash_file(source)
+        cached = cache.get(content_hash, file_path) if cache else None
+        if cached:
+            return True, cached, None
+
+        ok, inv, err = False, None, NO_LAYOUT
+        if self.snapshots is not None:
+            data = self.snapshots.get(content_hash)
+            if data is not None:
+                ok, inv, err = self._parse_snapshot(file_path, data)
+        # No snapshot, or only the metadata of one
+        if err == NO_LAYOUT:
+            ok, inv, err = self._parse_pdf(file_path, source, content_hash)
+        if ok and inv and cache:
+            cache.put(content_hash, inv)
+        return ok, inv, err
+
+    def _parse_uncached(self, file_path: str, source: Source) -> ParseOutcome:
+        return self._parse_source(file_path, source, use_cache=False)
+
+    def _parse_entry(self, entry: InputEntry) -> ParseOutcome:
+        """parse_single_invoice without the cache (iter_batch looks it up itself)."""
+        if isinstance(entry, SnapshotEntry):
+            return self._parse_stored(entry)
+        if isinstance(entry, ArchiveMember):
+            return _parse_member(entry, self._parse_uncached)
+        return self._parse_uncached(entry, entry)
+
+    def _parse_stored(self, entry: SnapshotEntry) -> ParseOutcome:
+        data = self.snapshots.get(entry.content_hash) if self.snapshots is not None else None
+        if data is None:
+            return False, None, f"No layout snapshot for {entry.path}"
+        return self._parse_snapshot(entry.path, data)
+
+    def _stage(self, name: str):
+        return NULL_STAGE if self.stage_timer is None else self.stage_timer.stage(name)
+
+    def _profiled_parse(self, file_path: InputEntry) -> Tuple[ParseOutcome, Dict[str, float]]:
+        """_parse_entry plus its {stage: ms} breakdown; needs profile=True."""
+        self.stage_timer.reset()
+        with self.stage_timer.stage("total"):
+            outcome = self._parse_entry(file_path)
+        return outcome, self.stage_timer.snapshot()
+
+    def _parse_pdf(
+        self,
+        file_path: str,
+        source: Optional[Source] = None,
+        content_hash: Optional[str] = None,
+    ) -> Tuple[bool, Optional[InvoiceInfo], Optional[str]]:
+        """Open and parse a PDF; with a content_hash its layout snapshot is stored as well."""
         try:
-            with pdfplumber.open(file_path) as pdf:
-                if len(pdf.pages) == 0:
-                    return False, None, "Empty PDF"
-
-                file_name = os.path.basename(file_path)
-                invoice = InvoiceInfo(file_path=file_path, file_name=file_name)
-
-                # 1. Try PDF metadata first
-                self._extract_metadata(pdf, invoice)
-
-                # 2. Extract full page text and tables
-                first_page = pdf.pages[0]
-                text = first_page.extract_text() or ""
-                tables = first_page.extract_tables()
-
-                # 3. Extract from tables FIRST (most reliable for buyer/seller)
-                if tables:
-                    self._extract_buyer_seller_from_table(tables, invoice)
-                    self._extract_amounts_from_table(tables, invoice)
-                    self._extract_item_from_table(tables, invoice)
-
-                # 4. Text-based extraction (fills gaps)
-                if text:
-                    self._extract_invoice_number(text, invoice)
-                    self._extract_invoice_date(text, invoice)
-                    self._extract_invoice_type(text, invoice)
-                    self._extract_buyer_seller_from_text(text, invoice)
-                    self._extract_amounts_from_text(text, invoice)
-                    self._extract_item_from_text(text, invoice)
-                    self._extract_chinese_total(text, invoice)
-                    self._extract_remark(text, invoice)
-                    self._extract_issuer(text, invoice)
-                    self._extract_sparse_format(text, invoice)
-
-                # 5. Derive missing amounts
-                self._derive_amounts(invoice)
-
-                # 6. Parse source
-                has_meta = invoice.parse_source == "metadata"
-                has_text = bool(text and len(text.strip()) > 0)
-                if has_meta and has_text:
-                    invoice.parse_source = "both"
-                elif has_text:
-                    invoice.parse_source = "textlayer"
-
-                return True, invoice, None
+            with self._stage("open"):
+                pdf = pdfplumber.open(file_path if source is None else source)
+            with pdf:
+                with self._stage("open"):
+                    doc = PdfLayout(pdf)
+                outcome = self._extract_fields(file_path, doc)
+                if outcome[0] and content_hash and self.snapshots is not None:
+                    with self._stage("snapshot"):
+                        self.snapshots.put(content_hash, file_path, doc.snapshot().to_bytes())
+                return outcome
+        except Exception as e:
+            # MemoryError has an empty message; the watchdog keys off the name
+            return False, None, str(e) or type(e).__name__
 
+    def _parse_snapshot(self, file_path: str, data: bytes) -> ParseOutcome:
+        """Field extraction over a stored layout snapshot; the PDF is not opened."""
+        try:
+            with self._stage("snapshot"):
+                doc = LayoutSnapshot.from_bytes(data)
+            return self._extract_fields(file_path, doc)
         except Exception as e:
-            return False, None, str(e)
+            return False, None, str(e) or type(e).__name__
+
+    def _extract_fields(self, file_path: str, doc: Union[PdfLayout, LayoutSnapshot]) -> ParseOutcome:
+        """The extraction stages, over an open PDF or a layout snapshot of one."""
+        if doc.page_count == 0:
+            return False, None, "Empty PDF"
+
+        file_name = os.path.basename(file_path)
+        invoice = InvoiceInfo(file_path=file_path, file_name=file_name)
+
+        # 1. Try PDF metadata first; if it is complete and consistent
+        #    the page layout is never analysed
+        with self._stage("metadata"):
+            self._extract_metadata(doc, invoice)
+            complete = self.metadata_fast_path and self._metadata_is_complete(invoice)
+        if complete:
+            return True, invoice, None
+
+        # 2. Build the page objects; a known layout is then read from
+        #    its field boxes, and only its free text from the page text
+        with self._stage("layout"):
+            first_page = doc.first_page()
+        if first_page is None:
+            return False, None, NO_LAYOUT
+        template = shift = glyphs = fp = None
+        template_hit = False
+        if self.templates is not None:
+            with self._stage("template"):
+                glyphs, fp = layout_templates.fingerprint(first_page)
+                template, shift = self.templates.match(fp)
+                if template is not None and template.status == "active":
+                    values = template.read(glyphs, shift)
+                    template_hit = values is not None and self._apply_template(invoice, values)
+
+        # 3. Extract full page text and tables (one object pass)
+        with self._stage("extract_text"):
+            text = doc.text()
+        if template_hit:
+            if text:
+                with self._stage("rule_scan"):
+                    self.rules.scan(text)
+                for extract in (self._extract_invoice_type,
+                                self._extract_item_from_text,
+                                self._extract_remark,
+                                self._extract_issuer):
+                    with self._stage(extract.__name__.lstrip('_')):
+                        extract(text, invoice)
+            return True, invoice, None
+        with self._stage("extract_tables"):
+            tables = doc.tables()
+
+        # 4. Extract from tables FIRST (most reliable for buyer/seller)
+        if tables:
+            for extract in (self._extract_buyer_seller_from_table,
+                            self._extract_amounts_from_table,
+                            self._extract_item_from_table):
+                with self._stage(extract.__name__.lstrip('_')):
+                    extract(tables, invoice)
+
+        # 5. Text-based extraction (fills gaps); one anchor sweep
+        #    decides which text rules can match at all
+        if text:
+            with self._stage("rule_scan"):
+                self.rules.scan(text)
+            for extract in (self._extract_invoice_number,
+                            self._extract_invoice_date,
+                            self._extract_invoice_type,
+                            self._extract_buyer_seller_from_text,
+                            self._extract_amounts_from_text,
+                            self._extract_item_from_text,
+                            self._extract_chinese_total,
+                            self._extract_remark,
+                            self._extract_issuer,
+                            self._extract_sparse_format):
+                with self._stage(extract.__name__.lstrip('_')):
+                    extract(text, invoice)
+
+        # 6. Derive missing amounts
+        self._derive_amounts(invoice)
+
+        # 7. Learn this layout, or check a template still on probation
+        if fp is not None:
+            with self._stage("template"):
+                self._train_template(template, shift, glyphs, fp, invoice)
+
+        # 8. Parse source
+        has_meta = invoice.parse_source == "metadata"
+        has_text = bool(text and len(text.strip()) > 0)
+        if has_meta and has_text:
+            invoice.parse_source = "both"
+        elif has_text:
+            invoice.parse_source = "textlayer"
+
+        return True, invoice, None
 
     # ============================================
     # TABLE-BASED EXTRACTION (highest priority)
@@ -113,14 +364,14 @@ class InvoiceParser:
                 cell_str = str(cell).replace('\n', '|')
 
                 # Detect buyer info cell
-                if re.search(r'购[\s|]*买[\s|]*方', cell_str):
+                if self.rules.search('table_buyer_label', cell_str):
                     # The NEXT non-empty cell contains buyer data
                     for j in range(i + 1, len(row0)):
                         if row0[j] and str(row0[j]).strip():
                             buyer_cell = str(row0[j])
                             break
                 # Detect seller info cell
-                elif re.search(r'销[\s|]*售[\s|]*方', cell_str):
+                elif self.rules.search('table_seller_label', cell_str):
                     # The NEXT non-empty cell contains seller data
                     for j in range(i + 1, len(row0)):
                         if row0[j] and str(row0[j]).strip():
@@ -137,7 +388,7 @@ class InvoiceParser:
     def _parse_info_cell(self, cell_text: str, invoice: InvoiceInfo, role: str):
         """Parse a buyer/seller info cell that contains name and tax ID."""
         # Split by newlines or pipe chars
-        parts = re.split(r'[\n|]', cell_text)
+        parts = self.rules.split('info_cell_split', cell_text)
 
         for part in parts:
             part = part.strip()
@@ -145,7 +396,7 @@ class InvoiceParser:
                 continue
 
             # Extract name: "名称：万亚飞" or "名 称 万亚飞" or "名 称:江苏京东..."
-            m = re.match(r'名\s*称\s*[:：]?\s*(.+)', part)
+            m = self.rules.match('info_cell_name', part)
             if m:
                 name = m.group(1).strip()
                 if name and len(name) >= 2:
@@ -157,7 +408,7 @@ class InvoiceParser:
 
             # Extract tax ID: "统一社会信用代码/纳税人识别号：91320..."
             # Must be 15-20 alphanumeric chars
-            m = re.search(r'(?:统一社会信用代码|纳税人识别号|税号)\s*/?:?\s*[:：]?\s*([A-Za-z0-9]{15,20})', part)
+            m = self.rules.search('tax_id', part)
             if m:
                 tax_id = m.group(1).upper()
                 if role == 'buyer' and not invoice.buyer_tax_id:
@@ -187,7 +438,7 @@ class InvoiceParser:
                             continue
                         cell_str = str(cell)
                         # Look for (小写) ¥amount
-                        m = re.search(r'[（(]小写[)）]\s*[¥￥]\s*([\d,]+\.?\d*)', cell_str)
+                        m = self.rules.search('table_total_lower', cell_str)
                         if m and not invoice.total_amount:
                             try:
                                 invoice.total_amount = float(m.group(1).replace(',', ''))
@@ -203,7 +454,7 @@ class InvoiceParser:
                             continue
                         cell_str = str(cell)
                         # Find all ¥ amounts on 合计 line
-                        amounts = re.findall(r'[¥￥]\s*([\d,]+\.?\d+)', cell_str)
+                        amounts = self.rules.findall('table_yuan_amounts', cell_str)
                         if len(amounts) >= 2:
                             # First ¥ is amount, second is tax amount
                             try:
@@ -240,17 +491,17 @@ class InvoiceParser:
                     cell_str = str(cell)
 
                     # Skip non-item cells
-                    if any(kw in cell_str for kw in ['购', '销', '价税合计', '备注', '开票人']):
+                    if self.keywords.contains(cell_str, 'non_item_cell'):
                         continue
 
                     # Look for item pattern: *category*brand product-spec
                     # e.g. "*家用清洁电器具*松下 MC-DC5G 台 1 220.35..."
-                    m = re.search(r'\*([^*]+)\*(.+?)(?:\s+\d+\.\d|\s+台\s|\s+个\s|\s+套\s|\s+件\s|\s+只\s|\s*$)', cell_str)
+                    m = self.rules.search('table_item', cell_str)
                     if m:
                         category = m.group(1).strip()
                         brand_product = m.group(2).strip()
-                        brand_product = re.split(r'\s{2,}', brand_product)[0]
-                        brand_product = re.sub(r'\s+\d+$', '', brand_product).strip()
+                        brand_product = self.rules.split('multi_space', brand_product)[0]
+                        brand_product = self.rules.sub('trailing_number', '', brand_product).strip()
                         # If brand has a space-separated repeat (e.g. "皓齿健...牙刷 皓齿健 ..."), take first part
                         if ' ' in brand_product and len(brand_product) > 20:
                             first_word = brand_product.split()[0]
@@ -268,24 +519,24 @@ class InvoiceParser:
 
     def _extract_invoice_number(self, text: str, invoice: InvoiceInfo):
         if not invoice.invoice_code:
-            m = re.search(r'发票代码\s*[:：]\s*(\d{10,12})', text)
+            m = self.rules.search('invoice_code', text)
             if m:
                 invoice.invoice_code = m.group(1)
 
         if not invoice.invoice_number:
-            m = re.search(r'发票号码\s*[:：]\s*(\d{8,20})', text)
+            m = self.rules.search('invoice_number', text)
             if m:
                 invoice.invoice_number = m.group(1)
             # Fallback: standalone 20-digit number at start of text
             if not invoice.invoice_number:
-                m = re.search(r'^(\d{20})\s*$', text, re.MULTILINE)
+                m = self.rules.search('invoice_number_standalone', text)
                 if m:
                     invoice.invoice_number = m.group(1)
 
     def _extract_invoice_date(self, text: str, invoice: InvoiceInfo):
         if invoice.invoice_date:
             return
-        m = re.search(r'(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日', text)
+        m = self.rules.search('invoice_date', text)
         if m:
             invoice.invoice_date = f"{m.group(1)}-{m.group(2).zfill(2)}-{m.group(3).zfill(2)}"
 
@@ -318,10 +569,7 @@ class InvoiceParser:
         """
         # Pattern 1: 名称：buyer 销 名称：seller (with colon)
         if not invoice.buyer_name or not invoice.seller_name:
-            m = re.search(
-                r'(?:购|买)\s*名\s*称\s*[:：]\s*(.+?)\s+(?:销|售)\s*名\s*称\s*[:：]\s*(.+)',
-                text
-            )
+            m = self.rules.search('buyer_seller_colon', text)
             if m:
                 buyer = m.group(1).strip()
                 seller = m.group(2).strip()
@@ -332,10 +580,7 @@ class InvoiceParser:
 
         # Pattern 2: 名 称 buyer 售 名 称 seller (no colon, spaces)
         if not invoice.buyer_name or not invoice.seller_name:
-            m = re.search(
-                r'(?:购|买)\s+名\s+称\s+(.+?)\s+(?:销|售)\s+名\s+称\s+(.+)',
-                text
-            )
+            m = self.rules.search('buyer_seller_spaced', text)
             if m:
                 buyer = m.group(1).strip().rstrip(':： ')
                 seller = m.group(2).strip()
@@ -347,10 +592,7 @@ class InvoiceParser:
         # Extract tax IDs from text - buyer section comes before seller section
         if not invoice.buyer_tax_id or not invoice.seller_tax_id:
             # Find all 15-20 char tax IDs in text order
-            tax_ids = re.findall(
-                r'(?:统一社会信用代码|纳税人识别号|税号)\s*/?:?\s*[:：]?\s*([A-Za-z0-9]{15,20})',
-                text
-            )
+            tax_ids = self.rules.findall('tax_id', text)
             corp_tax_ids = [tid.upper() for tid in tax_ids if len(tid) >= 15]
             if corp_tax_ids:
                 # If buyer is a person (no company keywords), skip buyer tax ID
@@ -372,7 +614,7 @@ class InvoiceParser:
         # ---- 合计 line: "合 计\n¥159.20 ¥20.70" or "合 计 ¥7.88 ¥1.02" ----
         if not invoice.amount or not invoice.tax_amount:
             # Find 合计 followed by ¥ amounts (possibly on next line)
-            m = re.search(r'合\s*计\s*\n?\s*[¥￥]\s*([\d,]+\.?\d+)\s+[¥￥]\s*([\d,]+\.?\d+)', text)
+            m = self.rules.search('total_line_pair', text)
             if m:
                 try:
                     if not invoice.amount:
@@ -384,7 +626,7 @@ class InvoiceParser:
 
         # ---- 价税合计(小写): "（小写） ¥179.90" or "(小写) ¥8.90" ----
         if not invoice.total_amount:
-            m = re.search(r'[（(]小写[)）]\s*[¥￥]\s*([\d,]+\.?\d*)', text)
+            m = self.rules.search('total_lower', text)
             if m:
                 try:
                     invoice.total_amount = float(m.group(1).replace(',', ''))
@@ -393,7 +635,7 @@ class InvoiceParser:
 
         # ---- Fallback: single amount after 合计 ----
         if not invoice.amount:
-            m = re.search(r'合\s*计\s*\n?\s*[¥￥]?\s*([\d,]+\.\d{2})', text)
+            m = self.rules.search('total_line_single', text)
             if m:
                 try:
                     invoice.amount = float(m.group(1).replace(',', ''))
@@ -403,14 +645,14 @@ class InvoiceParser:
         # ---- Tax rate ----
         if not invoice.tax_rate:
             # Look for tax rate in context (near 税率 or after %)
-            m = re.search(r'(?:税率|征收率)\s*\n?\s*(\d{1,2})%', text)
+            m = self.rules.search('tax_rate_labeled', text)
             if m:
                 rate = m.group(1)
                 if rate in ('0', '1', '3', '5', '6', '9', '13'):
                     invoice.tax_rate = f"{rate}%"
             else:
                 # Find percentage in amount context
-                m = re.search(r'(\d{1,2})%', text)
+                m = self.rules.search('percent', text)
                 if m:
                     rate = m.group(1)
                     if rate in ('1', '3', '5', '6', '9', '13'):
@@ -422,12 +664,12 @@ class InvoiceParser:
             return
 
         # Pattern: *category*brand/product (stop at spec columns like unit/quantity/price)
-        m = re.search(r'\*([^*]+)\*(.+?)(?:\s+\d+\.\d|\s+台\s|\s+个\s|\s+套\s|\s+件\s|\s+只\s|\s{2,}|\n)', text)
+        m = self.rules.search('text_item', text)
         if m:
             category = m.group(1).strip()
             brand = m.group(2).strip()
-            brand = re.split(r'\s{2,}', brand)[0]
-            brand = re.sub(r'\s+\d+$', '', brand).strip()
+            brand = self.rules.split('multi_space', brand)[0]
+            brand = self.rules.sub('trailing_number', '', brand).strip()
             if len(brand) > 30:
                 brand = brand[:30].rstrip()
             if brand and len(brand) >= 2 and brand != '备注':
@@ -444,8 +686,8 @@ class InvoiceParser:
                 if len(parts) >= 3:
                     category = parts[1].strip()
                     brand = parts[2].strip()
-                    brand = re.split(r'\s{2,}', brand)[0]
-                    brand = re.sub(r'\s+\d+$', '', brand).strip()
+                    brand = self.rules.split('multi_space', brand)[0]
+                    brand = self.rules.sub('trailing_number', '', brand).strip()
                     if len(brand) > 30:
                         brand = brand[:30].rstrip()
                     if brand and len(brand) >= 2:
@@ -455,12 +697,11 @@ class InvoiceParser:
     def _extract_chinese_total(self, text: str, invoice: InvoiceInfo):
         if invoice.total_amount_chinese:
             return
-        chinese_chars = r'[零壹贰叁肆伍陆柒捌玖拾佰仟万亿元角分整圆]'
-        m = re.search(r'[（(]大写[)）]\s*(' + chinese_chars + r'{4,})', text)
+        m = self.rules.search('chinese_total_upper', text)
         if m:
             invoice.total_amount_chinese = m.group(1)
         else:
-            m = re.search(r'价税合计.*?(' + chinese_chars + r'{4,})', text)
+            m = self.rules.search('chinese_total_after_label', text)
             if m:
                 invoice.total_amount_chinese = m.group(1)
 
@@ -470,11 +711,14 @@ class InvoiceParser:
             return
         
         # Method 1: Pattern "备 注：xxx" or "备注: xxx"
-        m = re.search(r'备\s*注\s*[:：]\s*([\S\s]+?)(?:\n\s*(?:开\s*票\s*人|收\s*款\s*人|复\s*核|销\s*售|购\s*买)|$)', text)
+        m = self.rules.search('remark', text)
         if m:
             remark = m.group(1).strip()
+            # An empty 备注 box runs on into the next label ("开票人：…")
+            if self.rules.match('remark_next_label', remark):
+                return
             # If multi-line, collapse to single line but keep spaces
-            invoice.remark = re.sub(r'\s+', ' ', remark).strip()
+            invoice.remark = self.rules.sub('whitespace', ' ', remark).strip()
 
     def _extract_issuer(self, text: str, invoice: InvoiceInfo):
         """Extract issuer (开票人) field."""
@@ -482,7 +726,7 @@ class InvoiceParser:
             return
         
         # Look for "开票人" usually at bottom
-        m = re.search(r'开\s*票\s*人\s*[:：]?\s*(\S+)', text)
+        m = self.rules.search('issuer', text)
         if m:
             invoice.issuer = m.group(1).strip()
 
@@ -503,19 +747,16 @@ class InvoiceParser:
             return
 
         # Look for a line with two company/org-like names
-        org_suffixes = ['公司', '工作室', '有限', '有限公', '厂', '中心', '部', '站', '局',
-                        '处', '所', '院', '店', '行', '社', '商贸', '研究院',
-                        '集团', '银行']
         if not invoice.buyer_name or not invoice.seller_name:
             for line in lines:
                 stripped = line.strip()
-                # Check if line contains org-like keywords
-                has_org_keyword = any(kw in stripped for kw in org_suffixes)
-                if not has_org_keyword:
+                # Org suffixes on this line, with positions, in one pass
+                suffixes = [h for h in self.keywords.scan(stripped) if 'org_suffix' in h.sets]
+                if not suffixes:
                     continue
                 
                 # Try multi-space split first
-                parts = re.split(r'\s{2,}', stripped)
+                parts = self.rules.split('multi_space', stripped)
                 if len(parts) == 2:
                     name1 = parts[0].strip()
                     name2 = parts[1].strip()
@@ -528,11 +769,9 @@ class InvoiceParser:
                 
                 # Try single-space split: find a boundary where an org suffix ends
                 if len(parts) == 1:
-                    suffix_pattern = '|'.join(re.escape(s) for s in org_suffixes)
-                    m = re.match(r'(.+?(?:' + suffix_pattern + r'))\s+(.+)', stripped)
-                    if m:
-                        name1 = m.group(1).strip()
-                        name2 = m.group(2).strip()
+                    split = _split_after_suffix(stripped, suffixes)
+                    if split:
+                        name1, name2 = split
                         # At least one should look like a company name
                         if (self._looks_like_company_name(name1) or self._looks_like_company_name(name2)) and len(name1) >= 4 and len(name2) >= 4:
                             if not invoice.buyer_name:
@@ -544,7 +783,7 @@ class InvoiceParser:
         # Line with two tax IDs
         if not invoice.buyer_tax_id or not invoice.seller_tax_id:
             for line in lines:
-                ids = re.findall(r'([A-Za-z0-9]{15,20})', line.strip())
+                ids = self.rules.findall('sparse_tax_ids', line.strip())
                 if len(ids) == 2:
                     if not invoice.buyer_tax_id:
                         invoice.buyer_tax_id = ids[0].upper()
@@ -568,15 +807,14 @@ class InvoiceParser:
                         pass
                     # Tax rate
                     if not invoice.tax_rate:
-                        m = re.search(r'(\d{1,2})%', vals[1])
+                        m = self.rules.search('percent', vals[1])
                         if m:
                             invoice.tax_rate = f"{m.group(1)}%"
                 break
 
         # Line with Chinese total + number: "肆万壹仟贰佰零壹元壹角伍分 41201.15"
-        chinese_chars = r'[零壹贰叁肆伍陆柒捌玖拾佰仟万亿元角分整圆]'
         for line in lines:
-            m = re.match(r'(' + chinese_chars + r'{4,})\s+([\d,]+\.?\d*)', line.strip())
+            m = self.rules.match('sparse_chinese_total', line.strip())
             if m:
                 if not invoice.total_amount_chinese:
                     invoice.total_amount_chinese = m.group(1)
@@ -610,7 +848,7 @@ class InvoiceParser:
 
         issue_time = custom.get("IssueTime") or custom.get("InvoiceDate") or custom.get("kprq")
         if issue_time:
-            m = re.search(r'(\d{4})[-年/](\d{1,2})[-月/](\d{1,2})', issue_time)
+            m = self.rules.search('metadata_date', issue_time)
             if m:
                 invoice.invoice_date = f"{m.group(1)}-{m.group(2).zfill(2)}-{m.group(3).zfill(2)}"
 
@@ -626,9 +864,62 @@ class InvoiceParser:
                 except:
                     pass
 
+        # Remaining gaps from the same keys the XML / OFD readers know
+        for key, val in custom.items():
+            field_name = FIELD_TAGS.get(key)
+            if field_name and val and getattr(invoice, field_name) in (None, ""):
+                setattr(invoice, field_name, normalize_field(field_name, str(val)))
+
         if invoice.invoice_number:
             invoice.parse_source = "metadata"
 
+    def _metadata_is_complete(self, invoice: InvoiceInfo) -> bool:
+        """Whether metadata alone satisfies the field policy and passes consistency checks."""
+        if invoice.parse_source != "metadata":
+            return False
+
+        for field_name, policy in self.metadata_policy.items():
+            if policy == "required" and getattr(invoice, field_name) in (None, ""):
+                return False
+
+        if invoice.invoice_date:
+            try:
+                datetime.strptime(invoice.invoice_date, "%Y-%m-%d")
+            except ValueError:
+                return False
+
+        a, ta, t = invoice.amount, invoice.tax_amount, invoice.total_amount
+        if a is not None and ta is not None and t is not None:
+            if abs(round(a + ta, 2) - t) > 0.01:
+                return False
+
+        return True
+
+    # ============================================
+    # LAYOUT TEMPLATES
+    # ============================================
+
+    def _apply_template(self, invoice: InvoiceInfo, values: Dict[str, object]) -> bool:
+        """Fill the box fields metadata left empty from a template read, if the result validates."""
+        merged = {f: getattr(invoice, f) if getattr(invoice, f) not in (None, "") else values.get(f)
+                  for f in layout_templates.TEMPLATE_FIELDS}
+        probe = InvoiceInfo(file_path=invoice.file_path, file_name=invoice.file_name, **merged)
+        self._derive_amounts(probe)
+        if not layout_templates.validate(probe.to_dict()):
+            return False
+        for f in layout_templates.TEMPLATE_FIELDS:
+            setattr(invoice, f, getattr(probe, f))
+        invoice.parse_source = "template"
+        return True
+
+    def _train_template(self, template, shift, glyphs, fp, invoice: InvoiceInfo):
+        parsed = {f: getattr(invoice, f) for f in layout_templates.TEMPLATE_FIELDS}
+        if template is None:
+            self.templates.learn(glyphs, fp, parsed)
+        elif template.status == "probation":
+            template.confirm(glyphs, shift, parsed)
+            self.templates.touch(template)
+
     # ============================================
     # UTILITIES
     # ============================================
@@ -645,112 +936,683 @@ class InvoiceParser:
 
     def _clean_company_name(self, raw: str) -> Optional[str]:
         name = raw.strip()
-        name = re.sub(r'\s*[A-Z0-9]{15,20}\s*$', '', name)
-        name = re.sub(r'(纳税人识别号|统一社会信用代码|税号|地.*电话|开户行|账号).*$', '', name)
+        name = self.rules.sub('trailing_tax_id', '', name)
+        name = self.rules.sub('trailing_contact', '', name)
         name = name.strip(' \t:：')
         return name if len(name) >= 2 else None
 
     def _looks_like_company_name(self, text: str) -> bool:
         if not text or len(text) < 4:
             return False
-        keywords = ['公司', '银行', '集团', '中心', '大学', '学院', '医院', '事务所',
-                     '有限', '股份', '合伙', '工厂', '商店', '商行', '研究院', '研究所',
-                     '工作室', '个体', '商贸', '厂', '部', '站', '局', '处', '所',
-                     '院', '店', '行', '社', '有限公']  # '有限公' handles truncated '有限公司'
-        return any(kw in text for kw in keywords)
+        return self.keywords.contains(text, 'org_suffix', 'company')
 
     # ============================================
     # PUBLIC METHODS
     # ============================================
 
-    def extract_raw_text(self, file_path: str, max_chars: int = 3000) -> str:
+    def extract_raw_text(self, file_path: str, max_chars: int = 3000, compact: bool = False) -> str:
+        """
+        First-page text for AI prompts. With compact=True whitespace and
+        boilerplate are squeezed out and the invoice regions come first
+        (compact_text.py); later pages are read only while there is budget left.
+        """
         if not os.path.exists(file_path):
             return ""
         try:
             with pdfplumber.open(file_path) as pdf:
                 if not pdf.pages:
                     return ""
-                text = pdf.pages[0].extract_text()
-                return (text or "")[:max_chars]
+                if not compact:
+                    return pdf_engine.extract_text(pdf.pages[0])[:max_chars]
+
+                from compact_text import compact_invoice_text
+
+                texts = []
+                for page in pdf.pages:
+                    texts.append(pdf_engine.extract_text(page))
+                    text = compact_invoice_text("\n".join(texts), max_chars)
+                    if len(text) >= max_chars:
+                        break
+                return text
         except Exception:
             return ""
 
-    def batch_parse(self, folder_path: str) -> BatchParseResult:
-        files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
+    def iter_extract_text(
+        self,
+        files: List[str],
+        max_chars: int = 3000,
+        compact: bool = False,
+        workers: int = 1,
+        executor: Optional[Executor] = None,
+    ) -> Iterator[dict]:
+        """
+        extract_raw_text over many files, one record per file in completion
+        order: {"file_path", "success", "text", "length", "error"}.
+        """
+        if executor is not None:
+            yield from _iter_text_pool(executor, files, max_chars, compact, max(1, workers) * 4)
+            return
+
+        workers = max(1, min(workers, len(files)))
+        if workers == 1:
+            for fp in files:
+                yield _text_record(fp, self.extract_raw_text(fp, max_chars, compact))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self._worker_kwargs(),)) as pool:
+            yield from _iter_text_pool(pool, files, max_chars, compact, workers * 4)
+
+    def batch_parse(
+        self,
+        folder_path: str,
+        workers: int = 1,
+        on_progress: ProgressCallback = print_progress,
+        executor: Optional[Executor] = None,
+        columnar: bool = False,
+    ) -> BatchParseResult:
+        """
+        Parse every PDF, OFD and XML invoice in a folder.
+
+        With workers > 1 files are fanned out to a process pool. Progress is
+        reported as files finish, but duplicate detection always walks the
+        results in sorted file order, so which copy of a duplicate is kept
+        does not depend on worker scheduling.
+
+        An existing executor (running _init_worker) can be passed in to reuse
+        warm workers instead of starting a new pool.
 
+        columnar=True collects the invoices into result.invoice_columns
+        instead of result.invoices, for large batches.
+        """
         success_list = []
+        columns = InvoiceColumns() if columnar else None
         errors = []
         duplicates = []
-        seen_keys = set()
+        result = None
+
+        for kind, record in self.iter_batch(folder_path, workers, on_progress, executor):
+            if kind == "invoice":
+                if columns is not None:
+                    columns.append(record)
+                else:
+                    success_list.append(record)
+            elif kind == "duplicate":
+                duplicates.append(record)
+            elif kind == "error":
+                errors.append(record)
+            else:
+                result = record
+
+        result.invoices = success_list
+        result.invoice_columns = columns
+        result.errors = errors
+        result.duplicates = duplicates
+        return result
+
+    def iter_batch(
+        self,
+        folder_path: str,
+        workers: int = 1,
+        on_progress: ProgressCallback = print_progress,
+        executor: Optional[Executor] = None,
+    ) -> Iterator[Tuple[str, object]]:
+        """
+        Streaming form of batch_parse.
+
+        Yields ("invoice", InvoiceInfo), ("duplicate", DuplicateRecord) and
+        ("error", ErrorRecord) in sorted file order as soon as each file is
+        settled, then one ("summary", BatchParseResult) whose record lists are
+        empty. Nothing per-invoice is retained past its report (a file with
+        byte-identical copies keeps its outcome until the last copy is out),
+        so memory does not grow with the batch size.
 
+        With file_timeout / max_memory_mb / batch_timeout set, a file that
+        exceeds them becomes an ErrorRecord with reason "timeout" / "oom"
+        and the batch carries on; batch_timeout counts from this call.
+
+        OFD / XML files are read up front in this process. When one of them
+        shares its dedup key with a PDF, the structured copy is kept and the
+        PDF reported as the duplicate, whichever sorts first.
+
+        folder_path may also be a single zip / eml. Zip and eml files (nested
+        ones too) are parsed member by member without unpacking to disk;
+        their file names read `bundle.zip!/a.pdf`.
+
+        With a dedup_index, invoices already handed out by another batch are
+        reported as duplicates pointing at where they were first seen, and
+        files whose bytes were seen before (in any batch) are not parsed.
+
+        With a snapshot store, a PDF that has a layout snapshot is extracted
+        from it without being opened, and every PDF parsed leaves one.
+        """
+        deadline = time.perf_counter() + self.batch_timeout if self.batch_timeout else None
+        listed, archive_errors = list_inputs(folder_path, ('.pdf',) + STRUCTURED_EXTENSIONS, self.spill_bytes)
+        files = [name for name, _ in listed]
+        entries = [entry for _, entry in listed]
+
+        seen_keys = set()
+        success_count = duplicate_count = fail_count = 0
+
+        # Results that finished ahead of an earlier file wait here until
+        # everything before them has been de-duplicated.
+        pending: Dict[int, ParseOutcome] = {}
+        next_idx = 0
+
+        # Cache and dedup index lookups happen here in the parent; only misses reach
+        # the parser workers, and their results are written back from here as well.
+        hashes: Dict[int, str] = {}
+        to_parse: List[int] = []
+        index = self.dedup_index
+
+        # Files skipped unparsed because the same bytes were seen before, in an
+        # earlier batch (FirstSeen) or earlier in this one (that file's index)
+        known_files: Dict[int, Union[FirstSeen, int]] = {}
+        # Copies still to be reported per file that is first with its bytes,
+        # and how that file was settled, which its copies repeat; both are
+        # dropped once its last copy is out
+        copies_left: Dict[int, int] = {}
+        copy_records: Dict[int, Union[DuplicateRecord, ErrorRecord]] = {}
+
+        # How each file was answered: OFD/XML data, identical to a file seen before,
+        # parse cache, metadata fast path, layout template or page layout
+        tier_counts = {"structured": 0, "identical": 0, "cache": 0, "metadata": 0, "template": 0, "layout": 0}
+
+        # Structured files (and unreadable archives) are settled before any PDF
+        # so their keys can win dedup
+        settled: Dict[int, ParseOutcome] = {}
+        structured_keys: Dict[str, str] = {}
         for idx, f in enumerate(files):
-            print(json.dumps({
-                "type": "progress",
-                "current": idx + 1,
-                "total": len(files),
-                "file": f
-            }), flush=True)
+            if f in archive_errors:
+                settled[idx] = (False, None, archive_errors[f])
+            elif is_structured(f):
+                settled[idx] = self.parse_single_invoice(entries[idx])
+                ok, inv, _ = settled[idx]
+                if ok and inv:
+                    tier_counts["structured"] += 1
+                    structured_keys.setdefault(_dedup_key(inv), f)
+
+        if self.stage_timer is not None:
+            self.stage_report = StageReport()
+        self.latency_report = None
+
+        def outcomes() -> Iterator[Tuple[int, Optional[ParseOutcome]]]:
+            yield from settled.items()
+            # Hash everything first, so a file's copies are known before it is reported
+            if self.cache or index is not None:
+                first_by_hash: Dict[str, int] = {}
+                for idx, entry in enumerate(entries):
+                    if idx in settled:
+                        continue
+                    try:
+                        content_hash = hashes[idx] = _hash_entry(entry)
+                    except (OSError, KeyError, zipfile.BadZipFile):
+                        continue
+                    first = first_by_hash.setdefault(content_hash, idx)
+                    if first != idx:
+                        known_files[idx] = first
+                        copies_left[first] = copies_left.get(first, 0) + 1
 
-            fp = os.path.join(folder_path, f)
-            ok, inv, err = self.parse_single_invoice(fp)
+            for idx, entry in enumerate(entries):
+                if idx in settled:
+                    continue
+                content_hash = hashes.get(idx)
+                if content_hash is None:
+                    to_parse.append(idx)
+                    continue
 
-            if ok and inv:
-                key = inv.invoice_number if inv.invoice_number else f"{inv.seller_name}|{inv.amount}|{inv.invoice_date}"
+                # None: settled unparsed as a copy of an earlier file
+                if idx not in known_files and index is not None:
+                    seen = index.find_file(content_hash, _entry_path(entry))
+                    if seen is not None:
+                        known_files[idx] = seen
+                if idx in known_files:
+                    tier_counts["identical"] += 1
+                    yield idx, None
+                    continue
 
-                if key in seen_keys:
-                    duplicates.append(DuplicateRecord(
-                        file_name=f,
-                        invoice_number=inv.invoice_number,
-                        reason="批次内重复"
-                    ))
+                inv = self.cache.get(content_hash, _entry_path(entry)) if self.cache else None
+                if inv:
+                    tier_counts["cache"] += 1
+                    yield idx, (True, inv, None)
                 else:
-                    seen_keys.add(key)
-                    success_list.append(inv)
-            else:
-                errors.append(ErrorRecord(file_path=fp, error=err or "Unknown error"))
+                    to_parse.append(idx)
+
+            for idx, outcome in self._iter_parse(entries, files, to_parse, workers, executor, deadline):
+                ok, inv, _ = outcome
+                if ok and inv:
+                    tier = inv.parse_source if inv.parse_source in ("metadata", "template") else "layout"
+                    tier_counts[tier] += 1
+                    if self.cache and idx in hashes:
+                        self.cache.put(hashes[idx], inv)
+                yield idx, outcome
+
+        for done, (idx, outcome) in enumerate(outcomes()):
+            event = {
+                "type": "progress",
+                "current": done + 1,
+                "total": len(files),
+                "file": files[idx]
+            }
+            if self.stage_report is not None:
+                # None for cache hits: nothing was parsed
+                event["stages"] = self.stage_report.take_last()
+            on_progress(event)
+
+            pending[idx] = outcome
+            while next_idx in pending:
+                outcome = pending.pop(next_idx)
+                cur = next_idx
+                f = files[cur]
+                next_idx += 1
+                content_hash = hashes.pop(cur, None)
+                first_copy = cur in copies_left
+
+                if outcome is None:
+                    first = known_files.pop(cur)
+                    if isinstance(first, FirstSeen):
+                        record = _earlier_batch_duplicate(f, first)
+                    else:
+                        record = copy_records[first]
+                        copies_left[first] -= 1
+                        if not copies_left[first]:
+                            del copies_left[first], copy_records[first]
+                    if first_copy:
+                        copy_records[cur] = record
+                    if isinstance(record, ErrorRecord):
+                        fail_count += 1
+                        yield "error", ErrorRecord(file_path=_entry_path(entries[cur]), error=record.error,
+                                                   reason=record.reason)
+                    else:
+                        duplicate_count += 1
+                        yield "duplicate", DuplicateRecord(
+                            file_name=f,
+                            invoice_number=record.invoice_number,
+                            reason=record.reason,
+                            first_batch_id=record.first_batch_id,
+                            first_file_path=record.first_file_path
+                        )
+                    continue
 
-        return BatchParseResult(
-            success=len(success_list) > 0,
-            invoices=success_list,
-            errors=errors,
-            duplicates=duplicates,
+                ok, inv, err = outcome
+                if ok and inv:
+                    key = _dedup_key(inv)
+                    kept = structured_keys.get(key)
+                    in_batch = key in seen_keys or (kept is not None and kept != f)
+                    seen = index.find(inv) if index is not None and not in_batch else None
+
+                    if in_batch:
+                        duplicate_count += 1
+                        record = DuplicateRecord(
+                            file_name=f,
+                            invoice_number=inv.invoice_number,
+                            reason="批次内重复" if key in seen_keys else f"批次内重复（以 {kept} 为准）"
+                        )
+                        if first_copy:
+                            copy_records[cur] = record
+                        yield "duplicate", record
+                    elif seen is not None:
+                        duplicate_count += 1
+                        index.add(inv, content_hash, seen)
+                        record = _earlier_batch_duplicate(f, seen)
+                        if first_copy:
+                            copy_records[cur] = record
+                        yield "duplicate", record
+                    else:
+                        seen_keys.add(key)
+                        success_count += 1
+                        if index is not None:
+                            index.add(inv, content_hash)
+                        if first_copy:
+                            copy_records[cur] = DuplicateRecord(
+                                file_name=f,
+                                invoice_number=inv.invoice_number,
+                                reason=f"批次内重复（与 {f} 内容相同）",
+                                first_batch_id=index.batch_id if index is not None else None,
+                                first_file_path=_entry_path(entries[cur])
+                            )
+                        yield "invoice", inv
+                else:
+                    fail_count += 1
+                    error = ErrorRecord(file_path=_entry_path(entries[cur]), error=err or "Unknown error",
+                                        reason=getattr(err, "reason", None))
+                    if first_copy:
+                        copy_records[cur] = error
+                    yield "error", error
+
+        if index is not None:
+            index.commit()
+
+        yield "summary", BatchParseResult(
+            success=success_count > 0,
+            invoices=[],
+            errors=[],
+            duplicates=[],
             total_files=len(files),
-            success_count=len(success_list),
-            duplicate_count=len(duplicates),
-            fail_count=len(errors)
+            success_count=success_count,
+            duplicate_count=duplicate_count,
+            fail_count=fail_count,
+            cache_hits=tier_counts["cache"],
+            cache_misses=len(to_parse) if self.cache else 0,
+            tier_counts=tier_counts,
+            rule_stats=self.rule_stats.to_dict() if self.rule_stats is not None else None,
+            profile=self.stage_report.to_dict() if self.stage_report is not None else None,
+            latency=self.latency_report
         )
 
+    def iter_reextract(
+        self,
+        workers: int = 1,
+        on_progress: ProgressCallback = print_progress,
+        executor: Optional[Executor] = None,
+    ) -> Iterator[Tuple[str, object]]:
+        """
+        Re-run field extraction over every snapshot in the snapshot store,
+        without opening any PDF (the files need not exist any more).
+
+        Yields ("invoice", InvoiceInfo) and ("error", ErrorRecord) in file
+        path order, then one ("summary", BatchParseResult). Nothing is
+        de-duplicated: every snapshot is a distinct file. With a cache the
+        results are written to it, so the next parse of those files hits.
+        A file once answered by its metadata alone has no page in its
+        snapshot; if the fast path now rejects it, it comes back as an error.
+        """
+        if self.snapshots is None:
+            raise ValueError("iter_reextract needs a snapshot store")
+        deadline = time.perf_counter() + self.batch_timeout if self.batch_timeout else None
+        entries: List[InputEntry] = self.snapshots.entries()
+        files = [entry.path for entry in entries]
+
+        if self.stage_timer is not None:
+            self.stage_report = StageReport()
+        self.latency_report = None
+
+        tier_counts = {"metadata": 0, "template": 0, "layout": 0}
+        success_count = fail_count = 0
+        pending: Dict[int, ParseOutcome] = {}
+        next_idx = 0
+        parsed = self._iter_parse(entries, files, list(range(len(entries))), workers, executor, deadline)
+        for done, (idx, outcome) in enumerate(parsed):
+            event = {
+                "type": "progress",
+                "current": done + 1,
+                "total": len(files),
+                "file": files[idx]
+            }
+            if self.stage_report is not None:
+                event["stages"] = self.stage_report.take_last()
+            on_progress(event)
+
+            pending[idx] = outcome
+            while next_idx in pending:
+                ok, inv, err = pending.pop(next_idx)
+                entry = entries[next_idx]
+                next_idx += 1
+                if ok and inv:
+                    success_count += 1
+                    tier_counts[inv.parse_source if inv.parse_source in ("metadata", "template") else "layout"] += 1
+                    if self.cache:
+                        self.cache.put(entry.content_hash, inv)
+                    yield "invoice", inv
+                else:
+                    fail_count += 1
+                    yield "error", ErrorRecord(file_path=entry.path, error=err or "Unknown error",
+                                               reason=getattr(err, "reason", None))
+
+        yield "summary", BatchParseResult(
+            success=success_count > 0,
+            invoices=[],
+            errors=[],
+            duplicates=[],
+            total_files=len(files),
+            success_count=success_count,
+            duplicate_count=0,
+            fail_count=fail_count,
+            tier_counts=tier_counts,
+            rule_stats=self.rule_stats.to_dict() if self.rule_stats is not None else None,
+            profile=self.stage_report.to_dict() if self.stage_report is not None else None,
+            latency=self.latency_report
+        )
+
+    def _iter_parse(
+        self,
+        entries: List[InputEntry],
+        files: List[str],
+        indices: List[int],
+        workers: int,
+        executor: Optional[Executor] = None,
+        deadline: Optional[float] = None,
+    ) -> Iterator[Tuple[int, ParseOutcome]]:
+        """Parse entries[i] for i in indices, yielding (index, outcome) pairs in completion order."""
+        if self.file_timeout or self.max_memory_mb or deadline is not None:
+            # A shared executor's workers cannot be killed one at a time
+            yield from self._iter_watchdog(entries, files, indices, workers, deadline)
+            return
+        if executor is not None:
+            yield from self._iter_pool(executor, entries, files, indices, max(1, workers) * 4)
+            return
+
+        workers = max(1, min(workers, len(indices)))
+        if workers == 1:
+            for idx in indices:
+                entry = entries[idx]
+                if isinstance(entry, str) and not os.path.exists(entry):
+                    yield idx, (False, None, f"File not found: {entry}")
+                elif self.stage_timer is not None:
+                    outcome, stages = self._profiled_parse(entry)
+                    self.stage_report.add(files[idx], stages)
+                    yield idx, outcome
+                else:
+                    yield idx, self._parse_entry(entry)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self._worker_kwargs(),)) as pool:
+            yield from self._iter_pool(pool, entries, files, indices, workers * 4)
+
+    def _worker_kwargs(self) -> dict:
+        """Settings a pool worker needs to parse exactly like this instance (cache stays in the parent)."""
+        return {
+            "metadata_fast_path": self.metadata_fast_path,
+            "metadata_policy": self.metadata_policy,
+            "rule_stats": self.rule_stats is not None,
+            "profile": self.stage_timer is not None,
+            "templates": self.templates,
+            "spill_mb": self.spill_bytes / (1024 * 1024),
+            "keyword_sets": self.keyword_sets,
+            "snapshots": self.snapshots,
+        }
+
+    def _iter_watchdog(
+        self,
+        entries: List[InputEntry],
+        files: List[str],
+        indices: List[int],
+        workers: int,
+        deadline: Optional[float],
+    ) -> Iterator[Tuple[int, ParseOutcome]]:
+        """Parse under per-file / batch limits, even with one worker, so a stuck file can be killed."""
+        pool = WatchdogPool(min(workers, len(indices)), self._worker_kwargs(), self.file_timeout,
+                            self.max_memory_mb, deadline)
+        tasks = [(idx, entries[idx]) for idx in indices]
+        for idx, outcome, extras in pool.run(tasks):
+            self._merge_extras(files[idx], extras)
+            yield idx, outcome
+        self.latency_report = pool.report()
+
+    def _merge_extras(self, file_name: str, extras: Dict[str, dict]):
+        if self.rule_stats is not None and "rule_stats" in extras:
+            self.rule_stats.merge(extras["rule_stats"])
+        if self.stage_report is not None and "stages" in extras:
+            self.stage_report.add(file_name, extras["stages"])
+        if self.templates is not None and "templates" in extras:
+            self.templates.merge(extras["templates"])
+
+    def _iter_pool(
+        self,
+        pool: Executor,
+        entries: List[InputEntry],
+        files: List[str],
+        indices: List[int],
+        window: int,
+    ) -> Iterator[Tuple[int, ParseOutcome]]:
+        """Keep at most `window` files in flight so finished results never pile up."""
+        # Rule stats, stage timings and learned templates live in the workers, so each file ships them back
+        instrumented = self.rule_stats is not None or self.stage_report is not None or self.templates is not None
+        worker_fn = _parse_in_worker_instrumented if instrumented else _parse_in_worker
+        queue = iter(indices)
+        futures = {}
+
+        def submit_next() -> bool:
+            idx = next(queue, None)
+            if idx is None:
+                return False
+            futures[pool.submit(worker_fn, entries[idx])] = idx
+            return True
+
+        while len(futures) < window and submit_next():
+            pass
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = futures.pop(future)
+                submit_next()
+                try:
+                    if instrumented:
+                        outcome, extras = future.result()
+                        self._merge_extras(files[idx], extras)
+                        yield idx, outcome
+                    else:
+                        yield idx, future.result()
+                except Exception as e:
+                    # e.g. BrokenProcessPool when a worker dies mid-file
+                    yield idx, (False, None, str(e))
+
     def export_excel(self, invoices: List[InvoiceInfo], output_path: str) -> None:
-        import pandas as pd
-
-        data = []
-        for index, inv in enumerate(invoices):
-            data.append({
-                "序号": index + 1,
-                "发票号码": inv.invoice_number,
-                "购方名称": inv.buyer_name,
-                "购方税号": inv.buyer_tax_id,
-                "销方名称": inv.seller_name,
-                "销方税号": inv.seller_tax_id,
-                "开票日期": inv.invoice_date,
-                "项目名称": inv.item_name,
-                "金额": inv.amount,
-                "税率": inv.tax_rate,
-                "税额": inv.tax_amount,
-                "价税合计": inv.total_amount,
-                "备注": inv.remark,
-                "开票人": inv.issuer,
-                "价税合计(大写)": inv.total_amount_chinese,
-                "源文件": inv.file_path
-            })
-
-        df = pd.DataFrame(data)
-        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
-
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='发票清单')
-            worksheet = writer.sheets['发票清单']
-            for i, col in enumerate(df.columns):
-                max_len = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                col_letter = chr(65 + i) if i < 26 else chr(64 + i // 26) + chr(65 + i % 26)
-                worksheet.column_dimensions[col_letter].width = min(max_len, 50)
+        from excel_export import export_records
+
+        export_records((inv.to_dict() for inv in invoices), output_path)
+
+
+# ============================================
+# PROCESS POOL WORKERS
+# ============================================
+
+_worker_parser: Optional[InvoiceParser] = None
+
+
+def _dedup_key(inv: InvoiceInfo) -> str:
+    return inv.invoice_number if inv.invoice_number else f"{inv.seller_name}|{inv.amount}|{inv.invoice_date}"
+
+
+def _earlier_batch_duplicate(file_name: str, first: FirstSeen) -> DuplicateRecord:
+    return DuplicateRecord(
+        file_name=file_name,
+        invoice_number=first.invoice_number,
+        reason=f"已在批次 {first.batch_id} 中导入（{os.path.basename(first.file_path)}）",
+        first_batch_id=first.batch_id,
+        first_file_path=first.file_path
+    )
+
+
+def _split_after_suffix(line: str, suffixes: List[Hit]) -> Optional[Tuple[str, str]]:
+    """Split "公司A 公司B" at the first org suffix that has a name before it and whitespace after it."""
+    for hit in suffixes:
+        end = hit.end
+        if hit.start >= 1 and end + 1 < len(line) and line[end].isspace():
+            return line[:end].strip(), line[end:].strip()
+    return None
+
+
+def _entry_path(entry: InputEntry) -> str:
+    return entry.path if isinstance(entry, ArchiveMember) else entry
+
+
+def _hash_entry(entry: InputEntry) -> str:
+    if isinstance(entry, ArchiveMember):
+        with open_member(entry) as source:
+            return hash_file(source)
+    return hash_file(entry)
+
+
+def _parse_member(member: ArchiveMember, parse: Callable[[str, Source], ParseOutcome]) -> ParseOutcome:
+    try:
+        with open_member(member) as source:
+            return parse(member.path, source)
+    except (OSError, KeyError, zipfile.BadZipFile) as e:
+        return False, None, f"Unreadable archive member {member.path}: {e}"
+
+
+def _init_worker(parser_kwargs: Optional[dict] = None):
+    global _worker_parser
+    _worker_parser = InvoiceParser(**(parser_kwargs or {}))
+
+
+def _parse_in_worker(file_path: InputEntry) -> ParseOutcome:
+    return _worker_parser.parse_single_invoice(file_path)
+
+
+def _parse_in_worker_instrumented(file_path: InputEntry) -> Tuple[ParseOutcome, Dict[str, dict]]:
+    """Parse plus whichever of rule stats / stage timings / template updates this worker collects."""
+    extras = {}
+    stats = None
+    if _worker_parser.rule_stats is not None:
+        stats = RuleStats()
+        _worker_parser.rules.stats = stats
+
+    if _worker_parser.stage_timer is not None and (not isinstance(file_path, str) or os.path.exists(file_path)):
+        outcome, extras["stages"] = _worker_parser._profiled_parse(file_path)
+    else:
+        outcome = _worker_parser.parse_single_invoice(file_path)
+
+    if stats is not None:
+        extras["rule_stats"] = stats.to_dict()
+    if _worker_parser.templates is not None:
+        updates = _worker_parser.templates.take_updates()
+        if updates:
+            extras["templates"] = updates
+    return outcome, extras
+
+
+def _extract_text_in_worker(file_path: str, max_chars: int, compact: bool = False) -> str:
+    return _worker_parser.extract_raw_text(file_path, max_chars, compact)
+
+
+def _text_record(file_path: str, text: str, error: Optional[str] = None) -> dict:
+    if error is None and not os.path.exists(file_path):
+        error = f"File not found: {file_path}"
+    return {
+        "file_path": file_path,
+        "success": error is None,
+        "text": text,
+        "length": len(text),
+        "error": error,
+    }
+
+
+def _iter_text_pool(pool: Executor, files: List[str], max_chars: int, compact: bool,
+                    window: int) -> Iterator[dict]:
+    """Same bounded submission window as InvoiceParser._iter_pool, for extract_raw_text."""
+    queue = iter(files)
+    futures = {}
+
+    def submit_next() -> bool:
+        fp = next(queue, None)
+        if fp is None:
+            return False
+        futures[pool.submit(_extract_text_in_worker, fp, max_chars, compact)] = fp
+        return True
+
+    while len(futures) < window and submit_next():
+        pass
+
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            fp = futures.pop(future)
+            submit_next()
+            try:
+                yield _text_record(fp, future.result())
+            except Exception as e:
+                yield _text_record(fp, "", str(e))
@@ -0,0 +1,128 @@
+"""
+Write parsed invoices straight into the workspace SQLite database
+(`main.py parse --db ... --batch_id ...`).
+
+The default parse output round-trips every invoice through asdict + JSON,
+Node's stdout buffer, mapPythonResultToTs and drizzle inserts. With this
+sink the rows go from InvoiceInfo to the `invoices` table directly and
+only the summary is printed. The app does not use it (its batches are
+created from the exported Excel after parsing); it is for scripted
+imports into an existing batch.
+
+Rows mirror importPdfInvoices in importService.ts:
+- Columns follow `invoices` in database/schema.ts.
+- amount = total_amount ?? amount.
+- invoice_date and created_at are epoch seconds; dates are UTC midnight,
+  like new Date('YYYY-MM-DD').
+- Rows already in the batch are skipped with the same num:/combo: keys.
+
+Inserts are buffered and written with executemany, one transaction per
+chunk, on a WAL connection, so Electron's own connection keeps reading
+while a parse runs.
+"""
+import calendar
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from models import DuplicateRecord, InvoiceInfo
+
+DEFAULT_CHUNK_SIZE = 500
+BUSY_TIMEOUT_S = 30
+UNKNOWN_SELLER = "未知销售方"
+
+INVOICE_COLUMNS = (
+    "id", "batch_id", "invoice_code", "invoice_number", "seller_name", "amount", "invoice_date",
+    "status", "match_id", "created_at",
+    "buyer_name", "buyer_tax_id", "seller_tax_id", "tax_amount", "tax_rate", "invoice_type",
+    "item_name", "remark", "issuer", "parse_source", "source_file_path",
+)
+_INSERT = (f"INSERT INTO invoices ({', '.join(INVOICE_COLUMNS)}) "
+           f"VALUES ({', '.join('?' for _ in INVOICE_COLUMNS)})")
+
+
+def _js_number(value: float) -> str:
+    """String(value) as JavaScript prints it, for dedup keys shared with importService.ts."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _epoch_day(date: Optional[str]) -> Optional[int]:
+    if not date:
+        return None
+    try:
+        return calendar.timegm(datetime.strptime(date, "%Y-%m-%d").timetuple())
+    except ValueError:
+        return None
+
+
+def dedup_key(invoice_number: Optional[str], seller: Optional[str], amount: Optional[float],
+              date: Optional[str]) -> str:
+    if invoice_number:
+        return f"num:{invoice_number}"
+    amount_text = _js_number(amount) if amount is not None else ""
+    return f"combo:{(seller or '').strip()}|{amount_text}|{(date or '').strip()}"
+
+
+class SqliteInvoiceSink:
+    def __init__(self, db_path: str, batch_id: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.batch_id = batch_id
+        self.chunk_size = max(1, chunk_size)
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        if self.conn.execute("SELECT 1 FROM reconciliation_batches WHERE id = ?", (batch_id,)).fetchone() is None:
+            self.conn.close()
+            raise ValueError(f"Unknown batch: {batch_id}")
+
+        self.keys = set()
+        for number, seller, amount, date in self.conn.execute(
+                "SELECT invoice_number, seller_name, amount, invoice_date FROM invoices WHERE batch_id = ?",
+                (batch_id,)):
+            day = datetime.fromtimestamp(date, timezone.utc).strftime("%Y-%m-%d") if date is not None else ""
+            self.keys.add(dedup_key(number, seller, amount, day))
+
+        self.pending: List[Tuple] = []
+        self.imported = 0
+        self.skipped: List[DuplicateRecord] = []
+
+    def add(self, inv: InvoiceInfo):
+        amount = inv.total_amount if inv.total_amount is not None else inv.amount
+        key = dedup_key(inv.invoice_number, inv.seller_name, amount, inv.invoice_date)
+        if key in self.keys:
+            self.skipped.append(DuplicateRecord(file_name=inv.file_name, invoice_number=inv.invoice_number,
+                                                reason="批次内重复"))
+            return
+        self.keys.add(key)
+        self.pending.append((
+            str(uuid.uuid4()), self.batch_id, inv.invoice_code, inv.invoice_number,
+            inv.seller_name or UNKNOWN_SELLER, amount if amount is not None else 0, _epoch_day(inv.invoice_date),
+            "pending", None, int(time.time()),
+            inv.buyer_name, inv.buyer_tax_id, inv.seller_tax_id, inv.tax_amount, inv.tax_rate, inv.invoice_type,
+            inv.item_name, inv.remark, inv.issuer, inv.parse_source, inv.file_path,
+        ))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(_INSERT, self.pending)
+            self.conn.execute("UPDATE reconciliation_batches SET total_invoice_count = "
+                              "COALESCE(total_invoice_count, 0) + ?, status = 'pending' WHERE id = ?",
+                              (len(self.pending), self.batch_id))
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.imported += len(self.pending)
+        self.pending = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
@@ -0,0 +1,141 @@
+"""
+Multi-keyword matching for the company-name / org-suffix heuristics.
+
+Keyword sets are plain data (rules.KEYWORD_SETS), extended per workspace
+by a JSON file of the same shape:
+
+    {"org_suffix": ["合作社", "经营部"], "company": ["联合体"]}
+
+KeywordMatcher compiles all sets once:
+
+  - an Aho-Corasick automaton over every keyword of every set; scan()
+    walks the text once and reports each occurrence (overlapping ones
+    included) with its position and the sets it belongs to
+  - one alternation regex per requested combination of sets, longest
+    keyword first, for contains(); a yes/no test only needs the first hit
+    and the regex engine finds it in C, several times faster than
+    `any(kw in text for kw in keywords)` over a few dozen keywords
+
+Adding keywords makes the automaton larger, not the scan longer: scan()
+is one step per character however many keywords there are.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+KEYWORDS_FILE_NAME = ".invoice_keywords.json"
+
+
+class Hit(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    sets: FrozenSet[str]
+
+
+def default_keywords_path(folder_path: str) -> str:
+    """Keyword file lives in the workspace root, next to the parse cache."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder_path)), KEYWORDS_FILE_NAME)
+
+
+def merge_keyword_sets(base: Dict[str, List[str]], extra: Dict[str, Iterable[str]]) -> Dict[str, List[str]]:
+    """base plus extra's keywords, set by set; only the sets base already has may be extended."""
+    unknown = set(extra) - set(base)
+    if unknown:
+        raise ValueError(f"Unknown keyword sets: {', '.join(sorted(unknown))} "
+                         f"(expected: {', '.join(sorted(base))})")
+    merged = {name: list(words) for name, words in base.items()}
+    for name, words in extra.items():
+        if isinstance(words, str) or not all(isinstance(w, str) for w in words):
+            raise ValueError(f"Keyword set {name!r} must be a list of strings")
+        merged[name].extend(w for w in words if w and w not in merged[name])
+    return merged
+
+
+def load_keyword_sets(path: str, base: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        extra = json.load(f)
+    if not isinstance(extra, dict):
+        raise ValueError(f"{path}: expected an object of keyword lists")
+    return merge_keyword_sets(base, extra)
+
+
+def keyword_sets_digest(sets: Dict[str, List[str]]) -> str:
+    """Short stable hash of the sets, for cache version stamps."""
+    canonical = json.dumps({name: sorted(words) for name, words in sorted(sets.items())},
+                           ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:8]
+
+
+class KeywordMatcher:
+    def __init__(self, sets: Dict[str, Iterable[str]]):
+        self.sets = {name: tuple(dict.fromkeys(w for w in words if w)) for name, words in sets.items()}
+        self._regexes: Dict[Tuple[str, ...], Optional[re.Pattern]] = {}
+        self._build_automaton()
+
+    def _build_automaton(self):
+        owners: Dict[str, set] = {}
+        for name, words in self.sets.items():
+            for word in words:
+                owners.setdefault(word, set()).add(name)
+
+        # Trie: goto[state] maps a character to the next state
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[Optional[str]] = [None]
+        for word in owners:
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    goto.append({})
+                    terminal.append(None)
+                    nxt = goto[state][ch] = len(goto) - 1
+                state = nxt
+            terminal[state] = word
+
+        # Failure links breadth-first; a state's outputs are its own keyword
+        # plus those of the longest proper suffix that is also a trie path
+        fail = [0] * len(goto)
+        outputs: List[Tuple[Tuple[int, str, FrozenSet[str]], ...]] = [()] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            word = terminal[state]
+            own = ((len(word), word, frozenset(owners[word])),) if word is not None else ()
+            outputs[state] = own + outputs[fail[state]]
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                queue.append(nxt)
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def scan(self, text: str) -> List[Hit]:
+        """Every keyword occurrence in one pass, ordered by end position (longest first on ties)."""
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        hits: List[Hit] = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if outputs[state]:
+                end = i + 1
+                for length, word, names in outputs[state]:
+                    hits.append(Hit(end - length, end, word, names))
+        return hits
+
+    def contains(self, text: str, *names: str) -> bool:
+        """Whether any keyword of the named sets occurs in text."""
+        regex = self._regexes.get(names, False)
+        if regex is False:
+            words = sorted({w for name in names for w in self.sets[name]}, key=len, reverse=True)
+            regex = re.compile("|".join(re.escape(w) for w in words)) if words else None
+            self._regexes[names] = regex
+        return regex is not None and regex.search(text) is not None
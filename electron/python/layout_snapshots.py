@@ -0,0 +1,282 @@
+"""
+Layout snapshots: what field extraction reads from a PDF, kept per file.
+
+Nearly all of a parse is pdfminer layout analysis; the extractors only
+look at the PDF metadata, the first page's chars (for layout templates),
+its text and its table cells. A snapshot stores exactly those, keyed by
+the SHA-256 of the PDF bytes, so when the heuristics change a file is
+re-extracted from its snapshot without opening the PDF again.
+
+Chars are stored column-wise (text, x0, top, x1, bottom, upright, with
+coordinates to 1/1000 pt) and the whole snapshot as zlib-compressed JSON,
+a few KB per invoice. Word boxes are not stored: they are rebuilt from
+the chars on demand, as pdfplumber itself does. Text and tables are
+stored only if the parse computed them; a file read through a layout
+template skips the tables, so its snapshot keeps the page's ruling edges
+instead and a replay that needs them rebuilds tables from the edges, with
+the same pdf_engine code. A file answered from its metadata alone never
+had its page analysed, so its snapshot holds only the metadata; if the
+fast path no longer accepts it, the PDF is needed.
+
+Snapshots are only valid for the text / table output they were taken
+with: SNAPSHOT_VERSION and the pdfplumber version are part of the key,
+so bumping either makes every older snapshot a miss.
+"""
+import os
+import sqlite3
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+import pdfplumber
+
+import fast_json
+import pdf_engine
+from pdf_engine import Table
+
+SNAPSHOT_FILE_NAME = ".layout_snapshots.sqlite"
+# Bump whenever the stored fields or pdf_engine's text / table output change
+SNAPSHOT_VERSION = "2"
+# Parse outcome error for a metadata-only snapshot whose page is needed after all
+NO_LAYOUT = "Layout snapshot has no page layout"
+
+_CHAR_KEYS = ("x0", "top", "x1", "bottom")
+# What TableFinder reads (and moves / resizes) on an edge
+_EDGE_KEYS = ("x0", "top", "x1", "bottom", "doctop", "width", "height")
+
+
+def default_snapshots_path(folder_path: str) -> str:
+    """Snapshots live in the workspace root, next to the parse cache."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder_path)), SNAPSHOT_FILE_NAME)
+
+
+def snapshot_version() -> str:
+    return f"{SNAPSHOT_VERSION}+pdfplumber-{pdfplumber.__version__}"
+
+
+def _plain(value: Any) -> Any:
+    """PDF metadata as JSON-safe values (names and byte strings become text)."""
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+class PdfLayout:
+    """The extractors' view of an open PDF; the page is analysed on first use."""
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.metadata = pdf.metadata
+        self.page_count = len(pdf.pages)
+        self.page = None
+        self._text: Optional[str] = None
+        self._tables: Optional[List[Table]] = None
+
+    def first_page(self):
+        if self.page is None:
+            self.page = self.pdf.pages[0]
+            pdf_engine.load_page_objects(self.page)
+        return self.page
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = pdf_engine.extract_text(self.first_page())
+        return self._text
+
+    def tables(self) -> List[Table]:
+        if self._tables is None:
+            self._tables = pdf_engine.extract_tables(self.first_page())
+        return self._tables
+
+    def snapshot(self) -> "LayoutSnapshot":
+        """
+        Everything read so far, and nothing more: text and tables are kept
+        if they were extracted, otherwise the page's edges so they can be.
+        """
+        if self.page is None:
+            return LayoutSnapshot(_plain(self.metadata), self.page_count)
+        page = self.page
+        chars = {"text": [c["text"] for c in page.chars], "upright": [bool(c["upright"]) for c in page.chars]}
+        for key in _CHAR_KEYS:
+            chars[key] = [round(float(c[key]), 3) for c in page.chars]
+        edges = None
+        if self._tables is None:
+            edges = {"orientation": [e["orientation"] for e in page.edges],
+                     "object_type": [e["object_type"] for e in page.edges]}
+            for key in _EDGE_KEYS:
+                edges[key] = [float(e[key]) for e in page.edges]
+        return LayoutSnapshot(_plain(self.metadata), self.page_count, [float(v) for v in page.bbox],
+                              chars, self._text, self._tables, edges)
+
+
+class LayoutSnapshot:
+    """
+    A stored PdfLayout. It stands in for the PDF (metadata, page_count) and,
+    when the page was analysed, for its first page too (chars, edges, bbox,
+    width, height), enough for pdf_engine to redo text and tables.
+    """
+
+    def __init__(
+        self,
+        metadata: Dict[str, Any],
+        page_count: int,
+        bbox: Optional[List[float]] = None,
+        columns: Optional[Dict[str, list]] = None,
+        text: Optional[str] = None,
+        tables: Optional[List[Table]] = None,
+        edge_columns: Optional[Dict[str, list]] = None,
+    ):
+        self.metadata = metadata
+        self.page_count = page_count
+        self.bbox = tuple(bbox) if bbox is not None else None
+        self.width = self.bbox[2] - self.bbox[0] if bbox is not None else None
+        self.height = self.bbox[3] - self.bbox[1] if bbox is not None else None
+        self.columns = columns
+        self.edge_columns = edge_columns
+        self._text = text
+        self._tables = tables
+        self._chars: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def chars(self) -> List[Dict[str, Any]]:
+        if self._chars is None:
+            cols = self.columns
+            # First page: doctop == top
+            self._chars = [
+                {"text": t, "x0": x0, "top": top, "x1": x1, "bottom": bottom, "doctop": top, "upright": up}
+                for t, x0, top, x1, bottom, up in zip(cols["text"], cols["x0"], cols["top"], cols["x1"],
+                                                      cols["bottom"], cols["upright"])
+            ]
+        return self._chars
+
+    @property
+    def edges(self) -> List[Dict[str, Any]]:
+        cols = self.edge_columns
+        keys = ("orientation", "object_type") + _EDGE_KEYS
+        return [dict(zip(keys, values)) for values in zip(*(cols[key] for key in keys))]
+
+    def first_page(self) -> Optional["LayoutSnapshot"]:
+        return self if self.columns is not None else None
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = pdf_engine.text_from_chars(self.chars, self.bbox)
+        return self._text
+
+    def tables(self) -> List[Table]:
+        if self._tables is None:
+            self._tables = pdf_engine.tables_from(self)
+        return self._tables
+
+    def to_bytes(self) -> bytes:
+        data = {"metadata": self.metadata, "page_count": self.page_count}
+        if self.columns is not None:
+            data.update(bbox=self.bbox, chars=self.columns, text=self._text, tables=self._tables,
+                        edges=self.edge_columns)
+        return zlib.compress(fast_json.dumpb(data), 6)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> "LayoutSnapshot":
+        data = fast_json.loads(zlib.decompress(blob))
+        return cls(data["metadata"], data["page_count"], data.get("bbox"), data.get("chars"),
+                   data.get("text"), data.get("tables"), data.get("edges"))
+
+
+class SnapshotEntry:
+    """A file known only by its snapshot (InvoiceParser.iter_reextract): where it was last seen and its hash."""
+    __slots__ = ("path", "content_hash")
+
+    def __init__(self, path: str, content_hash: str):
+        self.path = path
+        self.content_hash = content_hash
+
+    def __repr__(self) -> str:
+        return f"SnapshotEntry({self.path!r})"
+
+
+class SnapshotStore:
+    """
+    Snapshots by content hash. Parser workers get their own connection:
+    the store pickles as its path, and a forked child reconnects instead
+    of sharing the parent's SQLite handle.
+    """
+
+    def __init__(self, db_path: str, version: Optional[str] = None):
+        self.db_path = db_path
+        self.version = version or snapshot_version()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS layout_snapshots (
+                content_hash TEXT NOT NULL,
+                layout_version TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                data BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, layout_version)
+            )
+        """)
+        self.conn.commit()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def __getstate__(self):
+        return {"db_path": self.db_path, "version": self.version}
+
+    def __setstate__(self, state):
+        self.db_path = state["db_path"]
+        self.version = state["version"]
+        self._conn = None
+        self._pid = None
+
+    def get(self, content_hash: str) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT data FROM layout_snapshots WHERE content_hash = ? AND layout_version = ?",
+            (content_hash, self.version)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, content_hash: str, file_path: str, data: bytes):
+        """Store (or replace) a snapshot; file_path is where the file was last seen."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO layout_snapshots (content_hash, layout_version, file_path, data, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (content_hash, self.version, file_path, sqlite3.Binary(data), time.time())
+        )
+        self.conn.commit()
+
+    def entries(self) -> List[SnapshotEntry]:
+        """Every snapshot of this version, in file path order (the data stays in the database)."""
+        rows = self.conn.execute(
+            "SELECT file_path, content_hash FROM layout_snapshots WHERE layout_version = ? "
+            "ORDER BY file_path, content_hash", (self.version,)
+        ).fetchall()
+        return [SnapshotEntry(path, content_hash) for path, content_hash in rows]
+
+    def prune(self) -> int:
+        """Drop snapshots of other layout versions. Returns rows removed."""
+        cur = self.conn.execute("DELETE FROM layout_snapshots WHERE layout_version != ?", (self.version,))
+        removed = cur.rowcount
+        self.conn.commit()
+        if removed:
+            self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        if self._conn is not None and self._pid == os.getpid():
+            self._conn.close()
+        self._conn = None
@@ -0,0 +1,450 @@
+"""
+Layout templates: fingerprint recurring invoice layouts and read their
+fields from fixed boxes instead of running full-page extraction.
+
+Nearly every invoice comes from a handful of fixed layouts (the national
+e-invoice template and a few 全电 variants), where each field is printed
+in the same place on every copy. A page's fingerprint is its size plus the
+position of a few anchor labels (发票号码, 购买方, 价税合计, ...), all of
+which come from the char objects pdf_engine already builds. A registered
+template with the same page size, the same anchor set and every anchor in
+place (allowing one common shift) matches; its field boxes are then read
+from the chars centred in them and extract_tables is skipped. (page.crop() keeps every char that merely touches a
+box, which lets stacked labels like 购买方信息 bleed into the row below, and
+costs a pass over every page object per box; all boxes are filled in one
+pass over the chars with the midpoint test pdf_engine uses for table cells.)
+
+Only fields with a checkable shape get a box (TEMPLATE_FIELDS: numbers,
+date, names, tax ids, amounts, rate, amount in words). Free text (item,
+remark, issuer, invoice type) has nothing to check a box read against, so
+on a template hit the parser still reads those with its text heuristics;
+only the table pass is skipped.
+
+Templates are learned, not written by hand. After a heuristic parse the
+parser hands the result to learn(), which finds each field's printed value
+among the page chars and records the gap it sits in on its line (halfway
+to the preceding and the following text), so longer values on later
+invoices still fit. A value printed more than once on the page (a name inside the
+other party's, a rate inside another) has no single place and the page
+is not learned from; amounts are the exception, since the item row repeats
+the totals, and take the lowest occurrence (validate() cross-checks them).
+Every box field the heuristics produced must be located, so a template hit
+loses nothing. A new template is on probation: on the next CONFIRMATIONS
+matching pages it is read alongside the heuristics and fields it lacks are
+added. A disagreement drops its boxes and the next matching page learns
+them afresh, so an unlucky first file does not decide the layout; after
+MAX_RELEARNS failed probations the fingerprint is rejected (layouts whose
+fields move with their content, like run-on 购 名称…销 名称 lines, stay on
+the heuristics).
+
+Reads are validated (number/date shape, amount + tax = total) and a page
+that fails falls back to the heuristics.
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from statistics import median
+from typing import Any, Dict, List, Optional, Tuple
+
+from pdfplumber import utils
+
+TEMPLATES_FILE_NAME = ".layout_templates.json"
+TEMPLATES_FORMAT = 2
+
+# Labels whose first glyph positions make up a fingerprint
+ANCHORS = ("发票号码", "开票日期", "购买方", "销售方", "名称", "项目名称", "税率", "合计", "价税合计", "备注", "开票人")
+MIN_ANCHORS = 3
+# Page size tolerance, anchor tolerance around the common shift, and the largest shift accepted (pt)
+SIZE_TOLERANCE = 1.0
+ANCHOR_TOLERANCE = 3.0
+MAX_SHIFT = 20.0
+# Chars whose tops differ by less than this share a line
+LINE_TOLERANCE = 2.0
+# Chars closer than this run on into each other
+RUN_GAP = 1.0
+BOX_PAD = 1.0
+CONFIRMATIONS = 3
+# Failed probations (each learned from a different page) before a fingerprint is given up on
+MAX_RELEARNS = 3
+
+REQUIRED_FIELDS = ("invoice_number", "invoice_date", "buyer_name", "seller_name", "total_amount")
+AMOUNT_FIELDS = ("amount", "tax_amount", "total_amount")
+# Read from boxes on a template hit
+TEMPLATE_FIELDS = (
+    "invoice_code", "invoice_number", "invoice_date",
+    "buyer_name", "buyer_tax_id", "seller_name", "seller_tax_id",
+    "amount", "tax_amount", "total_amount", "tax_rate", "total_amount_chinese",
+)
+# Read by the parser's text heuristics even on a template hit
+TEXT_FIELDS = ("invoice_type", "item_name", "remark", "issuer")
+
+_WS = re.compile(r'\s+')
+_CHINESE_AMOUNT = re.compile(r'[零壹贰叁肆伍陆柒捌玖拾佰仟万亿元角分整圆]{4,}')
+_DATE = re.compile(r'(\d{4})\s*[-年/]\s*(\d{1,2})\s*[-月/]\s*(\d{1,2})')
+# Besides letters, digits and CJK: chars a value can run on through
+_RUN_ON = set(".,%-/*")
+
+
+def default_templates_path(folder_path: str) -> str:
+    """Templates live in the workspace root, next to the parse cache."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder_path)), TEMPLATES_FILE_NAME)
+
+
+# ============================================
+# PAGE GLYPHS
+# ============================================
+
+class Glyphs:
+    """Page chars in content order with whitespace dropped, searchable as one string."""
+
+    def __init__(self, page):
+        self.page = page
+        self.chars = [c for c in page.chars if c["text"].strip()]
+        self.text = "".join(c["text"] for c in self.chars)
+
+    def find(self, needle: str, last: bool = False, unique: bool = False) -> Optional[List[Dict[str, Any]]]:
+        """Glyphs of the first (or last) occurrence; with unique=True, None if there is more than one."""
+        needle = _WS.sub("", needle)
+        if not needle:
+            return None
+        i = self.text.rfind(needle) if last else self.text.find(needle)
+        if i < 0 or (unique and self.text.find(needle, i + 1) >= 0):
+            return None
+        return self.chars[i:i + len(needle)]
+
+    def anchors(self) -> Dict[str, Tuple[float, float]]:
+        found = {}
+        for label in ANCHORS:
+            glyphs = self.find(label)
+            if glyphs:
+                found[label] = (round(glyphs[0]["x0"], 1), round(glyphs[0]["top"], 1))
+        return found
+
+    def value_box(self, glyphs: List[Dict[str, Any]]) -> Optional[List[float]]:
+        """
+        Box of a one-line value, widened halfway across the blank gaps either
+        side of it on its line: longer values on later pages still fit, and a
+        longer neighbour doesn't reach in (if either happens, read() sees the
+        run-on and gives up).
+        """
+        top = min(c["top"] for c in glyphs)
+        bottom = max(c["bottom"] for c in glyphs)
+        if max(c["top"] for c in glyphs) - top > LINE_TOLERANCE:
+            return None
+        x0 = min(c["x0"] for c in glyphs)
+        x1 = max(c["x1"] for c in glyphs)
+        taken = {id(c) for c in glyphs}
+        left, right = 0.0, float(self.page.width)
+        for c in self.chars:
+            if id(c) in taken or not (top - LINE_TOLERANCE < (c["top"] + c["bottom"]) / 2 < bottom + LINE_TOLERANCE):
+                continue
+            if c["x1"] <= x0 + 0.5:
+                left = max(left, (c["x1"] + x0) / 2)
+            elif c["x0"] >= x1 - 0.5:
+                right = min(right, (x1 + c["x0"]) / 2)
+        return [round(left, 1), round(top - BOX_PAD, 1), round(right, 1), round(bottom + BOX_PAD, 1)]
+
+    def runs_on(self, glyphs: List[Dict[str, Any]]) -> bool:
+        """
+        Whether one-line glyphs are only part of what is printed there: a
+        char on their line touches or overlaps them and could belong to the
+        same value. A label colon or currency sign right before a value
+        doesn't count.
+        """
+        top = min(c["top"] for c in glyphs)
+        bottom = max(c["bottom"] for c in glyphs)
+        x0 = min(c["x0"] for c in glyphs)
+        x1 = max(c["x1"] for c in glyphs)
+        taken = {id(c) for c in glyphs}
+        for c in self.chars:
+            if (id(c) not in taken and c["x1"] > x0 - RUN_GAP and c["x0"] < x1 + RUN_GAP
+                    and top - LINE_TOLERANCE < (c["top"] + c["bottom"]) / 2 < bottom + LINE_TOLERANCE
+                    and (c["text"].isalnum() or c["text"] in _RUN_ON)):
+                return True
+        return False
+
+
+def locate(glyphs: Glyphs, field: str, value: Any) -> Optional[List[float]]:
+    """
+    Box of a parsed value as printed on the page, or None if it can't be
+    found on one line by itself or is printed more than once.
+    """
+    for form in _printed_forms(field, value):
+        # Amounts repeat (item row, 合计 row); the totals sit lowest on the page
+        amount = field in AMOUNT_FIELDS
+        located = glyphs.find(form, last=amount, unique=not amount)
+        box = glyphs.value_box(located) if located and not glyphs.runs_on(located) else None
+        if box:
+            return box
+    return None
+
+
+def fingerprint(page) -> Tuple[Glyphs, Dict[str, Any]]:
+    glyphs = Glyphs(page)
+    return glyphs, {"size": [round(float(page.width), 1), round(float(page.height), 1)],
+                    "anchors": glyphs.anchors()}
+
+
+# ============================================
+# FIELD VALUES
+# ============================================
+
+def _printed_forms(field: str, value: Any) -> List[str]:
+    """How a parsed value can appear on the page, most specific first."""
+    if field in AMOUNT_FIELDS:
+        return [f"{value:,.2f}", f"{value:.2f}"]
+    if field == "invoice_date":
+        y, m, d = value.split("-")
+        return [f"{y}年{m}月{d}日", f"{y}年{int(m)}月{int(d)}日", value]
+    return [str(value)]
+
+
+def read_field(field: str, text: str) -> Any:
+    """Value of `field` from its box text, in the form InvoiceParser produces; None if it doesn't fit."""
+    text = text.strip()
+    if not text:
+        return None
+    squeezed = _WS.sub("", text)
+    if field in ("invoice_number", "invoice_code"):
+        lo, hi = (8, 20) if field == "invoice_number" else (10, 12)
+        return squeezed if squeezed.isdigit() and lo <= len(squeezed) <= hi else None
+    if field in AMOUNT_FIELDS:
+        try:
+            return float(squeezed.lstrip("¥￥").replace(",", ""))
+        except ValueError:
+            return None
+    if field == "invoice_date":
+        m = _DATE.search(text)
+        if not m:
+            return None
+        try:
+            return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    if field in ("buyer_tax_id", "seller_tax_id"):
+        return squeezed if squeezed.isalnum() and 15 <= len(squeezed) <= 20 else None
+    if field == "tax_rate":
+        return squeezed if re.fullmatch(r'\d{1,2}%', squeezed) else None
+    if field == "total_amount_chinese":
+        return squeezed if _CHINESE_AMOUNT.fullmatch(squeezed) else None
+    return _WS.sub(" ", text)
+
+
+def validate(values: Dict[str, Any]) -> bool:
+    if any(values.get(f) in (None, "") for f in REQUIRED_FIELDS):
+        return False
+    a, ta, t = values.get("amount"), values.get("tax_amount"), values.get("total_amount")
+    if a is not None and ta is not None and abs(round(a + ta, 2) - t) > 0.01:
+        return False
+    return True
+
+
+# ============================================
+# TEMPLATES
+# ============================================
+
+class LayoutTemplate:
+    def __init__(self, size: List[float], anchors: Dict[str, List[float]], fields: Dict[str, List[float]],
+                 status: str = "probation", confirmations: int = 0, relearns: int = 0):
+        self.size = size
+        self.anchors = {k: tuple(v) for k, v in anchors.items()}
+        # Empty while on probation after a failed one: the next matching page fills it
+        self.fields = fields
+        self.status = status
+        self.confirmations = confirmations
+        # Failed probations so far
+        self.relearns = relearns
+        self.key = hashlib.sha1(json.dumps([size, sorted(self.anchors.items())]).encode()).hexdigest()[:16]
+
+    def shift(self, fp: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        """Common (dx, dy) placing this template's anchors on the page's, or None if it doesn't fit."""
+        if any(abs(a - b) > SIZE_TOLERANCE for a, b in zip(self.size, fp["size"])):
+            return None
+        found = fp["anchors"]
+        if set(found) != set(self.anchors):
+            return None
+        offsets = [(found[k][0] - x, found[k][1] - y) for k, (x, y) in self.anchors.items()]
+        dx, dy = median(o[0] for o in offsets), median(o[1] for o in offsets)
+        if abs(dx) > MAX_SHIFT or abs(dy) > MAX_SHIFT:
+            return None
+        if any(abs(ox - dx) > ANCHOR_TOLERANCE or abs(oy - dy) > ANCHOR_TOLERANCE for ox, oy in offsets):
+            return None
+        return dx, dy
+
+    def read(self, glyphs: Glyphs, shift: Tuple[float, float]) -> Optional[Dict[str, Any]]:
+        """
+        Field values from the boxes; None if a box holds something that isn't
+        its field, or only part of a value that runs on past the box edge
+        (a longer neighbour on this page than on the one the box was learned
+        from).
+        """
+        dx, dy = shift
+        boxes = [(field, x0 + dx, top + dy, x1 + dx, bottom + dy)
+                 for field, (x0, top, x1, bottom) in self.fields.items()]
+        hits: Dict[str, List[Dict[str, Any]]] = {field: [] for field in self.fields}
+        for c in glyphs.page.chars:
+            h_mid, v_mid = (c["x0"] + c["x1"]) / 2, (c["top"] + c["bottom"]) / 2
+            for field, x0, top, x1, bottom in boxes:
+                if x0 <= h_mid < x1 and top <= v_mid < bottom:
+                    hits[field].append(c)
+        values = {}
+        for field, chars in hits.items():
+            if not chars:
+                values[field] = None
+                continue
+            value = read_field(field, utils.extract_text(chars))
+            if value is None or glyphs.runs_on(chars):
+                return None
+            values[field] = value
+        return values
+
+    def learn_fields(self, glyphs: Glyphs, shift: Tuple[float, float], parsed: Dict[str, Any]) -> bool:
+        """Boxes for every parsed field, relative to the anchors; nothing is kept unless all are located."""
+        if not validate(parsed):
+            return False
+        dx, dy = shift
+        fields = {}
+        for field in TEMPLATE_FIELDS:
+            value = parsed.get(field)
+            if value in (None, ""):
+                continue
+            box = locate(glyphs, field, value)
+            if box is None:
+                return False
+            fields[field] = [round(box[0] - dx, 1), round(box[1] - dy, 1),
+                             round(box[2] - dx, 1), round(box[3] - dy, 1)]
+        self.fields = fields
+        return True
+
+    def confirm(self, glyphs: Glyphs, shift: Tuple[float, float], parsed: Dict[str, Any]):
+        """
+        Probation: check the boxes against the heuristic parse and learn
+        fields not seen before. A disagreement drops the boxes, to be learned
+        again from the next matching page, or rejects the layout once it has
+        failed MAX_RELEARNS times.
+        """
+        if not self.fields:
+            self.learn_fields(glyphs, shift, parsed)
+            return
+        dx, dy = shift
+        values = self.read(glyphs, shift)
+        for field in TEMPLATE_FIELDS:
+            expected = parsed.get(field)
+            if expected in (None, ""):
+                continue
+            if field in self.fields:
+                agrees = values is not None and values.get(field) == expected
+            else:
+                box = locate(glyphs, field, expected)
+                agrees = box is not None
+                if agrees:
+                    self.fields[field] = [round(box[0] - dx, 1), round(box[1] - dy, 1),
+                                          round(box[2] - dx, 1), round(box[3] - dy, 1)]
+            if not agrees:
+                self.relearns += 1
+                self.status = "rejected" if self.relearns >= MAX_RELEARNS else "probation"
+                self.fields = {}
+                self.confirmations = 0
+                return
+        self.confirmations += 1
+        if self.confirmations >= CONFIRMATIONS:
+            self.status = "active"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"size": self.size, "anchors": {k: list(v) for k, v in self.anchors.items()},
+                "fields": self.fields, "status": self.status, "confirmations": self.confirmations,
+                "relearns": self.relearns}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LayoutTemplate":
+        return cls(data["size"], data["anchors"], data["fields"], data.get("status", "probation"),
+                   data.get("confirmations", 0), data.get("relearns", 0))
+
+
+_STATUS_RANK = {"probation": 0, "active": 1, "rejected": 2}
+
+
+class TemplateRegistry:
+    """Templates bucketed by page size; optionally backed by a JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.templates: Dict[str, LayoutTemplate] = {}
+        # Keys learned or changed since the last take_updates(), for pool workers
+        self._dirty = set()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("format") == TEMPLATES_FORMAT:
+                    for item in data.get("templates", []):
+                        self.add(LayoutTemplate.from_dict(item))
+            except (OSError, ValueError, KeyError):
+                self.templates = {}
+
+    def add(self, template: LayoutTemplate):
+        self.templates[template.key] = template
+
+    def match(self, fp: Dict[str, Any]) -> Tuple[Optional[LayoutTemplate], Optional[Tuple[float, float]]]:
+        if len(fp["anchors"]) < MIN_ANCHORS:
+            return None, None
+        for template in self.templates.values():
+            shift = template.shift(fp)
+            if shift is not None:
+                return template, shift
+        return None, None
+
+    def learn(self, glyphs: Glyphs, fp: Dict[str, Any], parsed: Dict[str, Any]) -> Optional[LayoutTemplate]:
+        """New probation template from a successful heuristic parse, if every parsed field can be located."""
+        if len(fp["anchors"]) < MIN_ANCHORS:
+            return None
+        template = LayoutTemplate(fp["size"], fp["anchors"], {})
+        if not template.learn_fields(glyphs, (0.0, 0.0), parsed):
+            return None
+        self.add(template)
+        self.touch(template)
+        return template
+
+    def touch(self, template: LayoutTemplate):
+        self._dirty.add(template.key)
+
+    def take_updates(self) -> List[Dict[str, Any]]:
+        updates = [self.templates[k].to_dict() for k in self._dirty if k in self.templates]
+        self._dirty.clear()
+        return updates
+
+    def merge(self, updates: List[Dict[str, Any]]):
+        """Fold templates learned or confirmed in a pool worker into this registry."""
+        for data in updates:
+            incoming = LayoutTemplate.from_dict(data)
+            current = self.templates.get(incoming.key)
+            # A failed probation outranks whatever was learned before it
+            if current is None or incoming.relearns > current.relearns:
+                self.add(incoming)
+                continue
+            if incoming.relearns < current.relearns:
+                continue
+            if _STATUS_RANK[incoming.status] > _STATUS_RANK[current.status]:
+                current.status = incoming.status
+            if current.status == "rejected":
+                current.fields = {}
+            else:
+                current.fields = {**incoming.fields, **current.fields}
+            current.confirmations = max(current.confirmations, incoming.confirmations)
+
+    def stats(self) -> Dict[str, int]:
+        counts = {"probation": 0, "active": 0, "rejected": 0}
+        for template in self.templates.values():
+            counts[template.status] += 1
+        return counts
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": TEMPLATES_FORMAT, "templates": [t.to_dict() for t in self.templates.values()]},
+                      f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
@@ -1,75 +1,459 @@
 
 import argparse
+import os
 import sys
 import json
 import traceback
-from dataclasses import asdict
-from invoice_parser import InvoiceParser
-from models import InvoiceInfo
+
+# Subcommands import their own dependencies inside main(): `export` must not
+# pay for pdfplumber/pdfminer, and `--import-profile` can only see imports
+# that happen after it is installed.
+
+def _load_match_input(args):
+    """(bankTransactions, invoices, payerMappings) for `match` / `settle`, from --db or JSON."""
+    from rule_matcher import load_from_db
+
+    if args.db:
+        if not args.batch_id:
+            raise ValueError("--batch_id is required with --db")
+        return load_from_db(args.db, args.batch_id)
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = json.load(sys.stdin)
+    return data.get("bankTransactions") or [], data.get("invoices") or [], data.get("payerMappings") or []
 
 def main():
     parser = argparse.ArgumentParser(description="Electron-Bank Invoice Parser")
+    parser.add_argument("--import_profile", "--import-profile", action="store_true",
+                        help="Report per-module import time on stderr when the command finishes")
+    parser.add_argument("--import_budget_ms", type=float,
+                        help="With --import-profile: flag the report when imports exceed this many ms")
     # Add subparsers and use 'dest' to identify which subcommand was called
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
     
     # Parse command
     parse_cmd = subparsers.add_parser("parse", help="Batch parse PDFs")
-    parse_cmd.add_argument("--folder", required=True, help="Folder containing PDFs")
+    parse_cmd.add_argument("--folder", required=True,
+                           help="Folder containing PDF / OFD / XML invoices and zip / eml bundles, or a single zip / eml")
+    parse_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                           help="Number of parser processes (default: CPU count, 1 = serial)")
+    parse_cmd.add_argument("--cache", help="Parse cache SQLite path (default: <workspace>/.parse_cache.sqlite)")
+    parse_cmd.add_argument("--no_cache", action="store_true", help="Bypass the parse cache")
+    parse_cmd.add_argument("--prune_cache", action="store_true",
+                           help="Drop cache entries from other parser versions before parsing")
+    parse_cmd.add_argument("--no_fast_path", action="store_true",
+                           help="Always run text/table extraction, even when PDF metadata is complete")
+    parse_cmd.add_argument("--metadata_required",
+                           help="Comma-separated fields metadata must supply to skip layout analysis "
+                                "(default: the METADATA_FIELD_POLICY 'required' fields)")
+    parse_cmd.add_argument("--rule_stats", action="store_true",
+                           help="Report per-rule call/hit counts and time in the result")
+    parse_cmd.add_argument("--columnar", action="store_true",
+                           help="Return invoices as invoice_columns ({field: [values]}) instead of a list of objects")
+    parse_cmd.add_argument("--stream", action="store_true",
+                           help="Emit one NDJSON record per file (invoice/error/duplicate) "
+                                "and a final summary instead of one result blob")
+    parse_cmd.add_argument("--profile", action="store_true",
+                           help="Time each parse stage per file: stage timings on progress events, "
+                                "stage histograms, slowest files and peak memory in the result")
+    parse_cmd.add_argument("--profile_dump",
+                           help="Directory for a cProfile (parse.pstats) and tracemalloc (tracemalloc.txt) "
+                                "dump of this process; use --workers 1 to cover parsing itself")
+    parse_cmd.add_argument("--db", help="Write invoices into the `invoices` table of this workspace SQLite "
+                                        "database and print only a summary (needs --batch_id)")
+    parse_cmd.add_argument("--batch_id",
+                           help="Reconciliation batch the invoices are written to (with --db), and the "
+                                "batch recorded in --dedup_index")
+    parse_cmd.add_argument("--db_chunk_size", type=int, default=500, help="Rows per insert transaction (with --db)")
+    parse_cmd.add_argument("--templates",
+                           help="Layout template store (default: <workspace>/.layout_templates.json)")
+    parse_cmd.add_argument("--no_templates", action="store_true",
+                           help="Neither use nor learn layout templates; run the full heuristics on every file")
+    parse_cmd.add_argument("--file_timeout", type=float,
+                           help="Seconds one file may take; the worker is killed and the file "
+                                "recorded as a 'timeout' error")
+    parse_cmd.add_argument("--max_memory_mb", type=float,
+                           help="Memory (MB) a parser worker may use beyond what it holds once pdfplumber "
+                                "and the parser are loaded; files over it are recorded as 'oom' errors")
+    parse_cmd.add_argument("--batch_timeout", type=float,
+                           help="Seconds for the whole batch; unfinished files are recorded as 'timeout' errors")
+    parse_cmd.add_argument("--dedup_index", nargs="?", const="",
+                           help="Also skip invoices handed out by earlier batches, using this index "
+                                "(default: <workspace>/.dedup_index.sqlite); entries are labelled with "
+                                "--batch_id, or the folder path")
+    parse_cmd.add_argument("--spill_mb", type=float, default=32,
+                           help="Zip / eml members larger than this are parsed from a temp file instead of memory")
+    parse_cmd.add_argument("--keywords",
+                           help="JSON file adding words to the org_suffix / company / non_item_cell keyword sets "
+                                "(default: <workspace>/.invoice_keywords.json, when present)")
+    parse_cmd.add_argument("--snapshots", nargs="?", const="",
+                           help="Keep a layout snapshot of every PDF parsed in this store, and extract from the "
+                                "snapshot instead of the PDF when the file comes again "
+                                "(default: <workspace>/.layout_snapshots.sqlite)")
+
+    # Reextract command
+    reextract_cmd = subparsers.add_parser(
+        "reextract", help="Re-run field extraction over every stored layout snapshot, without the PDFs")
+    reextract_cmd.add_argument("--folder",
+                               help="An invoice folder of the workspace; locates the default snapshot store, "
+                                    "parse cache and keyword file")
+    reextract_cmd.add_argument("--snapshots", help="Snapshot store (default: <workspace>/.layout_snapshots.sqlite)")
+    reextract_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                               help="Parallel extraction processes (default: CPU count)")
+    reextract_cmd.add_argument("--cache",
+                               help="Parse cache to fill with the new results (default: <workspace>/.parse_cache.sqlite "
+                                    "with --folder)")
+    reextract_cmd.add_argument("--no_cache", action="store_true", help="Do not write results to a parse cache")
+    reextract_cmd.add_argument("--no_fast_path", action="store_true",
+                               help="Ignore PDF metadata completeness and always run the page heuristics")
+    reextract_cmd.add_argument("--keywords", help="Keyword file, as for parse")
+    reextract_cmd.add_argument("--rule_stats", action="store_true", help="Include per-rule calls/hits/ms in the result")
+    reextract_cmd.add_argument("--profile", action="store_true", help="Include stage histograms in the result")
+    reextract_cmd.add_argument("--stream", action="store_true",
+                               help="Emit one NDJSON record per file as it is settled, then a summary")
     
     # Export command
     export_cmd = subparsers.add_parser("export", help="Export to Excel")
     export_cmd.add_argument("--output", required=True, help="Output Excel file path")
+    export_cmd.add_argument("--max_rows_per_sheet", type=int,
+                            help="Start a new sheet after this many rows (default: Excel's row limit)")
 
     # Extract text command (for AI)
     extract_cmd = subparsers.add_parser("extract_text", help="Extract raw text for AI")
-    extract_cmd.add_argument("--file", required=True, help="PDF file path")
+    extract_group = extract_cmd.add_mutually_exclusive_group(required=True)
+    extract_group.add_argument("--file", help="PDF file path")
+    extract_group.add_argument("--files", nargs="+", help="Several PDF files (NDJSON output, one line per file)")
+    extract_group.add_argument("--files_from", help="File listing one PDF path per line, '-' for stdin "
+                                                    "(NDJSON output)")
     extract_cmd.add_argument("--max_chars", type=int, default=3000, help="Max characters to extract")
+    extract_cmd.add_argument("--compact", action="store_true",
+                             help="Squeeze whitespace/boilerplate and put invoice regions first")
+    extract_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                             help="Parallel processes for --files / --files_from")
+    
+    # Parse statement command (multi-page bank statement PDF -> NDJSON rows)
+    statement_cmd = subparsers.add_parser("parse_statement", help="Stream transactions out of a bank statement PDF")
+    statement_cmd.add_argument("--file", required=True, help="Statement PDF path")
+    statement_cmd.add_argument("--income_only", action="store_true", help="Only emit incoming (credit) rows")
+
+    # Import bank command (large xlsx/csv bank exports, streamed in chunks)
+    bank_cmd = subparsers.add_parser("import_bank", help="Stream bank transactions out of an xlsx/csv export")
+    bank_cmd.add_argument("--file", required=True, help="Bank export (.xlsx or .csv)")
+    bank_cmd.add_argument("--chunk_size", type=int, default=5000, help="Rows normalized per chunk")
+    bank_cmd.add_argument("--sheet", help="Worksheet name (default: the first sheet)")
+
+    # Match command (Level 1-3 rule matching over indexed data)
+    match_cmd = subparsers.add_parser("match", help="Rule matching (perfect / tolerance / proxy)")
+    match_cmd.add_argument("--input", help="JSON file with bankTransactions, invoices and payerMappings "
+                                           "(default: read the same object from stdin)")
+    match_cmd.add_argument("--db", help="Read pending rows straight from this workspace SQLite database")
+    match_cmd.add_argument("--batch_id", help="Reconciliation batch to match (with --db)")
+    match_cmd.add_argument("--progress_every", type=int, default=1000, help="Emit progress every N bank rows")
+
+    # Settle command (many-to-one / one-to-many combinations over what rule matching left)
+    settle_cmd = subparsers.add_parser("settle", help="Combination matching (merged payments / instalments)")
+    settle_cmd.add_argument("--input", help="JSON file with bankTransactions, invoices and payerMappings "
+                                            "(default: read the same object from stdin)")
+    settle_cmd.add_argument("--db", help="Read pending rows straight from this workspace SQLite database")
+    settle_cmd.add_argument("--batch_id", help="Reconciliation batch to settle (with --db)")
+    settle_cmd.add_argument("--max_items", type=int, default=6, help="Max invoices / bank rows in one combination")
+    settle_cmd.add_argument("--max_candidates", type=int, default=32,
+                            help="Max candidates per group (closest in date are kept)")
+    settle_cmd.add_argument("--window_days", type=float, default=90,
+                            help="Max days between bank and invoice dates (0 = no window)")
+    settle_cmd.add_argument("--group_time_ms", type=float, default=200, help="Search time cap per group")
+    settle_cmd.add_argument("--time_budget", type=float, help="Overall time cap in seconds")
+
+    # Serve command (resident worker speaking JSON-lines over stdin/stdout)
+    serve_cmd = subparsers.add_parser("serve", help="Run as a resident JSON-lines worker")
+    serve_cmd.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                           help="Number of warm parser processes")
+    serve_cmd.add_argument("--max_concurrent", type=int, default=4,
+                           help="Max requests handled at the same time")
     
     args = parser.parse_args()
+
+    profiler = None
+    if args.import_profile:
+        from import_profile import ImportProfiler
+        profiler = ImportProfiler()
+        profiler.install()
     
     try:
         if args.command == "parse":
-            parser_svc = InvoiceParser()
-            result = parser_svc.batch_parse(args.folder)
-            
-            # Print final result wrapped in {"type": "result", "data": ...}
-            # so the TS-side onProgress handler can identify it correctly
-            print(json.dumps({
-                "type": "result",
-                "data": asdict(result)
-            }))
-            
+            import fast_json
+            from invoice_parser import InvoiceParser, METADATA_FIELD_POLICY
+            from parse_cache import ParseCache, default_cache_path
+
+            from keyword_matcher import default_keywords_path, load_keyword_sets
+            from rules import KEYWORD_SETS
+            keywords_path = args.keywords or default_keywords_path(args.folder)
+            keyword_sets = None
+            if args.keywords or os.path.isfile(keywords_path):
+                keyword_sets = load_keyword_sets(keywords_path, KEYWORD_SETS)
+
+            policy = None
+            if args.metadata_required is not None:
+                required = {f.strip() for f in args.metadata_required.split(",") if f.strip()}
+                unknown = required - set(METADATA_FIELD_POLICY)
+                if unknown:
+                    raise ValueError(f"Unknown metadata fields: {', '.join(sorted(unknown))}")
+                policy = {f: "required" if f in required else "optional" for f in METADATA_FIELD_POLICY}
+
+            cache = None
+            if not args.no_cache:
+                cache = ParseCache(args.cache or default_cache_path(args.folder),
+                                   InvoiceParser.cache_version(keyword_sets, not args.no_fast_path, policy))
+                if args.prune_cache:
+                    cache.prune()
+
+            templates = None
+            if not args.no_templates:
+                from layout_templates import TemplateRegistry, default_templates_path
+                templates = TemplateRegistry(args.templates or default_templates_path(args.folder))
+
+            dedup_index = None
+            if args.dedup_index is not None:
+                from dedup_index import DedupIndex, default_index_path
+                dedup_index = DedupIndex(args.dedup_index or default_index_path(args.folder),
+                                         args.batch_id or os.path.abspath(args.folder))
+
+            snapshots = None
+            if args.snapshots is not None:
+                from layout_snapshots import SnapshotStore, default_snapshots_path
+                snapshots = SnapshotStore(args.snapshots or default_snapshots_path(args.folder))
+
+            parser_svc = InvoiceParser(
+                cache=cache,
+                metadata_fast_path=not args.no_fast_path,
+                metadata_policy=policy,
+                rule_stats=args.rule_stats,
+                profile=args.profile,
+                file_timeout=args.file_timeout,
+                max_memory_mb=args.max_memory_mb,
+                batch_timeout=args.batch_timeout,
+                templates=templates,
+                spill_mb=args.spill_mb,
+                dedup_index=dedup_index,
+                keyword_sets=keyword_sets,
+                snapshots=snapshots
+            )
+
+            dump = None
+            if args.profile_dump:
+                from stage_profile import ProfileDump
+                dump = ProfileDump(args.profile_dump)
+                dump.start()
+            if args.db:
+                if not args.batch_id:
+                    raise ValueError("--db needs --batch_id")
+                from invoice_sink import SqliteInvoiceSink
+                sink = SqliteInvoiceSink(args.db, args.batch_id, args.db_chunk_size)
+                errors, duplicates = [], []
+                try:
+                    for kind, record in parser_svc.iter_batch(args.folder, workers=args.workers):
+                        if kind == "invoice":
+                            sink.add(record)
+                        elif kind == "duplicate":
+                            duplicates.append(record.to_dict())
+                        elif kind == "error":
+                            errors.append(record.to_dict())
+                        else:
+                            summary = record.to_dict()
+                finally:
+                    sink.close()
+                # Invoices are in the database; only counts and the (small) error / duplicate lists go back
+                for key in ("invoices", "invoice_columns"):
+                    summary.pop(key)
+                summary.update(errors=errors, duplicates=duplicates, imported=sink.imported,
+                               skipped_duplicates=[d.to_dict() for d in sink.skipped])
+                fast_json.write_line({"type": "result", "data": summary})
+            elif args.stream:
+                # Records go out as soon as each file is settled; the summary
+                # carries counts only
+                for kind, record in parser_svc.iter_batch(args.folder, workers=args.workers):
+                    data = record.to_dict()
+                    if kind == "summary":
+                        for key in ("invoices", "errors", "duplicates", "invoice_columns"):
+                            data.pop(key)
+                    fast_json.write_line({"type": kind, "data": data}, flush=True)
+            else:
+                result = parser_svc.batch_parse(args.folder, workers=args.workers, columnar=args.columnar)
+
+                # Print final result wrapped in {"type": "result", "data": ...}
+                # so the TS-side onProgress handler can identify it correctly
+                fast_json.write_line({
+                    "type": "result",
+                    "data": result.to_dict()
+                })
+            if dump:
+                dump.stop()
+            if templates:
+                templates.save()
+            if dedup_index:
+                dedup_index.close()
+            if snapshots:
+                snapshots.close()
+            if cache:
+                cache.close()
+
+        elif args.command == "reextract":
+            import fast_json
+            from invoice_parser import InvoiceParser
+            from keyword_matcher import default_keywords_path, load_keyword_sets
+            from layout_snapshots import SnapshotStore, default_snapshots_path
+            from parse_cache import ParseCache, default_cache_path
+            from rules import KEYWORD_SETS
+
+            if not args.snapshots and not args.folder:
+                raise ValueError("reextract needs --snapshots or --folder")
+            snapshots_path = args.snapshots or default_snapshots_path(args.folder)
+            if not os.path.isfile(snapshots_path):
+                raise FileNotFoundError(f"Snapshot store not found: {snapshots_path}")
+
+            keyword_sets = None
+            if args.keywords:
+                keyword_sets = load_keyword_sets(args.keywords, KEYWORD_SETS)
+            elif args.folder and os.path.isfile(default_keywords_path(args.folder)):
+                keyword_sets = load_keyword_sets(default_keywords_path(args.folder), KEYWORD_SETS)
+
+            cache = None
+            cache_path = args.cache or (default_cache_path(args.folder) if args.folder else None)
+            if cache_path and not args.no_cache:
+                cache = ParseCache(cache_path, InvoiceParser.cache_version(keyword_sets, not args.no_fast_path))
+
+            snapshots = SnapshotStore(snapshots_path)
+            parser_svc = InvoiceParser(
+                cache=cache,
+                metadata_fast_path=not args.no_fast_path,
+                rule_stats=args.rule_stats,
+                profile=args.profile,
+                keyword_sets=keyword_sets,
+                snapshots=snapshots
+            )
+            invoices, errors = [], []
+            for kind, record in parser_svc.iter_reextract(workers=args.workers):
+                data = record.to_dict()
+                if args.stream:
+                    if kind == "summary":
+                        for key in ("invoices", "errors", "duplicates", "invoice_columns"):
+                            data.pop(key)
+                    fast_json.write_line({"type": kind, "data": data}, flush=True)
+                elif kind == "invoice":
+                    invoices.append(data)
+                elif kind == "error":
+                    errors.append(data)
+                else:
+                    data.update(invoices=invoices, errors=errors)
+                    fast_json.write_line({"type": "result", "data": data})
+            snapshots.close()
+            if cache:
+                cache.close()
+
         elif args.command == "export":
-            # Read invoices from stdin
-            # Use sys.stdin.buffer.read() to handle potential encoding issues if needed, but text read is usually fine
-            input_data = sys.stdin.read()
-            if not input_data:
-                raise ValueError("No input data provided")
-                
-            invoices_data = json.loads(input_data)
-            
-            # Convert dicts back to InvoiceInfo objects - careful with optional fields
-            # dataclasses.asdict might have serialised Nones, ensure we can init back
-            # InvoiceInfo has defaults so it should be fine
-            invoices = [InvoiceInfo(**inv) for inv in invoices_data]
-            
-            parser_svc = InvoiceParser()
-            parser_svc.export_excel(invoices, args.output)
-            
+            # Invoices arrive on stdin as a JSON array or NDJSON and are
+            # written row by row, so memory stays flat for any batch size
+            from excel_export import export_records, iter_json_records
+
+            stats = export_records(iter_json_records(sys.stdin), args.output, args.max_rows_per_sheet)
+
             print(json.dumps({
                 "success": True,
-                "file_path": args.output
+                "file_path": args.output,
+                "rows": stats["rows"],
+                "sheets": stats["sheets"]
             }))
 
+        elif args.command == "parse_statement":
+            from statement_parser import StatementParser
+
+            if not os.path.exists(args.file):
+                raise FileNotFoundError(f"File not found: {args.file}")
+            # Rows are printed page by page; nothing is collected in memory
+            for kind, record in StatementParser(income_only=args.income_only).iter_pages(args.file):
+                if kind == "progress":
+                    print(json.dumps(record), flush=True)
+                else:
+                    print(json.dumps({"type": kind, "data": record}))
+            sys.stdout.flush()
+
+        elif args.command == "import_bank":
+            from bank_import import BankImporter, rows_to_ndjson
+
+            if not os.path.exists(args.file):
+                raise FileNotFoundError(f"File not found: {args.file}")
+            importer = BankImporter(args.file, chunk_size=args.chunk_size, sheet=args.sheet)
+            for kind, payload in importer.run():
+                if kind == "rows":
+                    sys.stdout.write(rows_to_ndjson(payload))
+                elif kind == "errors":
+                    for err in payload:
+                        print(json.dumps({"type": "error", "data": err}))
+                elif kind == "progress":
+                    print(json.dumps(payload), flush=True)
+                else:
+                    print(json.dumps({"type": kind, "data": payload}))
+            sys.stdout.flush()
+
+        elif args.command == "match":
+            from rule_matcher import RuleMatcher
+
+            banks, invoices, mappings = _load_match_input(args)
+
+            # One NDJSON line per match as it is made; the summary comes last
+            matcher = RuleMatcher(banks, invoices, mappings, progress_every=args.progress_every)
+            for kind, record in matcher.run():
+                if kind == "progress":
+                    print(json.dumps(record))
+                else:
+                    print(json.dumps({"type": kind, "data": record}))
+            sys.stdout.flush()
+
+        elif args.command == "settle":
+            from settlement_matcher import SettlementMatcher
+
+            banks, invoices, mappings = _load_match_input(args)
+            matcher = SettlementMatcher(
+                banks, invoices, mappings,
+                max_items=args.max_items,
+                max_candidates=args.max_candidates,
+                window_days=args.window_days,
+                group_time_ms=args.group_time_ms,
+                time_budget=args.time_budget,
+            )
+            for kind, record in matcher.run():
+                print(json.dumps({"type": kind, "data": record}))
+            sys.stdout.flush()
+
         elif args.command == "extract_text":
+            from invoice_parser import InvoiceParser
+
             parser_svc = InvoiceParser()
-            text = parser_svc.extract_raw_text(args.file, args.max_chars)
-            print(json.dumps({
-                "success": True,
-                "text": text,
-                "length": len(text)
-            }))
+            if args.file:
+                text = parser_svc.extract_raw_text(args.file, args.max_chars, args.compact)
+                print(json.dumps({
+                    "success": True,
+                    "text": text,
+                    "length": len(text)
+                }))
+            else:
+                files = args.files
+                if files is None:
+                    if args.files_from == "-":
+                        files = [line.strip() for line in sys.stdin if line.strip()]
+                    else:
+                        with open(args.files_from, "r", encoding="utf-8") as f:
+                            files = [line.strip() for line in f if line.strip()]
+                # One NDJSON line per file as it finishes
+                for record in parser_svc.iter_extract_text(files, args.max_chars, args.compact, args.workers):
+                    print(json.dumps(record), flush=True)
+
+        elif args.command == "serve":
+            from server import ParserServer
 
+            ParserServer(workers=args.workers, max_concurrent=args.max_concurrent).serve()
             
     except Exception as e:
         traceback.print_exc(file=sys.stderr)
@@ -78,6 +462,12 @@ def main():
             "message": str(e)
         }))
         sys.exit(1)
+    finally:
+        if profiler:
+            profiler.uninstall()
+            # stderr, so stdout stays a clean JSON protocol stream
+            print(json.dumps({"type": "import_profile", "data": profiler.report(args.import_budget_ms)}),
+                  file=sys.stderr)
 
 if __name__ == "__main__":
     main()
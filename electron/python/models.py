@@ -1,8 +1,18 @@
 
-from dataclasses import dataclass
-from typing import Optional, List
+import sys
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import Any, Iterable, Iterator, Optional, List, Dict
 
-@dataclass
+# No per-instance __dict__: a slotted InvoiceInfo is about a quarter smaller
+# (bench/bench_models.py).
+# dataclass(slots=...) needs Python 3.10; older interpreters get plain dataclasses.
+_SLOTS: Dict[str, bool] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+# to_dict / from_dict are written out field by field: dataclasses.asdict
+# deep-copies recursively and is several times slower.
+
+@dataclass(**_SLOTS)
 class InvoiceInfo:
     file_path: str
     file_name: str
@@ -24,18 +34,120 @@ class InvoiceInfo:
     issuer: Optional[str] = None
     parse_source: str = "none"
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_path": self.file_path,
+            "file_name": self.file_name,
+            "invoice_code": self.invoice_code,
+            "invoice_number": self.invoice_number,
+            "invoice_date": self.invoice_date,
+            "buyer_name": self.buyer_name,
+            "buyer_tax_id": self.buyer_tax_id,
+            "seller_name": self.seller_name,
+            "seller_tax_id": self.seller_tax_id,
+            "amount": self.amount,
+            "tax_amount": self.tax_amount,
+            "total_amount": self.total_amount,
+            "tax_rate": self.tax_rate,
+            "invoice_type": self.invoice_type,
+            "item_name": self.item_name,
+            "total_amount_chinese": self.total_amount_chinese,
+            "remark": self.remark,
+            "issuer": self.issuer,
+            "parse_source": self.parse_source,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "InvoiceInfo":
+        """Inverse of to_dict; unknown keys are ignored and missing ones take their defaults."""
+        get = data.get
+        return cls(
+            data["file_path"],
+            get("file_name") or "",
+            get("invoice_code"),
+            get("invoice_number"),
+            get("invoice_date"),
+            get("buyer_name"),
+            get("buyer_tax_id"),
+            get("seller_name"),
+            get("seller_tax_id"),
+            get("amount"),
+            get("tax_amount"),
+            get("total_amount"),
+            get("tax_rate"),
+            get("invoice_type"),
+            get("item_name"),
+            get("total_amount_chinese"),
+            get("remark"),
+            get("issuer"),
+            get("parse_source") or "none",
+        )
+
+INVOICE_FIELDS = tuple(f.name for f in fields(InvoiceInfo))
+_invoice_values = attrgetter(*INVOICE_FIELDS)
+
+
+class InvoiceColumns:
+    """
+    Invoices as one list per field, for large batches: no object or dict
+    per invoice is kept, and the JSON form names each field once.
+    """
+    __slots__ = ("columns", "_lists")
+
+    def __init__(self):
+        self.columns: Dict[str, List[Any]] = {name: [] for name in INVOICE_FIELDS}
+        self._lists = tuple(self.columns.values())
+
+    @classmethod
+    def from_invoices(cls, invoices: Iterable[InvoiceInfo]) -> "InvoiceColumns":
+        table = cls()
+        for inv in invoices:
+            table.append(inv)
+        return table
+
+    def append(self, inv: InvoiceInfo):
+        for column, value in zip(self._lists, _invoice_values(inv)):
+            column.append(value)
+
+    def __len__(self) -> int:
+        return len(self._lists[0])
+
+    def __iter__(self) -> Iterator[InvoiceInfo]:
+        for values in zip(*self._lists):
+            yield InvoiceInfo(*values)
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        return self.columns
+
+@dataclass(**_SLOTS)
 class DuplicateRecord:
     file_name: str
     invoice_number: Optional[str]
     reason: str
+    # Where the kept copy was first seen (dedup index / identical file)
+    first_batch_id: Optional[str] = None
+    first_file_path: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file_name": self.file_name,
+            "invoice_number": self.invoice_number,
+            "reason": self.reason,
+            "first_batch_id": self.first_batch_id,
+            "first_file_path": self.first_file_path,
+        }
 
-@dataclass
+@dataclass(**_SLOTS)
 class ErrorRecord:
     file_path: str
     error: str
+    # "timeout" / "oom" / "crash" when the parse watchdog gave up on the file
+    reason: Optional[str] = None
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {"file_path": self.file_path, "error": self.error, "reason": self.reason}
+
+@dataclass(**_SLOTS)
 class BatchParseResult:
     success: bool
     invoices: List[InvoiceInfo]
@@ -45,3 +157,33 @@ class BatchParseResult:
     success_count: int
     duplicate_count: int
     fail_count: int
+    cache_hits: int = 0
+    cache_misses: int = 0
+    tier_counts: Dict[str, int] = field(default_factory=dict)
+    # Per-rule calls/hits/skips/ms, only when rule stats are enabled
+    rule_stats: Optional[Dict[str, dict]] = None
+    # Stage histograms, slowest files and peak memory, only with --profile
+    profile: Optional[Dict[str, Any]] = None
+    # Per-file wall-time percentiles and timeout/oom counts, only under parse limits
+    latency: Optional[Dict[str, Any]] = None
+    # batch_parse(columnar=True): the invoices, with `invoices` left empty
+    invoice_columns: Optional[InvoiceColumns] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "success": self.success,
+            "invoices": [inv.to_dict() for inv in self.invoices],
+            "errors": [e.to_dict() for e in self.errors],
+            "duplicates": [d.to_dict() for d in self.duplicates],
+            "total_files": self.total_files,
+            "success_count": self.success_count,
+            "duplicate_count": self.duplicate_count,
+            "fail_count": self.fail_count,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "tier_counts": self.tier_counts,
+            "rule_stats": self.rule_stats,
+            "profile": self.profile,
+            "latency": self.latency,
+            "invoice_columns": self.invoice_columns.to_dict() if self.invoice_columns is not None else None,
+        }
@@ -0,0 +1,95 @@
+"""
+Persistent parse-result cache.
+
+Results are keyed by the SHA-256 of the PDF bytes plus a parser version
+stamp, so renamed/moved copies still hit and bumping the version makes
+every older entry a miss.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from typing import IO, Optional, Union
+
+import fast_json
+from models import InvoiceInfo
+
+CACHE_FILE_NAME = ".parse_cache.sqlite"
+
+
+def hash_file(file_path: Union[str, IO[bytes]], chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, or of an open binary stream (rewound afterwards so it can still be parsed)."""
+    h = hashlib.sha256()
+    if not isinstance(file_path, str):
+        for chunk in iter(lambda: file_path.read(chunk_size), b""):
+            h.update(chunk)
+        file_path.seek(0)
+        return h.hexdigest()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_path(folder_path: str) -> str:
+    """Cache lives in the workspace root, i.e. next to the invoice folder."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder_path)), CACHE_FILE_NAME)
+
+
+class ParseCache:
+    def __init__(self, db_path: str, parser_version: str):
+        self.db_path = db_path
+        self.parser_version = parser_version
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS parse_cache (
+                content_hash TEXT NOT NULL,
+                parser_version TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (content_hash, parser_version)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, content_hash: str, file_path: str) -> Optional[InvoiceInfo]:
+        row = self.conn.execute(
+            "SELECT data FROM parse_cache WHERE content_hash = ? AND parser_version = ?",
+            (content_hash, self.parser_version)
+        ).fetchone()
+        if not row:
+            return None
+        data = fast_json.loads(row[0])
+        # Same bytes may sit under a different name/location this time
+        data["file_path"] = file_path
+        data["file_name"] = os.path.basename(file_path)
+        return InvoiceInfo.from_dict(data)
+
+    def put(self, content_hash: str, invoice: InvoiceInfo):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO parse_cache (content_hash, parser_version, data, created_at) VALUES (?, ?, ?, ?)",
+            (content_hash, self.parser_version, fast_json.dumps(invoice.to_dict()), time.time())
+        )
+        self.conn.commit()
+
+    def prune(self, max_age_days: Optional[float] = None) -> int:
+        """Drop entries from other parser versions (and optionally old ones). Returns rows removed."""
+        cur = self.conn.execute(
+            "DELETE FROM parse_cache WHERE parser_version != ?", (self.parser_version,)
+        )
+        removed = cur.rowcount
+        if max_age_days is not None:
+            cur = self.conn.execute(
+                "DELETE FROM parse_cache WHERE created_at < ?", (time.time() - max_age_days * 86400,)
+            )
+            removed += cur.rowcount
+        self.conn.commit()
+        if removed:
+            self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,273 @@
+"""
+Killable parser workers for batches with limits
+(`main.py parse --file_timeout / --max_memory_mb / --batch_timeout`).
+
+A ProcessPoolExecutor cannot stop one task: a worker stuck inside pdfminer
+keeps its slot (and the batch) forever, and killing it breaks the whole
+pool. WatchdogPool instead owns one process and one pipe per worker, hands
+each worker a single file at a time and watches it:
+
+    timeout - the file ran past file_timeout, or the batch hit its deadline
+    oom     - the worker grew more than max_memory_mb past its baseline:
+              RSS (polled from /proc) rose that far above the RSS it had
+              once initialised, or the address-space cap (the mappings it
+              had then, plus max_memory_mb) raised MemoryError; or it was
+              SIGKILLed (the kernel OOM killer)
+    crash   - the worker died any other way
+
+Both memory checks measure from the same point, the worker after the
+interpreter, pdfplumber and the parser are loaded, so max_memory_mb is what
+parsing itself may use, whatever the imports cost.
+
+The worker is killed and replaced, the file becomes a ParseFailure carrying
+that reason, and the batch carries on. Every file's wall time (dispatch to
+result, as seen by the parent) feeds latency_summary() for tuning the limits.
+"""
+import multiprocessing
+import os
+import signal
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+# How often RSS is sampled while a memory cap is set
+MEMORY_POLL_S = 0.2
+SLOWEST_N = 5
+
+
+class ParseFailure(str):
+    """Error message of a file the watchdog gave up on; `reason` is timeout/oom/crash."""
+
+    def __new__(cls, message: str, reason: str):
+        obj = super().__new__(cls, message)
+        obj.reason = reason
+        return obj
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None  # no procfs (macOS/Windows) or the process is gone
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _cap_address_space(max_memory_mb: Optional[float]):
+    """Make allocations past the cap raise MemoryError in this process (Linux)."""
+    if not max_memory_mb:
+        return
+    try:
+        import resource
+        with open("/proc/self/statm") as f:
+            base = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (ImportError, OSError, ValueError):
+        return
+    # Relative to what the interpreter and its imports already map
+    limit = base + int(max_memory_mb * 1024 * 1024)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    except (ValueError, OSError):
+        pass
+
+
+def _worker_main(conn, parser_kwargs: dict, max_memory_mb: Optional[float], baseline):
+    from invoice_parser import _init_worker, _parse_in_worker_instrumented
+
+    # Ctrl+C goes to the parent, which tears the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker(parser_kwargs)
+    _cap_address_space(max_memory_mb)
+    # The parent's RSS poll counts from here; 0 (no procfs) leaves it off
+    baseline.value = _rss_mb(os.getpid()) or 0.0
+    while True:
+        try:
+            file_path = conn.recv()
+        except (EOFError, OSError):
+            break
+        if file_path is None:
+            break
+        try:
+            outcome, extras = _parse_in_worker_instrumented(file_path)
+        except MemoryError:
+            outcome, extras = (False, None, "MemoryError"), {}
+        try:
+            conn.send((outcome, extras))
+        except MemoryError:
+            conn.send(((False, None, "MemoryError"), {}))
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "task", "baseline")
+
+    def __init__(self, ctx, parser_kwargs: dict, max_memory_mb: Optional[float]):
+        self.conn, child = ctx.Pipe()
+        # RSS in MB once the worker has initialised; 0 until then
+        self.baseline = ctx.Value("d", 0.0, lock=False)
+        self.process = ctx.Process(target=_worker_main, args=(child, parser_kwargs, max_memory_mb, self.baseline),
+                                   daemon=True)
+        self.process.start()
+        child.close()
+        # (index, file_path, started) while a file is in flight
+        self.task: Optional[Tuple[int, str, float]] = None
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WatchdogPool:
+    def __init__(
+        self,
+        workers: int,
+        parser_kwargs: dict,
+        file_timeout: Optional[float] = None,
+        max_memory_mb: Optional[float] = None,
+        deadline: Optional[float] = None,
+    ):
+        """`deadline` is an absolute time.perf_counter() value for the whole batch."""
+        self.workers = max(1, workers)
+        self.parser_kwargs = parser_kwargs
+        self.file_timeout = file_timeout
+        self.max_memory_mb = max_memory_mb
+        self.deadline = deadline
+        self.latencies: List[Tuple[float, str]] = []
+        self.failures = {"timeout": 0, "oom": 0, "crash": 0}
+        self._ctx = multiprocessing.get_context()
+
+    def _fail(self, worker: _Worker, message: str, reason: str) -> Tuple[int, Tuple[bool, None, ParseFailure], dict]:
+        idx, file_path, started = worker.task
+        worker.task = None
+        self.failures[reason] += 1
+        self.latencies.append(((time.perf_counter() - started) * 1000, file_path))
+        return idx, (False, None, ParseFailure(message, reason)), {}
+
+    def run(self, tasks: List[Tuple[int, str]]) -> Iterator[Tuple[int, Any, dict]]:
+        """Yields (index, ParseOutcome, extras) per task in completion order."""
+        queue: Deque[Tuple[int, str]] = deque(tasks)
+        pool: List[_Worker] = [_Worker(self._ctx, self.parser_kwargs, self.max_memory_mb)
+                               for _ in range(min(self.workers, len(tasks)))]
+        try:
+            while queue or any(w.task for w in pool):
+                now = time.perf_counter()
+                if self.deadline is not None and now >= self.deadline:
+                    yield from self._abandon(pool, queue)
+                    return
+
+                for i, w in enumerate(pool):
+                    if w.task is None and queue:
+                        idx, file_path = queue.popleft()
+                        w.task = (idx, file_path, time.perf_counter())
+                        w.conn.send(file_path)
+
+                busy = [w for w in pool if w.task]
+                ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy], self._wait_time(busy))
+                now = time.perf_counter()
+
+                for i, w in enumerate(pool):
+                    if w.task is None:
+                        continue
+                    result = None
+                    if w.conn in ready:
+                        try:
+                            outcome, extras = w.conn.recv()
+                        except (EOFError, OSError):
+                            outcome = None
+                        if outcome is not None and outcome[2] == "MemoryError":
+                            result = self._fail(w, f"Memory cap of {self.max_memory_mb} MB exceeded", "oom")
+                        elif outcome is not None:
+                            idx, file_path, started = w.task
+                            w.task = None
+                            self.latencies.append(((now - started) * 1000, file_path))
+                            yield idx, outcome, extras
+                            continue
+                    if result is None and not w.process.is_alive():
+                        code = w.process.exitcode
+                        if code == -signal.SIGKILL:
+                            result = self._fail(w, "Worker killed (out of memory)", "oom")
+                        else:
+                            result = self._fail(w, f"Worker exited with code {code}", "crash")
+                    elif result is None and self.file_timeout and now - w.task[2] > self.file_timeout:
+                        result = self._fail(w, f"Parse exceeded {self.file_timeout:g}s", "timeout")
+                    elif result is None and self.max_memory_mb and w.baseline.value:
+                        base = w.baseline.value
+                        rss = _rss_mb(w.process.pid)
+                        if rss is not None and rss - base > self.max_memory_mb:
+                            result = self._fail(w, f"Worker RSS grew {rss - base:.0f} MB past its {base:.0f} MB "
+                                                   f"baseline (cap {self.max_memory_mb:g} MB)", "oom")
+                    if result is not None:
+                        # The worker may be mid-allocation or stuck: replace it
+                        w.kill()
+                        pool[i] = _Worker(self._ctx, self.parser_kwargs, self.max_memory_mb)
+                        yield result
+        finally:
+            self._shutdown(pool)
+
+    def _wait_time(self, busy: List[_Worker]) -> Optional[float]:
+        now = time.perf_counter()
+        limits = []
+        if self.file_timeout:
+            limits += [w.task[2] + self.file_timeout - now for w in busy]
+        if self.deadline is not None:
+            limits.append(self.deadline - now)
+        if self.max_memory_mb:
+            limits.append(MEMORY_POLL_S)
+        return max(0.0, min(limits)) if limits else None
+
+    def _abandon(self, pool: List[_Worker], queue: Deque[Tuple[int, str]]) -> Iterator[Tuple[int, Any, dict]]:
+        """Batch deadline: kill in-flight files, and files never started fail without running."""
+        for w in pool:
+            if w.task:
+                result = self._fail(w, "Batch deadline exceeded", "timeout")
+                w.kill()
+                yield result
+        while queue:
+            idx, _ = queue.popleft()
+            self.failures["timeout"] += 1
+            yield idx, (False, None, ParseFailure("Batch deadline exceeded before parsing", "timeout")), {}
+
+    @staticmethod
+    def _shutdown(pool: List[_Worker]):
+        for w in pool:
+            if w.process.is_alive() and w.task is None:
+                try:
+                    w.conn.send(None)
+                except OSError:
+                    pass
+        for w in pool:
+            w.process.join(timeout=1)
+            if w.process.is_alive():
+                w.process.kill()
+                w.process.join()
+            w.conn.close()
+
+    def report(self) -> Dict[str, Any]:
+        return latency_summary(self.latencies, self.failures)
+
+
+def _percentile(ordered: List[float], p: float) -> Optional[float]:
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return round(ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo), 3)
+
+
+def latency_summary(latencies: List[Tuple[float, str]], failures: Dict[str, int]) -> Dict[str, Any]:
+    """Tail latency of per-file wall times plus failure counts, for tuning the limits."""
+    ordered = sorted(ms for ms, _ in latencies)
+    slowest = sorted(latencies, key=lambda item: item[0], reverse=True)[:SLOWEST_N]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        "p50_ms": _percentile(ordered, 50),
+        "p90_ms": _percentile(ordered, 90),
+        "p95_ms": _percentile(ordered, 95),
+        "p99_ms": _percentile(ordered, 99),
+        "max_ms": round(ordered[-1], 3) if ordered else None,
+        "slowest": [{"file": os.path.basename(getattr(fp, "path", fp)), "ms": round(ms, 3)} for ms, fp in slowest],
+        **failures,
+    }
@@ -0,0 +1,170 @@
+"""
+Lean page extraction for invoice PDFs.
+
+pdfplumber's generic Page.parse_objects converts every layout object
+(images included) into a dict of all known attributes, resolving and
+normalising colours on each one. The invoice extractors only ever look at
+page text and ruled tables, which need nothing but char geometry/text and
+line/rect/curve edges. This module builds just those objects, once per
+page, and seeds them into the page so pdfplumber's own text and table code
+runs on the slim set. Table cells are then filled from a row-sorted char
+index instead of rescanning every char for every row.
+
+Output is identical to page.extract_text() / page.extract_tables() with
+default settings.
+"""
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+from pdfminer.layout import LTChar, LTContainer, LTCurve, LTLine, LTRect
+from pdfplumber import utils
+from pdfplumber.table import TableFinder, TableSettings
+
+Table = List[List[Optional[str]]]
+
+
+def _geometry(page, obj, kind: str) -> Dict[str, Any]:
+    y1 = obj.y1
+    top = page.height - y1
+    return {
+        "object_type": kind,
+        "page_number": page.page_number,
+        "x0": obj.x0,
+        "y0": obj.y0,
+        "x1": obj.x1,
+        "y1": y1,
+        "width": obj.width,
+        "height": obj.height,
+        "top": top,
+        "bottom": page.height - obj.y0,
+        "doctop": page.initial_doctop + top,
+    }
+
+
+def _iter_layout(objs):
+    for obj in objs:
+        # Same traversal as pdfplumber without LAParams: containers
+        # (figures) are not objects themselves, only their children are.
+        if isinstance(obj, LTContainer):
+            yield from _iter_layout(obj._objs)
+        else:
+            yield obj
+
+
+def load_page_objects(page) -> Dict[str, List[Dict[str, Any]]]:
+    """Build char/line/rect/curve objects for a page once; images and annots are skipped."""
+    if hasattr(page, "_objects"):
+        return page._objects
+
+    chars, lines, rects, curves = [], [], [], []
+    height = page.height
+    for obj in _iter_layout(page.layout._objs):
+        # LTLine/LTRect subclass LTCurve, so check them first
+        if isinstance(obj, LTChar):
+            attr = _geometry(page, obj, "char")
+            fontname = obj.fontname
+            if isinstance(fontname, bytes):
+                fontname = fontname.decode("utf-8", "replace")
+            attr["text"] = obj.get_text()
+            attr["fontname"] = fontname
+            attr["size"] = obj.size
+            attr["upright"] = obj.upright
+            chars.append(attr)
+        elif isinstance(obj, LTLine):
+            attr = _geometry(page, obj, "line")
+            attr["pts"] = [(x, height - y) for x, y in obj.pts]
+            lines.append(attr)
+        elif isinstance(obj, LTRect):
+            rects.append(_geometry(page, obj, "rect"))
+        elif isinstance(obj, LTCurve):
+            attr = _geometry(page, obj, "curve")
+            attr["pts"] = [(x, height - y) for x, y in obj.pts]
+            curves.append(attr)
+
+    objects = {}
+    for kind, items in (("char", chars), ("line", lines), ("rect", rects), ("curve", curves)):
+        if items:
+            objects[kind] = items
+    page._objects = objects
+    return objects
+
+
+def extract_text(page) -> str:
+    load_page_objects(page)
+    return page.extract_text() or ""
+
+
+def text_from_chars(chars: List[Dict[str, Any]], bbox) -> str:
+    """page.extract_text() for chars kept apart from their page (layout snapshots)."""
+    x0, top, x1, bottom = bbox
+    return utils.chars_to_textmap(chars, x_shift=x0, y_shift=top, layout_width=x1 - x0,
+                                  layout_height=bottom - top).as_string or ""
+
+
+def _char_index(chars: List[Dict[str, Any]]) -> Tuple[List[float], List[int]]:
+    """Char positions sorted by vertical midpoint, for row-band lookups."""
+    order = sorted(range(len(chars)), key=lambda i: (chars[i]["top"] + chars[i]["bottom"]) / 2)
+    mids = [(chars[i]["top"] + chars[i]["bottom"]) / 2 for i in order]
+    return mids, order
+
+
+def _in_bbox(char: Dict[str, Any], bbox) -> bool:
+    v_mid = (char["top"] + char["bottom"]) / 2
+    h_mid = (char["x0"] + char["x1"]) / 2
+    x0, top, x1, bottom = bbox
+    return (h_mid >= x0) and (h_mid < x1) and (v_mid >= top) and (v_mid < bottom)
+
+
+def _fill_table(table, chars, index, text_settings: Dict[str, Any]) -> Table:
+    """pdfplumber Table.extract, but each row only looks at chars in its vertical band."""
+    mids, order = index
+    rows = []
+    for row in table.rows:
+        _, top, _, bottom = row.bbox
+        lo, hi = bisect_left(mids, top), bisect_left(mids, bottom)
+        # Restore page order so cell text clusters exactly as upstream
+        row_chars = [chars[i] for i in sorted(order[lo:hi])]
+        row_chars = [c for c in row_chars if _in_bbox(c, row.bbox)]
+
+        arr = []
+        for cell in row.cells:
+            if cell is None:
+                arr.append(None)
+                continue
+            cell_chars = [c for c in row_chars if _in_bbox(c, cell)]
+            if cell_chars:
+                kwargs = dict(text_settings)
+                kwargs["x_shift"] = cell[0]
+                kwargs["y_shift"] = cell[1]
+                if "layout" in kwargs:
+                    kwargs["layout_width"] = cell[2] - cell[0]
+                    kwargs["layout_height"] = cell[3] - cell[1]
+                arr.append(utils.extract_text(cell_chars, **kwargs))
+            else:
+                arr.append("")
+        rows.append(arr)
+    return rows
+
+
+def extract_tables(page) -> List[Table]:
+    load_page_objects(page)
+    return tables_from(page)
+
+
+def tables_from(page) -> List[Table]:
+    """
+    Tables of anything with .chars, .edges and .bbox: a page whose objects
+    are loaded, or a layout snapshot (TableFinder reads nothing else).
+    """
+    tset = TableSettings.resolve(None)
+    found = TableFinder(page, tset).tables
+    if not found:
+        return []
+    chars = page.chars
+    index = _char_index(chars)
+    return [_fill_table(t, chars, index, tset.text_settings or {}) for t in found]
+
+
+def extract_page(page) -> Tuple[str, List[Table]]:
+    """Text and tables of a page from a single object pass."""
+    return extract_text(page), extract_tables(page)
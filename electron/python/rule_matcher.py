@@ -0,0 +1,337 @@
+"""
+Indexed Level 1-3 rule matching for `main.py match`.
+
+Same funnel and the same first-match-wins semantics as executeRuleMatching
+in electron/services/matchingService.ts, without the per-pair scan:
+
+    Level 1 perfect   - amount equal and normalized payer == seller/buyer
+    Level 2 tolerance - same name rule, invoice exceeds bank by (0, 20] yuan
+    Level 3 proxy     - payer is a mapped person of the seller/buyer company,
+                        invoice equals or exceeds bank by at most 20 yuan
+
+Bank rows are visited in input order; for each one the matcher takes the
+earliest still-unmatched invoice (input order) that qualifies, exactly like
+invoiceList.find(). Names are normalized once. Invoices are indexed per
+(role, normalized name) in amount order with a min-position segment tree
+on top, so "earliest unmatched invoice in this amount window" is one
+O(log n) query and matching an invoice is one O(log n) update.
+
+Records use the camelCase field names of the TypeScript rows/MatchRecord.
+"""
+import re
+import time
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+TOLERANCE_AMOUNT = 20
+GOODS_INCOME_REMARK = '货款收入'
+
+_WHITESPACE = re.compile(r'[\s\ufeff]+')
+_NAME_DOTS = re.compile(r'[·•]')
+_INF = float('inf')
+
+
+def normalize_name(name: Optional[str]) -> str:
+    """Same as normalizeName in parseService.ts."""
+    if not name:
+        return ''
+    name = _WHITESPACE.sub('', str(name))
+    return _NAME_DOTS.sub('', name.replace('（', '(').replace('）', ')'))
+
+
+def to_fixed_2(value: float) -> str:
+    """Number.prototype.toFixed(2): exact binary value, ties away from zero."""
+    return str(Decimal(value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP))
+
+
+class _AmountIndex:
+    """
+    Invoices of one (role, name) key sorted by amount, with a segment tree
+    holding each slot's input position (inf once matched) for range-min
+    queries.
+    """
+    __slots__ = ("amounts", "size", "tree")
+
+    def __init__(self, entries: List[Tuple[float, int]]):
+        # entries: (amount, position), already sorted
+        self.amounts = [a for a, _ in entries]
+        size = 1
+        while size < len(entries):
+            size *= 2
+        self.size = size
+        tree = [_INF] * (2 * size)
+        for slot, (_, pos) in enumerate(entries):
+            tree[size + slot] = pos
+        for i in range(size - 1, 0, -1):
+            left, right = tree[2 * i], tree[2 * i + 1]
+            tree[i] = left if left < right else right
+        self.tree = tree
+
+    def first(self, lo: int, hi: int) -> float:
+        """Smallest position among unmatched slots in [lo, hi)."""
+        tree = self.tree
+        best = _INF
+        lo += self.size
+        hi += self.size
+        while lo < hi:
+            if lo & 1:
+                if tree[lo] < best:
+                    best = tree[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                if tree[hi] < best:
+                    best = tree[hi]
+            lo >>= 1
+            hi >>= 1
+        return best
+
+    def remove(self, slot: int):
+        tree = self.tree
+        i = self.size + slot
+        tree[i] = _INF
+        i >>= 1
+        while i:
+            left, right = tree[2 * i], tree[2 * i + 1]
+            tree[i] = left if left < right else right
+            i >>= 1
+
+    def exact(self, amount: float) -> Tuple[int, int]:
+        return bisect_left(self.amounts, amount), bisect_right(self.amounts, amount)
+
+    def tolerance(self, amount: float, include_equal: bool) -> Tuple[int, int]:
+        """Slots with 0 < inv - amount <= 20 (or 0 <= ... when include_equal)."""
+        amounts = self.amounts
+        lo = bisect_left(amounts, amount) if include_equal else bisect_right(amounts, amount)
+        hi = bisect_right(amounts, amount + TOLERANCE_AMOUNT, lo)
+        # Settle the edge on the float difference itself, as the TS check does
+        while hi > lo and amounts[hi - 1] - amount > TOLERANCE_AMOUNT:
+            hi -= 1
+        while hi < len(amounts) and amounts[hi] - amount <= TOLERANCE_AMOUNT:
+            hi += 1
+        return lo, hi
+
+
+class RuleMatcher:
+    def __init__(
+        self,
+        bank_transactions: List[Dict[str, Any]],
+        invoices: List[Dict[str, Any]],
+        payer_mappings: List[Dict[str, Any]],
+        progress_every: int = 1000,
+    ):
+        self.banks = bank_transactions
+        self.invoices = invoices
+        self.mappings = payer_mappings
+        self.progress_every = max(1, progress_every)
+
+        self.bank_names = [normalize_name(b.get("payerName")) for b in bank_transactions]
+        self.seller_names = [normalize_name(inv.get("sellerName")) for inv in invoices]
+        self.buyer_names = [normalize_name(inv.get("buyerName")) for inv in invoices]
+
+        # (index, slot) of each invoice in the seller and buyer indexes
+        self._slots: List[List[Tuple[_AmountIndex, int]]] = [[] for _ in invoices]
+        self.by_seller = self._build_index(self.seller_names)
+        self.by_buyer = self._build_index(self.buyer_names)
+
+        # person -> [(normalized company, mapping)] in mapping order
+        self.person_mappings: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        for m in payer_mappings:
+            person = normalize_name(m.get("personName"))
+            self.person_mappings.setdefault(person, []).append((normalize_name(m.get("companyName")), m))
+
+    def _build_index(self, names: List[str]) -> Dict[str, _AmountIndex]:
+        groups: Dict[str, List[Tuple[float, int]]] = {}
+        for pos, (name, inv) in enumerate(zip(names, self.invoices)):
+            amount = inv.get("amount")
+            if amount is None or amount != amount:  # NaN never compares equal or within range
+                continue
+            groups.setdefault(name, []).append((amount, pos))
+
+        index = {}
+        for name, entries in groups.items():
+            entries.sort()
+            idx = index[name] = _AmountIndex(entries)
+            for slot, (_, pos) in enumerate(entries):
+                self._slots[pos].append((idx, slot))
+        return index
+
+    def _take(self, pos: int):
+        for idx, slot in self._slots[pos]:
+            idx.remove(slot)
+
+    def _first(self, indexes: List[Optional[_AmountIndex]], amount: float, window: str) -> Optional[int]:
+        best = _INF
+        for idx in indexes:
+            if idx is None:
+                continue
+            if window == "exact":
+                lo, hi = idx.exact(amount)
+            else:
+                lo, hi = idx.tolerance(amount, include_equal=(window == "proxy"))
+            if lo < hi:
+                pos = idx.first(lo, hi)
+                if pos < best:
+                    best = pos
+        return None if best == _INF else int(best)
+
+    def _progress(self, level: int, current: int, total: int, matched: int, message: str) -> dict:
+        return {
+            "type": "progress",
+            "level": level,
+            "current": current,
+            "total": total,
+            "matchedCount": matched,
+            "message": message,
+        }
+
+    def run(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Yields ("progress", event) and ("match", MatchRecord) as matches are
+        made, then one ("summary", MatchingStats-shaped dict).
+        """
+        start = time.perf_counter()
+        matched_banks = [False] * len(self.banks)
+        total = len(self.banks)
+        counts = {"perfect": 0, "tolerance": 0, "proxy": 0}
+
+        def name_indexes(i: int) -> List[Optional[_AmountIndex]]:
+            name = self.bank_names[i]
+            if GOODS_INCOME_REMARK in (self.banks[i].get("remark") or ''):
+                return [self.by_buyer.get(name)]
+            return [self.by_seller.get(name), self.by_buyer.get(name)]
+
+        # ---- Level 1: perfect ----
+        yield "progress", self._progress(1, 0, total, 0, '开始 Level 1: 完美匹配...')
+        for i, bank in enumerate(self.banks):
+            amount = bank.get("amount")
+            if amount is not None:
+                pos = self._first(name_indexes(i), amount, "exact")
+                if pos is not None:
+                    self._take(pos)
+                    matched_banks[i] = True
+                    counts["perfect"] += 1
+                    yield "match", {
+                        "bankId": bank.get("id"),
+                        "invoiceId": self.invoices[pos].get("id"),
+                        "matchType": "perfect",
+                        "reason": '金额与户名完全一致',
+                        "confidence": 1.0,
+                        "amountDiff": 0,
+                    }
+            if i % self.progress_every == 0:
+                yield "progress", self._progress(1, i, total, counts["perfect"], f"Level 1 进度: {i}/{total}")
+
+        # ---- Level 2: tolerance ----
+        remaining = total - counts["perfect"]
+        yield "progress", self._progress(2, 0, remaining, counts["perfect"], '开始 Level 2: 容差匹配...')
+        processed = 0
+        for i, bank in enumerate(self.banks):
+            if matched_banks[i]:
+                continue
+            processed += 1
+            amount = bank.get("amount")
+            if amount is not None:
+                pos = self._first(name_indexes(i), amount, "tolerance")
+                if pos is not None:
+                    self._take(pos)
+                    matched_banks[i] = True
+                    counts["tolerance"] += 1
+                    diff = self.invoices[pos]["amount"] - amount
+                    yield "match", {
+                        "bankId": bank.get("id"),
+                        "invoiceId": self.invoices[pos].get("id"),
+                        "matchType": "tolerance",
+                        "reason": f'手续费差异 {to_fixed_2(diff)} 元（银行转账手续费）',
+                        "confidence": 0.95,
+                        "amountDiff": diff,
+                    }
+            if processed % self.progress_every == 0:
+                yield "progress", self._progress(2, processed, remaining, counts["perfect"] + counts["tolerance"],
+                                                 f"Level 2 进度: {processed}/{remaining}")
+
+        # ---- Level 3: payer mapping ----
+        remaining = total - counts["perfect"] - counts["tolerance"]
+        matched = counts["perfect"] + counts["tolerance"]
+        yield "progress", self._progress(3, 0, remaining, matched, '开始 Level 3: 关系映射匹配...')
+        processed = 0
+        for i, bank in enumerate(self.banks):
+            if matched_banks[i]:
+                continue
+            processed += 1
+            person = self.bank_names[i]
+            related = self.person_mappings.get(person)
+            amount = bank.get("amount")
+            if related and amount is not None:
+                companies = dict.fromkeys(c for c, _ in related)
+                indexes = [idx for c in companies for idx in (self.by_seller.get(c), self.by_buyer.get(c))]
+                pos = self._first(indexes, amount, "proxy")
+                if pos is not None:
+                    self._take(pos)
+                    matched_banks[i] = True
+                    counts["proxy"] += 1
+                    yield "match", self._proxy_record(bank, pos, related)
+            if processed % self.progress_every == 0:
+                yield "progress", self._progress(3, processed, remaining, matched + counts["proxy"],
+                                                 f"Level 3 进度: {processed}/{remaining}")
+
+        matched_total = sum(counts.values())
+        yield "summary", {
+            "perfectCount": counts["perfect"],
+            "toleranceCount": counts["tolerance"],
+            "proxyCount": counts["proxy"],
+            "aiCount": 0,
+            "remainingBankCount": total - matched_total,
+            "remainingInvoiceCount": len(self.invoices) - matched_total,
+            "duration": int((time.perf_counter() - start) * 1000),
+        }
+
+    def _proxy_record(self, bank: dict, pos: int, related: List[Tuple[str, dict]]) -> dict:
+        inv = self.invoices[pos]
+        ns, nb = self.seller_names[pos], self.buyer_names[pos]
+        mapping = next((m for c, m in related if c == ns or c == nb), None)
+        if mapping:
+            company_name = mapping.get("companyName")
+        else:
+            company_name = inv.get("sellerName") if any(c == ns for c, _ in related) else inv.get("buyerName")
+        remark = mapping.get("remark") if mapping else None
+        diff = inv["amount"] - bank["amount"]
+        return {
+            "bankId": bank.get("id"),
+            "invoiceId": inv.get("id"),
+            "matchType": "proxy",
+            "reason": f"代付关系：{bank.get('payerName')} 代表 {company_name} 付款" + (f"（{remark}）" if remark else ""),
+            "confidence": 0.99,
+            "amountDiff": diff if diff > 0 else 0,
+        }
+
+
+def load_from_db(db_path: str, batch_id: str) -> Tuple[List[dict], List[dict], List[dict]]:
+    """Pending bank rows/invoices of a batch plus all payer mappings, in the order drizzle returns them.
+
+    Dates stay as stored (epoch seconds); settlement_matcher uses them for its date windows.
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    try:
+        banks = [
+            {"id": r[0], "payerName": r[1], "amount": r[2], "remark": r[3], "transactionDate": r[4]}
+            for r in conn.execute(
+                "SELECT id, payer_name, amount, remark, transaction_date FROM bank_transactions "
+                "WHERE batch_id = ? AND status = 'pending'", (batch_id,))
+        ]
+        invoices = [
+            {"id": r[0], "sellerName": r[1], "buyerName": r[2], "amount": r[3], "invoiceDate": r[4]}
+            for r in conn.execute(
+                "SELECT id, seller_name, buyer_name, amount, invoice_date FROM invoices "
+                "WHERE batch_id = ? AND status = 'pending'", (batch_id,))
+        ]
+        mappings = [
+            {"personName": r[0], "companyName": r[1], "remark": r[2]}
+            for r in conn.execute("SELECT person_name, company_name, remark FROM payer_mappings")
+        ]
+    finally:
+        conn.close()
+    return banks, invoices, mappings
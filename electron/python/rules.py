@@ -0,0 +1,240 @@
+"""
+Declarative field-extraction rules for InvoiceParser.
+
+Every regex the extractors use lives in RULE_SPECS and is compiled once at
+import. Rules that run over the full page text name the literal anchors
+any match must contain (e.g. 发票号码, 合, 备); a single sweep over the text
+records where each anchor first occurs, so a rule whose anchors are absent
+is skipped without running its regex, and a rule whose match must begin
+with its anchor starts searching there instead of at offset 0.
+
+Keyword lists the heuristics test cells and names against are data too
+(KEYWORD_SETS); see keyword_matcher for how they are matched and extended.
+
+RuleRunner optionally records per-rule calls, hits and time.
+"""
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Chinese numerals used in 价税合计(大写)
+CHINESE_AMOUNT_CHARS = r'[零壹贰叁肆伍陆柒捌玖拾佰仟万亿元角分整圆]'
+
+# Keyword sets, extendable per workspace (keyword_matcher.load_keyword_sets):
+#   org_suffix    - where an org name ends, for splitting "公司A 公司B" lines in
+#                   sparse-text PDFs ('有限公' handles a truncated '有限公司')
+#   company       - further words that mark a name as an organisation rather
+#                   than a person; a name is a company if it has either kind
+#   non_item_cell - table cells holding any of these are never the item line
+KEYWORD_SETS: Dict[str, List[str]] = {
+    "org_suffix": ['公司', '工作室', '有限', '有限公', '厂', '中心', '部', '站', '局',
+                   '处', '所', '院', '店', '行', '社', '商贸', '研究院',
+                   '集团', '银行'],
+    "company": ['大学', '学院', '医院', '事务所', '股份', '合伙', '工厂', '商店', '商行',
+                '研究所', '个体'],
+    "non_item_cell": ['购', '销', '价税合计', '备注', '开票人'],
+}
+
+_ITEM_STOP = r'\s+\d+\.\d|\s+台\s|\s+个\s|\s+套\s|\s+件\s|\s+只\s'
+_TAX_ID_LABEL = r'(?:统一社会信用代码|纳税人识别号|税号)\s*/?:?\s*[:：]?\s*([A-Za-z0-9]{15,20})'
+_TOTAL_LOWER = r'[（(]小写[)）]\s*[¥￥]\s*([\d,]+\.?\d*)'
+
+# (name, pattern, flags, anchors, match_starts_with_anchor)
+#
+# anchors: literals at least one of which appears in every match; only used
+#          to gate rules run over the full page text. Empty = always run.
+# match_starts_with_anchor: every match begins with one of the anchors, so
+#          the search can start at the first anchor occurrence.
+RULE_SPECS: List[Tuple[str, str, int, Tuple[str, ...], bool]] = [
+    # ---- table cells ----
+    ("table_buyer_label", r'购[\s|]*买[\s|]*方', 0, (), False),
+    ("table_seller_label", r'销[\s|]*售[\s|]*方', 0, (), False),
+    ("info_cell_split", r'[\n|]', 0, (), False),
+    ("info_cell_name", r'名\s*称\s*[:：]?\s*(.+)', 0, (), False),
+    ("table_total_lower", _TOTAL_LOWER, 0, (), False),
+    ("table_yuan_amounts", r'[¥￥]\s*([\d,]+\.?\d+)', 0, (), False),
+    ("table_item", r'\*([^*]+)\*(.+?)(?:' + _ITEM_STOP + r'|\s*$)', 0, (), False),
+
+    # ---- full page text ----
+    ("invoice_code", r'发票代码\s*[:：]\s*(\d{10,12})', 0, ('发票代码',), True),
+    ("invoice_number", r'发票号码\s*[:：]\s*(\d{8,20})', 0, ('发票号码',), True),
+    ("invoice_number_standalone", r'^(\d{20})\s*$', re.MULTILINE, (), False),
+    ("invoice_date", r'(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日', 0, ('年',), False),
+    ("buyer_seller_colon",
+     r'(?:购|买)\s*名\s*称\s*[:：]\s*(.+?)\s+(?:销|售)\s*名\s*称\s*[:：]\s*(.+)', 0, ('称',), False),
+    ("buyer_seller_spaced",
+     r'(?:购|买)\s+名\s+称\s+(.+?)\s+(?:销|售)\s+名\s+称\s+(.+)', 0, ('称',), False),
+    ("tax_id", _TAX_ID_LABEL, 0, ('统一社会信用代码', '纳税人识别号', '税号'), True),
+    ("total_line_pair", r'合\s*计\s*\n?\s*[¥￥]\s*([\d,]+\.?\d+)\s+[¥￥]\s*([\d,]+\.?\d+)', 0, ('合',), True),
+    ("total_lower", _TOTAL_LOWER, 0, ('小写',), False),
+    ("total_line_single", r'合\s*计\s*\n?\s*[¥￥]?\s*([\d,]+\.\d{2})', 0, ('合',), True),
+    ("tax_rate_labeled", r'(?:税率|征收率)\s*\n?\s*(\d{1,2})%', 0, ('税率', '征收率'), True),
+    ("percent", r'(\d{1,2})%', 0, ('%',), False),
+    ("text_item", r'\*([^*]+)\*(.+?)(?:' + _ITEM_STOP + r'|\s{2,}|\n)', 0, ('*',), True),
+    ("chinese_total_upper", r'[（(]大写[)）]\s*(' + CHINESE_AMOUNT_CHARS + r'{4,})', 0, ('大写',), False),
+    ("chinese_total_after_label", r'价税合计.*?(' + CHINESE_AMOUNT_CHARS + r'{4,})', 0, ('价税合计',), True),
+    ("remark",
+     r'备\s*注\s*[:：]\s*([\S\s]+?)(?:\n\s*(?:开\s*票\s*人|收\s*款\s*人|复\s*核|销\s*售|购\s*买)|$)',
+     0, ('备',), True),
+    ("remark_next_label", r'开\s*票\s*人|收\s*款\s*人|复\s*核|销\s*售|购\s*买', 0, (), False),
+    ("issuer", r'开\s*票\s*人\s*[:：]?\s*(\S+)', 0, ('开',), True),
+
+    # ---- sparse-text lines ----
+    ("sparse_tax_ids", r'([A-Za-z0-9]{15,20})', 0, (), False),
+    ("sparse_chinese_total", r'(' + CHINESE_AMOUNT_CHARS + r'{4,})\s+([\d,]+\.?\d*)', 0, (), False),
+
+    # ---- metadata / cleanup ----
+    ("metadata_date", r'(\d{4})[-年/](\d{1,2})[-月/](\d{1,2})', 0, (), False),
+    ("multi_space", r'\s{2,}', 0, (), False),
+    ("trailing_number", r'\s+\d+$', 0, (), False),
+    ("whitespace", r'\s+', 0, (), False),
+    ("trailing_tax_id", r'\s*[A-Z0-9]{15,20}\s*$', 0, (), False),
+    ("trailing_contact", r'(纳税人识别号|统一社会信用代码|税号|地.*电话|开户行|账号).*$', 0, (), False),
+]
+
+
+class Rule:
+    __slots__ = ("name", "regex", "anchors", "starts_with_anchor")
+
+    def __init__(self, name: str, pattern: str, flags: int, anchors: Tuple[str, ...], starts_with_anchor: bool):
+        self.name = name
+        self.regex = re.compile(pattern, flags)
+        self.anchors = anchors
+        self.starts_with_anchor = starts_with_anchor
+
+
+RULES: Dict[str, Rule] = {spec[0]: Rule(*spec) for spec in RULE_SPECS}
+
+# All anchors in one alternation, longest first. The zero-width lookahead
+# lets a single finditer pass report anchors that overlap each other.
+_ANCHORS = sorted({a for rule in RULES.values() for a in rule.anchors}, key=len, reverse=True)
+_ANCHOR_SWEEP = re.compile('(?=(' + '|'.join(re.escape(a) for a in _ANCHORS) + '))')
+# Shorter anchors that start where a longer one matched (alternation only reports the longest)
+_ANCHOR_PREFIXES = {a: [b for b in _ANCHORS if b != a and a.startswith(b)] for a in _ANCHORS}
+
+
+class TextScan:
+    """First position of every anchor in a page's text, from one sweep."""
+    __slots__ = ("text", "first")
+
+    def __init__(self, text: str):
+        self.text = text
+        first: Dict[str, int] = {}
+        for m in _ANCHOR_SWEEP.finditer(text):
+            anchor = m.group(1)
+            if anchor not in first:
+                first[anchor] = m.start()
+            for prefix in _ANCHOR_PREFIXES[anchor]:
+                if prefix not in first:
+                    first[prefix] = m.start()
+        self.first = first
+
+    def start_for(self, rule: Rule) -> Optional[int]:
+        """Where the rule can start searching, or None if it cannot match at all."""
+        if not rule.anchors:
+            return 0
+        positions = [self.first[a] for a in rule.anchors if a in self.first]
+        if not positions:
+            return None
+        return min(positions) if rule.starts_with_anchor else 0
+
+
+class RuleStats:
+    """Per-rule call/hit counts and cumulative time."""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.hits: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self.ns: Dict[str, int] = {}
+
+    def record(self, name: str, hit: bool, elapsed_ns: int):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if hit:
+            self.hits[name] = self.hits.get(name, 0) + 1
+        self.ns[name] = self.ns.get(name, 0) + elapsed_ns
+
+    def record_skip(self, name: str):
+        self.skipped[name] = self.skipped.get(name, 0) + 1
+
+    def to_dict(self) -> Dict[str, dict]:
+        names = set(self.calls) | set(self.skipped)
+        return {
+            name: {
+                "calls": self.calls.get(name, 0),
+                "hits": self.hits.get(name, 0),
+                "skipped": self.skipped.get(name, 0),
+                "ms": round(self.ns.get(name, 0) / 1e6, 3),
+            }
+            for name in sorted(names)
+        }
+
+    def merge(self, other: Dict[str, dict]):
+        """Fold in a to_dict() snapshot (e.g. returned from a pool worker)."""
+        for name, s in other.items():
+            self.calls[name] = self.calls.get(name, 0) + s["calls"]
+            self.hits[name] = self.hits.get(name, 0) + s["hits"]
+            self.skipped[name] = self.skipped.get(name, 0) + s["skipped"]
+            self.ns[name] = self.ns.get(name, 0) + int(s["ms"] * 1e6)
+
+
+class RuleRunner:
+    """
+    Runs named rules. After scan(text), rules applied to that same text
+    object are gated/started by the anchor sweep.
+    """
+
+    def __init__(self, stats: Optional[RuleStats] = None):
+        self.stats = stats
+        self._scan: Optional[TextScan] = None
+
+    def scan(self, text: str) -> TextScan:
+        self._scan = TextScan(text)
+        return self._scan
+
+    def _start(self, rule: Rule, text: str) -> Optional[int]:
+        if self._scan is not None and self._scan.text is text:
+            start = self._scan.start_for(rule)
+            if start is None and self.stats is not None:
+                self.stats.record_skip(rule.name)
+            return start
+        return 0
+
+    def search(self, name: str, text: str) -> Optional[re.Match]:
+        rule = RULES[name]
+        start = self._start(rule, text)
+        if start is None:
+            return None
+        if self.stats is None:
+            return rule.regex.search(text, start)
+        t0 = time.perf_counter_ns()
+        m = rule.regex.search(text, start)
+        self.stats.record(name, m is not None, time.perf_counter_ns() - t0)
+        return m
+
+    def match(self, name: str, text: str) -> Optional[re.Match]:
+        rule = RULES[name]
+        if self.stats is None:
+            return rule.regex.match(text)
+        t0 = time.perf_counter_ns()
+        m = rule.regex.match(text)
+        self.stats.record(name, m is not None, time.perf_counter_ns() - t0)
+        return m
+
+    def findall(self, name: str, text: str) -> list:
+        rule = RULES[name]
+        start = self._start(rule, text)
+        if start is None:
+            return []
+        if self.stats is None:
+            return rule.regex.findall(text, start)
+        t0 = time.perf_counter_ns()
+        found = rule.regex.findall(text, start)
+        self.stats.record(name, bool(found), time.perf_counter_ns() - t0)
+        return found
+
+    def split(self, name: str, text: str) -> List[str]:
+        return RULES[name].regex.split(text)
+
+    def sub(self, name: str, repl: str, text: str) -> str:
+        return RULES[name].regex.sub(repl, text)
@@ -0,0 +1,138 @@
+"""
+Resident parser process for `main.py serve`.
+
+Keeps pdfplumber/pdfminer (and openpyxl, once exported) imported and a pool of
+warm parser processes alive, so repeated calls from Electron do not pay an
+interpreter cold start each time.
+
+Protocol: one JSON object per line on stdin/stdout.
+
+    request:  {"id": "7", "command": "extract_text", "params": {"file": "/a.pdf"}}
+              ("files": [...] instead of "file" returns {"results": [...]} in input order)
+    progress: {"id": "7", "type": "progress", "current": 1, "total": 9, "file": "a.pdf"}
+    response: {"id": "7", "type": "result", "data": {...}}
+              {"id": "7", "type": "error", "message": "..."}
+
+Commands: parse_file, parse_folder, extract_text, export.
+Responses are written as requests complete, not in request order.
+The process exits cleanly once stdin reaches EOF and in-flight requests finish.
+"""
+import json
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import fast_json
+from invoice_parser import InvoiceParser, _init_worker, _parse_in_worker, _extract_text_in_worker
+from models import InvoiceInfo
+
+
+class ParserServer:
+    def __init__(self, workers: int = 1, max_concurrent: int = 4):
+        self.workers = max(1, workers)
+        self.parser = InvoiceParser()
+        # CPU-bound parsing runs in warm worker processes; the thread pool only
+        # dispatches requests and waits on them.
+        self.process_pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        self.request_pool = ThreadPoolExecutor(max_workers=max(1, max_concurrent))
+        self._write_lock = threading.Lock()
+
+    def serve(self, stdin=None):
+        stdin = stdin or sys.stdin
+        self._write({"type": "ready"})
+        try:
+            for line in stdin:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self._write({"id": None, "type": "error", "message": f"Invalid JSON: {e}"})
+                    continue
+                self.request_pool.submit(self._handle, request)
+        finally:
+            # EOF: let in-flight requests finish, then release the workers
+            self.request_pool.shutdown(wait=True)
+            self.process_pool.shutdown(wait=True)
+
+    def _write(self, message: Dict[str, Any]):
+        line = fast_json.dumpb(message)
+        with self._write_lock:
+            sys.stdout.buffer.write(line + b"\n")
+            sys.stdout.buffer.flush()
+
+    def _handle(self, request: Dict[str, Any]):
+        request_id = request.get("id")
+        command = request.get("command")
+        params = request.get("params") or {}
+
+        handler = getattr(self, f"_cmd_{command}", None) if command else None
+        if handler is None:
+            self._write({"id": request_id, "type": "error", "message": f"Unknown command: {command}"})
+            return
+
+        try:
+            data = handler(request_id, params)
+            self._write({"id": request_id, "type": "result", "data": data})
+        except Exception as e:
+            traceback.print_exc(file=sys.stderr)
+            self._write({"id": request_id, "type": "error", "message": str(e)})
+
+    # ============================================
+    # COMMANDS
+    # ============================================
+
+    def _cmd_parse_file(self, request_id: Optional[str], params: dict) -> dict:
+        ok, inv, err = self.process_pool.submit(_parse_in_worker, params["file"]).result()
+        return {
+            "success": ok,
+            "invoice": inv.to_dict() if inv else None,
+            "error": err
+        }
+
+    def _cmd_parse_folder(self, request_id: Optional[str], params: dict) -> dict:
+        def on_progress(event: dict):
+            self._write({"id": request_id, **event})
+
+        result = self.parser.batch_parse(
+            params["folder"],
+            workers=self.workers,
+            on_progress=on_progress,
+            executor=self.process_pool
+        )
+        return result.to_dict()
+
+    def _cmd_extract_text(self, request_id: Optional[str], params: dict) -> dict:
+        max_chars = int(params.get("max_chars", 3000))
+        compact = bool(params.get("compact", False))
+        if "files" in params:
+            # Batch form: fan out over the warm pool, report each file as it finishes
+            files = list(params["files"])
+            results = []
+            for record in self.parser.iter_extract_text(files, max_chars, compact, self.workers,
+                                                        executor=self.process_pool):
+                results.append(record)
+                self._write({"id": request_id, "type": "progress", "current": len(results),
+                             "total": len(files), "file": os.path.basename(record["file_path"])})
+            order = {fp: i for i, fp in enumerate(files)}
+            results.sort(key=lambda r: order[r["file_path"]])
+            return {"success": True, "results": results}
+
+        text = self.process_pool.submit(_extract_text_in_worker, params["file"], max_chars, compact).result()
+        return {
+            "success": True,
+            "text": text,
+            "length": len(text)
+        }
+
+    def _cmd_export(self, request_id: Optional[str], params: dict) -> dict:
+        invoices = [InvoiceInfo.from_dict(inv) for inv in params["invoices"]]
+        self.parser.export_excel(invoices, params["output"])
+        return {
+            "success": True,
+            "file_path": params["output"]
+        }
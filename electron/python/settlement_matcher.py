@@ -0,0 +1,385 @@
+"""
+Combination matching for `main.py settle`.
+
+Rule matching (rule_matcher.py) only pairs one bank row with one invoice.
+This module covers the two settlement shapes that leaves behind:
+
+    many_to_one - one transfer pays several invoices of the same counterparty;
+                  invoice total exceeds the bank amount by 0-20 yuan (fees)
+    one_to_many - one invoice paid in instalments; bank rows add up to the
+                  invoice amount, short of it by at most 20 yuan
+
+Candidates are grouped by (counterparty, date window): an invoice only joins
+a bank row's group when the normalized payer (or a person mapped to the
+company) equals its seller/buyer and its date is within `window_days` of the
+transfer. Each group is solved as a bounded subset-sum over integer cents
+with meet-in-the-middle: both halves enumerate their subsets of at most
+`max_items` members, one side is sorted by size and sum, and every subset of
+the other side looks up its complement range with bisect. The whole range
+is counted (so ambiguity is exact) and the complement nearest the target is
+kept, so the search always returns the lowest-fee combination. Groups larger than
+`max_candidates` keep the candidates closest in date, and every group search
+stops at `group_time_ms` (the whole run at `time_budget`).
+
+Records use the camelCase field names of the TypeScript rows, like
+rule_matcher.
+"""
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from rule_matcher import GOODS_INCOME_REMARK, TOLERANCE_AMOUNT, normalize_name
+
+DEFAULT_MAX_ITEMS = 6
+DEFAULT_MAX_CANDIDATES = 32
+DEFAULT_WINDOW_DAYS = 90
+DEFAULT_GROUP_TIME_MS = 200
+# Equally close solutions (same fee, same size) kept for the date tie-break
+MAX_TIES = 16
+# Combinations scoring below this go to manual confirmation (match_results.needs_confirmation)
+CONFIRM_BELOW = 0.85
+
+_DAY = 86400
+
+
+def to_cents(amount: Any) -> int:
+    return int(round(float(amount) * 100))
+
+
+def to_epoch_seconds(value: Any) -> Optional[float]:
+    """Drizzle timestamps (seconds), JS millisecond epochs and ISO date strings."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        # Millisecond epochs are > 1e11 for any date after 1973
+        return value / 1000 if value > 1e11 else float(value)
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(text[:10], '%Y-%m-%d').timestamp()
+    except ValueError:
+        return None
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+# ============================================
+# BOUNDED SUBSET SUM (meet in the middle)
+# ============================================
+
+def _half_subsets(values: List[int], offset: int, max_items: int, limit: int,
+                  deadline: float) -> List[Tuple[int, int, Tuple[int, ...]]]:
+    """(sum, size, indices) of every subset of `values` with <= max_items members and sum <= limit."""
+    out: List[Tuple[int, int, Tuple[int, ...]]] = [(0, 0, ())]
+    # Items in ascending order let the DFS stop a branch at the first overflow
+    order = sorted(range(len(values)), key=values.__getitem__)
+    stack = [(0, 0, ())]
+    steps = 0
+    while stack:
+        start, total, members = stack.pop()
+        if len(members) >= max_items:
+            continue
+        for k in range(start, len(order)):
+            i = order[k]
+            s = total + values[i]
+            if s > limit:
+                break
+            subset = members + (offset + i,)
+            out.append((s, len(subset), subset))
+            stack.append((k + 1, s, subset))
+            steps += 1
+            if not steps & 1023 and time.perf_counter() > deadline:
+                raise SearchTimeout()
+    return out
+
+
+def subset_sums(values: List[int], lo: int, hi: int, target: int, max_items: int, deadline: float,
+                min_items: int = 2, max_ties: int = MAX_TIES) -> Tuple[List[Tuple[int, ...]], int]:
+    """
+    Subsets of positive `values` with lo <= sum <= hi and min_items..max_items
+    members. Returns the ones closest to `target` (then fewest members), at
+    most `max_ties` of them, and how many qualifying subsets there are in all.
+    Raises SearchTimeout once `deadline` (perf_counter) passes.
+    """
+    n = len(values)
+    mid = n // 2
+    left = _half_subsets(values[:mid], 0, max_items, hi, deadline)
+    right = _half_subsets(values[mid:], mid, max_items, hi, deadline)
+    # Right subsets per size, sorted by sum: a size bucket's complement range
+    # is then one bisect pair, counted without visiting it
+    buckets: List[List[Tuple[int, int, Tuple[int, ...]]]] = [[] for _ in range(max_items + 1)]
+    for entry in right:
+        buckets[entry[1]].append(entry)
+    for bucket in buckets:
+        bucket.sort(key=lambda entry: entry[0])
+    bucket_sums = [[entry[0] for entry in bucket] for bucket in buckets]
+
+    best: List[Tuple[int, ...]] = []
+    best_key = None
+    count = 0
+    steps = 0
+    for s, size, members in left:
+        for r_size in range(max(min_items - size, 0), max_items - size + 1):
+            sums = bucket_sums[r_size]
+            a = bisect_left(sums, lo - s)
+            b = bisect_right(sums, hi - s, a)
+            if a >= b:
+                continue
+            count += b - a
+            # Nearest complement on either side of target - s
+            k = bisect_left(sums, target - s, a, b)
+            for j in (k - 1, k):
+                if not a <= j < b:
+                    continue
+                key = (abs(target - s - sums[j]), size + r_size)
+                if best_key is not None and key > best_key:
+                    continue
+                if key != best_key:
+                    best, best_key = [], key
+                # Every right subset with this sum ties
+                first = bisect_left(sums, sums[j], a, b)
+                for r in range(first, b):
+                    if sums[r] != sums[j] or len(best) >= max_ties:
+                        break
+                    best.append(members + buckets[r_size][r][2])
+        steps += 1
+        if not steps & 1023 and time.perf_counter() > deadline:
+            raise SearchTimeout()
+    return best, count
+
+
+# ============================================
+# MATCHER
+# ============================================
+
+class SettlementMatcher:
+    def __init__(self, bank_transactions: List[dict], invoices: List[dict], payer_mappings: List[dict],
+                 max_items: int = DEFAULT_MAX_ITEMS, max_candidates: int = DEFAULT_MAX_CANDIDATES,
+                 window_days: float = DEFAULT_WINDOW_DAYS, group_time_ms: float = DEFAULT_GROUP_TIME_MS,
+                 time_budget: Optional[float] = None):
+        self.banks = bank_transactions
+        self.invoices = invoices
+        self.max_items = max_items
+        self.max_candidates = max_candidates
+        self.window = window_days * _DAY if window_days else None
+        self.group_time = group_time_ms / 1000
+        self.time_budget = time_budget
+
+        self.payer_names = [normalize_name(b.get('payerName')) for b in bank_transactions]
+        self.goods_income = [GOODS_INCOME_REMARK in (b.get('remark') or '') for b in bank_transactions]
+        self.bank_cents = [to_cents(b.get('amount') or 0) for b in bank_transactions]
+        self.bank_dates = [to_epoch_seconds(b.get('transactionDate')) for b in bank_transactions]
+        self.seller_names = [normalize_name(inv.get('sellerName')) for inv in invoices]
+        self.buyer_names = [normalize_name(inv.get('buyerName')) for inv in invoices]
+        self.invoice_cents = [to_cents(inv.get('amount') or 0) for inv in invoices]
+        self.invoice_dates = [to_epoch_seconds(inv.get('invoiceDate')) for inv in invoices]
+
+        # Normalized person -> companies they pay for (payer_mappings)
+        self.person_companies: Dict[str, List[str]] = {}
+        for m in payer_mappings:
+            person = normalize_name(m.get('personName'))
+            company = normalize_name(m.get('companyName'))
+            if person and company:
+                self.person_companies.setdefault(person, []).append(company)
+
+        self.by_seller: Dict[str, List[int]] = {}
+        self.by_buyer: Dict[str, List[int]] = {}
+        for pos in range(len(invoices)):
+            if self.seller_names[pos]:
+                self.by_seller.setdefault(self.seller_names[pos], []).append(pos)
+            if self.buyer_names[pos]:
+                self.by_buyer.setdefault(self.buyer_names[pos], []).append(pos)
+
+        self.bank_used = [False] * len(bank_transactions)
+        self.invoice_used = [False] * len(invoices)
+        self.stats = {"groups": 0, "timeouts": 0, "truncated": 0}
+
+    # ---------- grouping ----------
+
+    def _counterparties(self, i: int) -> List[str]:
+        payer = self.payer_names[i]
+        if not payer:
+            return []
+        return [payer] + self.person_companies.get(payer, [])
+
+    def _invoices_for(self, i: int) -> List[int]:
+        """Unmatched invoices whose seller/buyer is this bank row's counterparty, in input order."""
+        found = set()
+        for name in self._counterparties(i):
+            # Goods income is money received, so only the buyer can be the payer
+            if not self.goods_income[i]:
+                found.update(self.by_seller.get(name, ()))
+            found.update(self.by_buyer.get(name, ()))
+        return sorted(pos for pos in found if not self.invoice_used[pos])
+
+    def _in_window(self, a: Optional[float], b: Optional[float]) -> bool:
+        return self.window is None or a is None or b is None or abs(a - b) <= self.window
+
+    def _closest(self, candidates: List[int], date: Optional[float], dates: List[Optional[float]]) -> List[int]:
+        """At most max_candidates entries, nearest in date first (undated last), back in input order."""
+        if len(candidates) <= self.max_candidates:
+            return candidates
+        self.stats["truncated"] += 1
+        if date is None:
+            kept = candidates[:self.max_candidates]
+        else:
+            kept = sorted(candidates, key=lambda p: abs(dates[p] - date) if dates[p] is not None else float('inf'))
+            kept = sorted(kept[:self.max_candidates])
+        return kept
+
+    # ---------- search ----------
+
+    def _solve(self, values: List[int], lo: int, hi: int, target: int,
+               dates: List[Optional[float]], run_deadline: Optional[float]) -> Tuple[Optional[Tuple[int, ...]], int]:
+        """Best subset (fewest fee cents, then fewest items, then tightest dates) and the solution count."""
+        self.stats["groups"] += 1
+        deadline = time.perf_counter() + self.group_time
+        if run_deadline is not None:
+            deadline = min(deadline, run_deadline)
+        try:
+            closest, count = subset_sums(values, lo, hi, target, self.max_items, deadline)
+        except SearchTimeout:
+            self.stats["timeouts"] += 1
+            return None, 0
+        if not closest:
+            return None, 0
+
+        def rank(sol):
+            known = [dates[k] for k in sol if dates[k] is not None]
+            spread = max(known) - min(known) if known else 0
+            return spread, sorted(sol)
+
+        return min(closest, key=rank), count
+
+    @staticmethod
+    def _confidence(diff_cents: int, items: int, alternatives: int) -> float:
+        # Exact two-way split starts at 0.9; fees, more parts and rival solutions all cost trust
+        score = 0.9 - 0.1 * diff_cents / (TOLERANCE_AMOUNT * 100) - 0.03 * (items - 2)
+        if alternatives > 1:
+            score *= 0.7
+        return round(max(0.3, min(score, 0.95)), 2)
+
+    # ---------- passes ----------
+
+    def _many_to_one(self, run_deadline: Optional[float]) -> Iterator[dict]:
+        tol = TOLERANCE_AMOUNT * 100
+        for i, bank in enumerate(self.banks):
+            if self.bank_used[i] or self.bank_cents[i] <= 0:
+                continue
+            if run_deadline is not None and time.perf_counter() > run_deadline:
+                return
+            target = self.bank_cents[i]
+            date = self.bank_dates[i]
+            candidates = [p for p in self._invoices_for(i)
+                          if 0 < self.invoice_cents[p] <= target + tol
+                          and self._in_window(date, self.invoice_dates[p])]
+            if len(candidates) < 2:
+                continue
+            candidates = self._closest(candidates, date, self.invoice_dates)
+            values = [self.invoice_cents[p] for p in candidates]
+            dates = [self.invoice_dates[p] for p in candidates]
+            best, count = self._solve(values, target, target + tol, target, dates, run_deadline)
+            if best is None:
+                continue
+
+            positions = [candidates[k] for k in best]
+            for p in positions:
+                self.invoice_used[p] = True
+            self.bank_used[i] = True
+            total = sum(values[k] for k in best)
+            diff = total - target
+            reason = f"合并付款：1 笔银行流水对应 {len(best)} 张发票，发票合计 {total / 100:.2f} 元"
+            if diff:
+                reason += f"，差额 {diff / 100:.2f} 元（手续费）"
+            yield {
+                "matchType": "many_to_one",
+                "bankIds": [bank.get('id')],
+                "invoiceIds": [self.invoices[p].get('id') for p in positions],
+                "bankTotal": target / 100,
+                "invoiceTotal": total / 100,
+                "amountDiff": diff / 100,
+                "confidence": self._confidence(diff, len(best), count),
+                "alternatives": count - 1,
+                "needsConfirmation": self._confidence(diff, len(best), count) < CONFIRM_BELOW,
+                "reason": reason,
+            }
+
+    def _one_to_many(self, run_deadline: Optional[float]) -> Iterator[dict]:
+        tol = TOLERANCE_AMOUNT * 100
+        # Bank rows per counterparty name they can stand for (payer and mapped companies)
+        by_name: Dict[str, List[int]] = {}
+        for i in range(len(self.banks)):
+            if not self.bank_used[i] and self.bank_cents[i] > 0:
+                for name in self._counterparties(i):
+                    by_name.setdefault(name, []).append(i)
+
+        for pos, inv in enumerate(self.invoices):
+            if self.invoice_used[pos] or self.invoice_cents[pos] <= 0:
+                continue
+            if run_deadline is not None and time.perf_counter() > run_deadline:
+                return
+            target = self.invoice_cents[pos]
+            date = self.invoice_dates[pos]
+            found = set(by_name.get(self.buyer_names[pos], ()))
+            found.update(i for i in by_name.get(self.seller_names[pos], ()) if not self.goods_income[i])
+            candidates = [i for i in sorted(found)
+                          if not self.bank_used[i] and self.bank_cents[i] <= target
+                          and self._in_window(date, self.bank_dates[i])]
+            if len(candidates) < 2:
+                continue
+            candidates = self._closest(candidates, date, self.bank_dates)
+            values = [self.bank_cents[i] for i in candidates]
+            dates = [self.bank_dates[i] for i in candidates]
+            best, count = self._solve(values, max(target - tol, 1), target, target, dates, run_deadline)
+            if best is None:
+                continue
+
+            rows = [candidates[k] for k in best]
+            for i in rows:
+                self.bank_used[i] = True
+            self.invoice_used[pos] = True
+            total = sum(values[k] for k in best)
+            diff = target - total
+            reason = f"分期付款：{len(best)} 笔银行流水合计 {total / 100:.2f} 元对应 1 张发票"
+            if diff:
+                reason += f"，差额 {diff / 100:.2f} 元（手续费）"
+            yield {
+                "matchType": "one_to_many",
+                "bankIds": [self.banks[i].get('id') for i in rows],
+                "invoiceIds": [inv.get('id')],
+                "bankTotal": total / 100,
+                "invoiceTotal": target / 100,
+                "amountDiff": diff / 100,
+                "confidence": self._confidence(diff, len(best), count),
+                "alternatives": count - 1,
+                "needsConfirmation": self._confidence(diff, len(best), count) < CONFIRM_BELOW,
+                "reason": reason,
+            }
+
+    def run(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields ("combination", record) as groups are settled, then ("summary", stats)."""
+        start = time.perf_counter()
+        run_deadline = start + self.time_budget if self.time_budget else None
+        counts = {"many_to_one": 0, "one_to_many": 0}
+        for pass_ in (self._many_to_one, self._one_to_many):
+            for record in pass_(run_deadline):
+                counts[record["matchType"]] += 1
+                yield "combination", record
+
+        yield "summary", {
+            "manyToOneCount": counts["many_to_one"],
+            "oneToManyCount": counts["one_to_many"],
+            "groupCount": self.stats["groups"],
+            "timeoutCount": self.stats["timeouts"],
+            "truncatedCount": self.stats["truncated"],
+            "budgetExhausted": run_deadline is not None and time.perf_counter() > run_deadline,
+            "remainingBankCount": self.bank_used.count(False),
+            "remainingInvoiceCount": self.invoice_used.count(False),
+            "duration": int((time.perf_counter() - start) * 1000),
+        }
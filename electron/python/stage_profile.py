@@ -0,0 +1,163 @@
+"""
+Per-stage timing for InvoiceParser (`main.py parse --profile`).
+
+StageTimer lives in whichever process parses a file and collects one
+{stage: ms} dict per file. StageReport lives in the batch parent and folds
+those dicts into a latency histogram per stage plus the slowest files.
+
+When profiling is off the parser uses NULL_STAGE, a shared no-op context
+manager, so the instrumented code paths cost one attribute check each.
+"""
+import heapq
+import os
+import sys
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional, Tuple
+
+NULL_STAGE = nullcontext()
+
+# Upper bucket bounds in ms; the last bucket is open-ended
+HISTOGRAM_BOUNDS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class _Stage:
+    __slots__ = ("timer", "name", "t0")
+
+    def __init__(self, timer: "StageTimer", name: str):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.t0
+        stages = self.timer.stages
+        stages[self.name] = stages.get(self.name, 0) + elapsed
+        return False
+
+
+class StageTimer:
+    """Stage durations of the file currently being parsed."""
+
+    def __init__(self):
+        self.stages: Dict[str, int] = {}
+
+    def stage(self, name: str) -> _Stage:
+        return _Stage(self, name)
+
+    def reset(self):
+        self.stages = {}
+
+    def snapshot(self) -> Dict[str, float]:
+        """Stage -> ms for the current file."""
+        return {name: round(ns / 1e6, 3) for name, ns in self.stages.items()}
+
+
+class StageReport:
+    """Batch-level aggregation of per-file stage timings."""
+
+    def __init__(self, slowest_n: int = 10):
+        self.slowest_n = slowest_n
+        self.histograms: Dict[str, List[int]] = {}
+        self.totals: Dict[str, float] = {}
+        self.maxima: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._slowest: List[Tuple[float, int, str, Dict[str, float]]] = []
+        self._seq = 0
+        self._last: Optional[Dict[str, float]] = None
+
+    def add(self, file_name: str, stages: Dict[str, float]):
+        for name, ms in stages.items():
+            buckets = self.histograms.get(name)
+            if buckets is None:
+                buckets = self.histograms[name] = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+            buckets[bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self.totals[name] = self.totals.get(name, 0.0) + ms
+            if ms > self.maxima.get(name, 0.0):
+                self.maxima[name] = ms
+
+        # Min-heap of the N slowest files by total time
+        self._seq += 1
+        entry = (stages.get("total", 0.0), self._seq, file_name, stages)
+        if len(self._slowest) < self.slowest_n:
+            heapq.heappush(self._slowest, entry)
+        elif entry[0] > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+        self._last = stages
+
+    def take_last(self) -> Optional[Dict[str, float]]:
+        """Stages of the most recently added file, once (for its progress event)."""
+        last, self._last = self._last, None
+        return last
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b}" for b in HISTOGRAM_BOUNDS_MS] + [f">{HISTOGRAM_BOUNDS_MS[-1]}"]
+        stages = {}
+        for name in sorted(self.histograms, key=lambda n: self.totals[n], reverse=True):
+            stages[name] = {
+                "count": self.counts[name],
+                "total_ms": round(self.totals[name], 3),
+                "mean_ms": round(self.totals[name] / self.counts[name], 3),
+                "max_ms": round(self.maxima[name], 3),
+                "histogram_ms": {label: n for label, n in zip(labels, self.histograms[name]) if n},
+            }
+        slowest = sorted(self._slowest, reverse=True)
+        return {
+            "stages": stages,
+            "slowest": [{"file": f, "total_ms": total, "stages": s} for total, _, f, s in slowest],
+            "peak_memory_mb": peak_memory_mb(),
+        }
+
+
+def peak_memory_mb() -> Dict[str, Optional[float]]:
+    """Peak RSS of this process and of its largest reaped child (pool worker)."""
+    try:
+        import resource
+    except ImportError:
+        return {"parent": None, "workers": None}  # Windows
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB on Linux
+    parent = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return {"parent": round(parent, 1), "workers": round(children, 1) if children else None}
+
+
+class ProfileDump:
+    """Whole-run cProfile + tracemalloc capture of the current process."""
+
+    def __init__(self, out_dir: str, top: int = 50):
+        self.out_dir = out_dir
+        self.top = top
+        self._profiler = None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        tracemalloc.start()
+        self._profiler = cProfile.Profile()
+        self._profiler.enable()
+
+    def stop(self) -> Dict[str, str]:
+        """Write parse.pstats and tracemalloc.txt; returns their paths."""
+        import tracemalloc
+
+        self._profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        pstats_path = os.path.join(self.out_dir, "parse.pstats")
+        self._profiler.dump_stats(pstats_path)
+
+        malloc_path = os.path.join(self.out_dir, "tracemalloc.txt")
+        with open(malloc_path, "w", encoding="utf-8") as f:
+            f.write(f"traced current: {current / 1e6:.1f} MB, peak: {peak / 1e6:.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:self.top]:
+                f.write(f"{stat}\n")
+        return {"pstats": pstats_path, "tracemalloc": malloc_path}
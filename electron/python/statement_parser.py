@@ -0,0 +1,307 @@
+"""
+Streaming bank statement PDF parser for `main.py parse_statement`.
+
+Statements run to hundreds of pages, so nothing here holds more than one
+page: each page's layout objects are built (pdf_engine's slim object pass),
+its transaction rows are yielded, and the page cache plus its decoded
+content streams are released before the next page is touched.
+
+Columns are found once, from the first header row (field names follow
+BANK_FIELD_MAPPINGS in parseService.ts, with debit/credit/balance added),
+and reused for every later page:
+
+    ruled tables  - header cells give field -> cell index; tables on later
+                    pages without a header are read with the same map when
+                    they have the same number of columns
+    text layout   - header words give column x ranges; every later text
+                    line is cut into cells at the same x boundaries
+
+A header row repeated at the top of each page is recognised and skipped.
+Text-layout lines with content only under text columns are continuation
+lines of a wrapped cell and are appended to the previous transaction.
+"""
+import re
+import time
+from bisect import bisect_right
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pdfplumber
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from pdfplumber.page import Page
+
+import pdf_engine
+
+# Same names as BANK_FIELD_MAPPINGS in parseService.ts; '收入'/'支出' become
+# credit/debit here because statements usually carry both columns.
+STATEMENT_FIELDS: Dict[str, List[str]] = {
+    "transactionDate": ["交易日期", "日期", "记账日期", "交易时间", "Date", "Transaction Date"],
+    "payerName": ["对方户名", "交易对手", "付款人", "收款人", "对方名称", "Payer", "Counterparty"],
+    "payerAccount": ["对方账号", "对方账户", "账号", "Account"],
+    "amount": ["交易金额", "金额", "发生额", "Amount"],
+    "credit": ["收入", "收入金额", "贷方发生额", "贷方金额", "存入", "贷方", "Credit"],
+    "debit": ["支出", "支出金额", "借方发生额", "借方金额", "支取", "借方", "Debit"],
+    "balance": ["余额", "账户余额", "Balance"],
+    "remark": ["备注", "摘要", "附言", "用途", "Remark", "Memo"],
+    "transactionNo": ["流水号", "交易流水号", "凭证号", "Transaction No"],
+}
+TEXT_FIELDS = ("payerName", "payerAccount", "remark", "transactionNo")
+# Header needs a date, some amount column and at least this many known columns
+MIN_HEADER_FIELDS = 3
+# Text lines whose tops differ by less than this (pt) are one row
+LINE_TOLERANCE = 3
+
+_ALIASES = {alias.lower(): field for field, aliases in STATEMENT_FIELDS.items() for alias in aliases}
+_AMOUNT_JUNK = re.compile(r'[,，\s¥￥元]')
+_DATE = re.compile(r'(\d{4})[-/.年]?(\d{1,2})[-/.月]?(\d{1,2})')
+
+
+def _clean(cell: Any) -> str:
+    return re.sub(r'\s+', '', str(cell)) if cell is not None else ''
+
+
+def field_of(label: str) -> Optional[str]:
+    """Statement field for a header label: exact alias first, then the longest alias it contains."""
+    key = _clean(label).lower()
+    if not key:
+        return None
+    if key in _ALIASES:
+        return _ALIASES[key]
+    best = None
+    for alias, field in _ALIASES.items():
+        if len(alias) >= 2 and alias in key and (best is None or len(alias) > len(best[0])):
+            best = (alias, field)
+    return best[1] if best else None
+
+
+def parse_amount(value: Any) -> Optional[float]:
+    text = _AMOUNT_JUNK.sub('', str(value or ''))
+    if not text or text in ('-', '--'):
+        return None
+    negative = text.startswith('(') and text.endswith(')')
+    try:
+        amount = float(text.strip('()'))
+    except ValueError:
+        return None
+    return -amount if negative else amount
+
+
+def parse_date(value: Any) -> Optional[str]:
+    m = _DATE.search(str(value or ''))
+    if not m:
+        return None
+    try:
+        return datetime(int(m.group(1)), int(m.group(2)), int(m.group(3))).strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _header_fields(labels: List[str]) -> Optional[List[Optional[str]]]:
+    """Field per column if `labels` is a statement header row, else None."""
+    fields = [field_of(label) for label in labels]
+    found = {f for f in fields if f}
+    if ("transactionDate" in found and found & {"amount", "credit", "debit"}
+            and len(found) >= MIN_HEADER_FIELDS):
+        return fields
+    return None
+
+
+# ============================================
+# COLUMN LAYOUT (shared across pages)
+# ============================================
+
+class CellColumns:
+    """Ruled-table header: field per cell index."""
+    kind = "cells"
+
+    def __init__(self, fields: List[Optional[str]]):
+        self.fields = fields
+
+    def is_header(self, cells: List[Optional[str]]) -> bool:
+        return [field_of(c) for c in cells] == self.fields
+
+
+class WordColumns:
+    """Text-layout header: field per x range, split halfway between header labels."""
+    kind = "words"
+
+    def __init__(self, words: List[Dict[str, Any]], fields: List[Optional[str]]):
+        self.fields = fields
+        self.labels = [_clean(w["text"]) for w in words]
+        self.bounds = [(words[i]["x1"] + words[i + 1]["x0"]) / 2 for i in range(len(words) - 1)]
+
+    def split(self, words: List[Dict[str, Any]]) -> List[str]:
+        cells = [[] for _ in self.fields]
+        for w in words:
+            cells[bisect_right(self.bounds, (w["x0"] + w["x1"]) / 2)].append(w["text"])
+        return [" ".join(c) for c in cells]
+
+    def is_header(self, cells: List[str]) -> bool:
+        return [_clean(c) for c in cells] == self.labels
+
+
+def _continues(fields: List[Optional[str]], cells: List[str]) -> bool:
+    """A text line with content only under text columns (a wrapped name/remark)."""
+    filled = [f for f, c in zip(fields, cells) if c]
+    return bool(filled) and all(f in TEXT_FIELDS for f in filled)
+
+
+def _text_lines(words: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Words grouped into rows by top, each row left to right."""
+    lines: List[List[Dict[str, Any]]] = []
+    for w in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(w["top"] - lines[-1][0]["top"]) < LINE_TOLERANCE:
+            lines[-1].append(w)
+        else:
+            lines.append([w])
+    for line in lines:
+        line.sort(key=lambda w: w["x0"])
+    return lines
+
+
+# ============================================
+# PARSER
+# ============================================
+
+class StatementParser:
+    def __init__(self, income_only: bool = False):
+        self.income_only = income_only
+        self.columns = None
+        self.stats = {"pages": 0, "rows": 0, "skipped_rows": 0, "header_rows": 0}
+
+    def _record(self, fields: List[Optional[str]], cells: List[Any], page_number: int) -> Optional[dict]:
+        values: Dict[str, Any] = {}
+        for field, cell in zip(fields, cells):
+            if field and cell not in (None, ''):
+                text = str(cell).strip()
+                # Wrapped cells of ruled tables keep their line breaks
+                values[field] = text.replace('\n', '') if field in TEXT_FIELDS else text
+
+        date = parse_date(values.get("transactionDate"))
+        credit = parse_amount(values.get("credit"))
+        debit = parse_amount(values.get("debit"))
+        signed = parse_amount(values.get("amount"))
+        if credit:
+            amount, direction = abs(credit), "in"
+        elif debit:
+            amount, direction = abs(debit), "out"
+        elif signed:
+            amount, direction = abs(signed), "in" if signed > 0 else "out"
+        else:
+            amount = None
+        if not date or amount is None:
+            return None
+        return {
+            "page": page_number,
+            "transactionDate": date,
+            "payerName": values.get("payerName"),
+            "payerAccount": values.get("payerAccount"),
+            "amount": amount,
+            "direction": direction,
+            "balance": parse_amount(values.get("balance")),
+            "remark": values.get("remark"),
+            "transactionNo": values.get("transactionNo"),
+        }
+
+    def _table_rows(self, tables: List[pdf_engine.Table]) -> Iterator[Tuple[List[Optional[str]], List[Any]]]:
+        for table in tables:
+            for cells in table:
+                columns = self.columns
+                if columns is None or columns.kind != "cells" or len(cells) != len(columns.fields):
+                    fields = _header_fields(cells)
+                    if fields is not None:
+                        self.columns = CellColumns(fields)
+                        self.stats["header_rows"] += 1
+                    else:
+                        self.stats["skipped_rows"] += 1
+                    continue
+                if columns.is_header(cells):
+                    self.stats["header_rows"] += 1
+                    continue
+                yield columns.fields, cells
+
+    def _word_rows(self, page) -> Iterator[Tuple[List[Optional[str]], List[Any]]]:
+        for line in _text_lines(page.extract_words()):
+            columns = self.columns
+            if columns is None or columns.kind != "words":
+                fields = _header_fields([w["text"] for w in line])
+                if fields is not None:
+                    self.columns = WordColumns(line, fields)
+                    self.stats["header_rows"] += 1
+                continue
+            cells = columns.split(line)
+            if columns.is_header(cells):
+                self.stats["header_rows"] += 1
+                continue
+            yield columns.fields, cells
+
+    def _iter_page_objects(self, pdf) -> Iterator[Page]:
+        """
+        pdf.pages builds every Page up front and keeps them all; walk the page
+        tree lazily instead so only the current page is alive.
+        """
+        doctop = 0
+        for i, page_obj in enumerate(PDFPage.create_pages(pdf.doc)):
+            page = Page(pdf, page_obj, page_number=i + 1, initial_doctop=doctop)
+            doctop += page.height
+            yield page
+
+    @staticmethod
+    def _release(pdf, page):
+        """Drop the page's layout/object caches and its decoded content streams."""
+        page.flush_cache()
+        # pdfminer caches every resolved object (content streams decoded) for
+        # the document's lifetime; this page's streams are never read again.
+        for stream in page.page_obj.contents or []:
+            if getattr(stream, "objid", None) is not None:
+                pdf.doc._cached_objs.pop(stream.objid, None)
+        page.page_obj.contents = []
+
+    def iter_pages(self, file_path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yields ("transaction", row) as rows are read, ("progress", {...}) after
+        every page, then ("summary", stats).
+        """
+        start = time.perf_counter()
+        pending: Optional[dict] = None
+
+        with pdfplumber.open(file_path) as pdf:
+            total = resolve1(pdf.doc.catalog["Pages"]).get("Count")
+            for page in self._iter_page_objects(pdf):
+                try:
+                    objects = pdf_engine.load_page_objects(page)
+                    tables = pdf_engine.extract_tables(page) if ("line" in objects or "rect" in objects) else []
+                    rows = self._table_rows(tables) if tables else self._word_rows(page)
+                    for fields, cells in rows:
+                        record = self._record(fields, cells, page.page_number)
+                        if record is not None:
+                            if pending is not None:
+                                yield from self._emit(pending)
+                            pending = record
+                        elif not tables and pending is not None and _continues(fields, cells):
+                            # Wrapped text cell continuing the previous row
+                            for field, cell in zip(fields, cells):
+                                if cell:
+                                    pending[field] = (pending[field] or '') + cell.replace(' ', '')
+                        else:
+                            self.stats["skipped_rows"] += 1
+                finally:
+                    self._release(pdf, page)
+                self.stats["pages"] += 1
+                yield "progress", {"type": "progress", "current": page.page_number, "total": total,
+                                   "rows": self.stats["rows"]}
+
+        if pending is not None:
+            yield from self._emit(pending)
+        if self.columns is None:
+            self.stats["error"] = "No transaction header found"
+        self.stats["columns"] = [f for f in self.columns.fields if f] if self.columns else []
+        self.stats["duration"] = int((time.perf_counter() - start) * 1000)
+        yield "summary", self.stats
+
+    def _emit(self, record: dict) -> Iterator[Tuple[str, dict]]:
+        if self.income_only and record["direction"] != "in":
+            return
+        self.stats["rows"] += 1
+        yield "transaction", record
@@ -0,0 +1,281 @@
+"""
+OFD and XML e-invoice readers.
+
+全电/e-invoices are also delivered as XML (the 数电票 EInvoice schema or
+the older fpdm/fphm style) and as OFD, a zip of XML parts. Their fields are
+stored as data, so reading them takes a streaming XML pass instead of a
+pdfminer layout, and the result is the same InvoiceInfo the PDF parser
+produces (parse_source "xml" / "ofd").
+
+XML: every element is matched by local name against FIELD_TAGS; the first
+non-empty value per field wins (the invoice totals come before the item
+lines in both schemas). Elements are cleared as soon as they are read.
+
+OFD members are streamed out of the zip (nothing is extracted to disk) and
+merged in this order, later sources only filling gaps:
+    1. an invoice XML attached to the document (Attachs/*.xml, as issued
+       with 全电 invoices), read as above
+    2. the eInvoice custom tags (GB/T 33190): each tag points at text
+       objects (ObjectRef) on a page, whose TextCode is the value
+    3. DocInfo CustomData name/value pairs in OFD.xml
+"""
+import os
+import posixpath
+import re
+import zipfile
+from typing import IO, Dict, List, Optional, Set, Tuple, Union
+from xml.etree.ElementTree import ParseError, iterparse
+
+from models import InvoiceInfo
+
+STRUCTURED_EXTENSIONS = (".ofd", ".xml")
+
+# Element local name -> InvoiceInfo field. Covers the 数电票 EInvoice XML,
+# the older VAT e-invoice XML (pinyin initials) and the OFD eInvoice tags.
+FIELD_TAGS: Dict[str, str] = {
+    **dict.fromkeys(["InvoiceNumber", "InvoiceNo", "fphm", "FPHM"], "invoice_number"),
+    **dict.fromkeys(["InvoiceCode", "fpdm", "FPDM"], "invoice_code"),
+    **dict.fromkeys(["IssueTime", "IssueDate", "InvoiceDate", "kprq", "KPRQ"], "invoice_date"),
+    **dict.fromkeys(["SellerName", "xfmc", "XFMC", "xsfmc"], "seller_name"),
+    **dict.fromkeys(["SellerIdNum", "SellerTaxID", "SellerTaxId", "xfsbh", "XFSBH", "xsfnsrsbh"], "seller_tax_id"),
+    **dict.fromkeys(["BuyerName", "gfmc", "GFMC", "gmfmc"], "buyer_name"),
+    **dict.fromkeys(["BuyerIdNum", "BuyerTaxID", "BuyerTaxId", "gfsbh", "GFSBH", "gmfnsrsbh"], "buyer_tax_id"),
+    **dict.fromkeys(["TotalAmWithoutTax", "TaxExclusiveTotalAmount", "je", "hjje", "HJJE"], "amount"),
+    **dict.fromkeys(["TotalTaxAm", "TaxTotalAmount", "se", "hjse", "HJSE"], "tax_amount"),
+    **dict.fromkeys(["TotalTax-includedAmount", "TaxInclusiveTotalAmount", "jshj", "JSHJ"], "total_amount"),
+    **dict.fromkeys(["TotalTax-includedAmountInChinese", "jshjdx", "JSHJDX"], "total_amount_chinese"),
+    **dict.fromkeys(["ItemName", "xmmc", "XMMC"], "item_name"),
+    **dict.fromkeys(["TaxRate", "sl", "SL"], "tax_rate"),
+    **dict.fromkeys(["LabelName", "InvoiceType", "fplx"], "invoice_type"),
+    **dict.fromkeys(["Remark", "Note", "bz", "BZ"], "remark"),
+    **dict.fromkeys(["Drawer", "InvoiceClerk", "kpr", "KPR"], "issuer"),
+}
+
+# OFD DocInfo CustomData names (Chinese labels or the tag names above)
+CUSTOM_DATA_NAMES: Dict[str, str] = {
+    **FIELD_TAGS,
+    "发票号码": "invoice_number",
+    "发票代码": "invoice_code",
+    "开票日期": "invoice_date",
+    "销售方名称": "seller_name",
+    "销售方纳税人识别号": "seller_tax_id",
+    "购买方名称": "buyer_name",
+    "购买方纳税人识别号": "buyer_tax_id",
+    "合计金额": "amount",
+    "合计税额": "tax_amount",
+    "价税合计": "total_amount",
+}
+
+AMOUNT_FIELDS = ("amount", "tax_amount", "total_amount")
+_DATE = re.compile(r'(\d{4})\s*[-年/.]?\s*(\d{1,2})\s*[-月/.]?\s*(\d{1,2})')
+# "*category*name" as the tax authority writes item names
+_ITEM = re.compile(r'^\*([^*]*)\*(.+)$', re.S)
+
+
+def is_structured(file_name: str) -> bool:
+    return file_name.lower().endswith(STRUCTURED_EXTENSIONS)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def normalize_field(field: str, value: str):
+    """A raw tag value as the InvoiceInfo field holds it; None if it doesn't parse."""
+    value = value.strip()
+    if not value:
+        return None
+    if field in AMOUNT_FIELDS:
+        try:
+            return float(value.lstrip("¥￥").replace(",", ""))
+        except ValueError:
+            return None
+    if field == "invoice_date":
+        m = _DATE.search(value)
+        return f"{m.group(1)}-{m.group(2).zfill(2)}-{m.group(3).zfill(2)}" if m else None
+    if field == "tax_rate":
+        # "0.13" / "13" / "13%" -> "13%"; 免税 and the like stay as written
+        try:
+            rate = float(value.rstrip("%"))
+        except ValueError:
+            return value
+        if not value.endswith("%") and rate < 1:
+            rate *= 100
+        return f"{rate:g}%"
+    if field == "item_name":
+        # "*category*name" -> "category-name", as the PDF extractors write it
+        m = _ITEM.match(value)
+        if m:
+            category, name = m.group(1).strip(), m.group(2).strip()
+            return f"{category}-{name}" if category else name
+    return value
+
+
+def _set(values: Dict[str, object], field: Optional[str], raw: Optional[str]):
+    if field and field not in values and raw:
+        value = normalize_field(field, raw)
+        if value is not None:
+            values[field] = value
+
+
+def read_xml_fields(stream: IO[bytes]) -> Dict[str, object]:
+    values: Dict[str, object] = {}
+    for _, elem in iterparse(stream, events=("end",)):
+        _set(values, FIELD_TAGS.get(_local(elem.tag)), elem.text)
+        elem.clear()
+    return values
+
+
+# ============================================
+# OFD
+# ============================================
+
+def _join(base_member: str, loc: str) -> str:
+    """OFD locations are relative to the referencing part, or absolute from the package root."""
+    if loc.startswith("/"):
+        return loc.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_member), loc))
+
+
+def _locs(zf: zipfile.ZipFile, member: str, tags: Tuple[str, ...]) -> List[str]:
+    """Member paths named by <tag>loc</tag> elements of an OFD part."""
+    out = []
+    with zf.open(member) as f:
+        for _, elem in iterparse(f, events=("end",)):
+            if _local(elem.tag) in tags and elem.text and elem.text.strip():
+                out.append(_join(member, elem.text.strip()))
+            elem.clear()
+    return out
+
+
+def _ofd_root(zf: zipfile.ZipFile) -> Tuple[List[str], Dict[str, object]]:
+    """Document parts named by OFD.xml, plus its DocInfo CustomData fields."""
+    docs, custom = [], {}
+    with zf.open("OFD.xml") as f:
+        for _, elem in iterparse(f, events=("end",)):
+            name = _local(elem.tag)
+            if name == "DocRoot" and elem.text:
+                docs.append(elem.text.strip().lstrip("/"))
+            elif name == "CustomData":
+                _set(custom, CUSTOM_DATA_NAMES.get((elem.get("Name") or "").strip()), elem.text)
+            elem.clear()
+    return docs, custom
+
+
+def _tag_refs(zf: zipfile.ZipFile, member: str) -> Dict[str, List[str]]:
+    """field -> text object ids from an eInvoice custom tag part."""
+    refs: Dict[str, List[str]] = {}
+    path: List[str] = []
+    with zf.open(member) as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            name = _local(elem.tag)
+            if event == "start":
+                path.append(name)
+                continue
+            path.pop()
+            if name == "ObjectRef" and elem.text:
+                # Nearest enclosing element that names a field
+                field = next((FIELD_TAGS[p] for p in reversed(path) if p in FIELD_TAGS), None)
+                if field:
+                    refs.setdefault(field, []).append(elem.text.strip())
+            elem.clear()
+    return refs
+
+
+def _text_objects(zf: zipfile.ZipFile, members: List[str], wanted: Set[str]) -> Dict[str, str]:
+    texts: Dict[str, str] = {}
+    for member in members:
+        with zf.open(member) as f:
+            current = None
+            for event, elem in iterparse(f, events=("start", "end")):
+                name = _local(elem.tag)
+                if name == "TextObject":
+                    current = elem.get("ID") if event == "start" and elem.get("ID") in wanted else None
+                elif event == "end" and name == "TextCode" and current is not None:
+                    texts[current] = texts.get(current, "") + (elem.text or "")
+                if event == "end":
+                    elem.clear()
+        if len(texts) == len(wanted):
+            break
+    return texts
+
+
+def read_ofd_fields(source: Union[str, IO[bytes]]) -> Dict[str, object]:
+    values: Dict[str, object] = {}
+    with zipfile.ZipFile(source) as zf:
+        names = zf.namelist()
+        docs, custom = _ofd_root(zf)
+
+        # 1. Attached invoice XML
+        for member in names:
+            lower = member.lower()
+            if "/attachs/" in f"/{lower}" and lower.endswith(".xml") and not lower.endswith("attachments.xml"):
+                try:
+                    with zf.open(member) as f:
+                        for field, value in read_xml_fields(f).items():
+                            values.setdefault(field, value)
+                except ParseError:
+                    continue
+
+        # 2. Custom tags -> page text objects
+        for doc in docs:
+            if doc not in names:
+                continue
+            for index in _locs(zf, doc, ("CustomTags",)):
+                if index not in names:
+                    continue
+                refs: Dict[str, List[str]] = {}
+                for tag_file in _locs(zf, index, ("FileLoc",)):
+                    if tag_file in names:
+                        for field, ids in _tag_refs(zf, tag_file).items():
+                            refs.setdefault(field, ids)
+                missing = {f: ids for f, ids in refs.items() if f not in values}
+                if not missing:
+                    continue
+                doc_dir = posixpath.dirname(doc)
+                pages = [m for m in names if m.startswith(doc_dir + "/") and m.endswith("Content.xml")]
+                texts = _text_objects(zf, pages, {i for ids in missing.values() for i in ids})
+                for field, ids in missing.items():
+                    _set(values, field, "".join(texts.get(i, "") for i in ids))
+
+        # 3. DocInfo CustomData
+        for field, value in custom.items():
+            values.setdefault(field, value)
+    return values
+
+
+def read_structured_invoice(
+    file_path: str,
+    source: Union[str, IO[bytes], None] = None,
+) -> Tuple[bool, Optional[InvoiceInfo], Optional[str]]:
+    """
+    Same (ok, invoice, error) outcome as InvoiceParser.parse_single_invoice,
+    for .ofd / .xml files. source is an open stream (e.g. an archive member)
+    to read instead of file_path.
+    """
+    kind = "ofd" if file_path.lower().endswith(".ofd") else "xml"
+    source = file_path if source is None else source
+    try:
+        if kind == "ofd":
+            values = read_ofd_fields(source)
+        elif isinstance(source, str):
+            with open(source, "rb") as f:
+                values = read_xml_fields(f)
+        else:
+            values = read_xml_fields(source)
+    except (OSError, ParseError, zipfile.BadZipFile, KeyError) as e:
+        return False, None, f"Unreadable {kind.upper()}: {e}"
+
+    if not values.get("invoice_number") and not values.get("total_amount"):
+        return False, None, f"No invoice fields found in {kind.upper()}"
+
+    invoice = InvoiceInfo(file_path=file_path, file_name=os.path.basename(file_path), **values)
+    a, ta, t = invoice.amount, invoice.tax_amount, invoice.total_amount
+    if a and t and ta is None:
+        invoice.tax_amount = round(t - a, 2)
+    elif t and ta is not None and a is None:
+        invoice.amount = round(t - ta, 2)
+    elif a and ta is not None and t is None:
+        invoice.total_amount = round(a + ta, 2)
+    invoice.parse_source = kind
+    return True, invoice, None
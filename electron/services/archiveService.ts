@@ -129,7 +129,7 @@ export async function archiveBatch(batchId: string, preCreatedArchiveInfo?: { di
     if (fs.existsSync(invoiceFolder)) {
       try {
         const invoiceFiles = fs.readdirSync(invoiceFolder).filter(f => !f.startsWith('.') && !f.startsWith('~$'))
-        const supportedExts = ['.xlsx', '.xls', '.csv', '.pdf'] // Assuming same supported extensions for invoices
+        const supportedExts = ['.xlsx', '.xls', '.csv', '.pdf', '.ofd', '.xml', '.zip', '.eml'] // Invoice extensions plus OFD / XML e-invoices and bundles
 
         for (const file of invoiceFiles) {
           const ext = path.extname(file).toLowerCase()
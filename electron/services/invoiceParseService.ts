@@ -1,7 +1,7 @@
 /**
  * 发票 PDF 解析服务
  * 从 PDF 发票中提取结构化信息（使用 Python pdfplumber 脚本 + 实时进度）
- * 并支持批量解析和导出为 Excel（Python pandas）
+ * 并支持批量解析和导出为 Excel（Python openpyxl 流式写入）
  */
 import fs from 'node:fs'
 import path from 'node:path'
@@ -47,6 +47,9 @@ export interface DuplicateRecord {
     fileName: string
     invoiceNumber: string | null
     reason: string
+    // 首次出现该发票的批次与文件（跨批次去重索引 / 内容相同的文件）
+    firstBatchId?: string | null
+    firstFilePath?: string | null
 }
 
 /**
@@ -55,12 +58,20 @@ export interface DuplicateRecord {
 export interface BatchParseResult {
     success: boolean
     invoices: InvoiceInfo[]
-    errors: Array<{ filePath: string; error: string }>
+    // reason: timeout / oom / crash（超出单文件时限或内存上限时由 Python 端填写）
+    errors: Array<{ filePath: string; error: string; reason?: string | null }>
     duplicates: DuplicateRecord[]
     totalFiles: number
     successCount: number
     duplicateCount: number
     failCount: number
+    // 解析缓存命中 / 未命中数量
+    cacheHits?: number
+    cacheMisses?: number
+    // 各解析层级处理的文件数 (structured / identical / cache / metadata / template / layout)
+    tierCounts?: Record<string, number>
+    // 单文件耗时分位数 (p50/p90/p95/p99) 及超时 / 内存超限计数，用于调整时限
+    latency?: Record<string, any> | null
 }
 
 // 内部：Python 返回的数据结构（snake_case）
@@ -84,17 +95,36 @@ interface PythonInvoiceInfo {
     parse_source: string
 }
 
+interface PythonDuplicateRecord {
+    file_name: string
+    invoice_number: string | null
+    reason: string
+    first_batch_id?: string | null
+    first_file_path?: string | null
+}
+
 interface PythonBatchResult {
     success: boolean
     invoices: PythonInvoiceInfo[]
-    errors: Array<{ file_path: string; error: string }>
-    duplicates: Array<{ file_name: string; invoice_number: string | null; reason: string }>
+    errors: Array<{ file_path: string; error: string; reason?: string | null }>
+    duplicates: PythonDuplicateRecord[]
+    // parse --columnar：发票按字段分列返回（{字段: 值数组}），此时 invoices 为空
+    invoice_columns?: { [K in keyof PythonInvoiceInfo]: PythonInvoiceInfo[K][] } | null
     total_files: number
     success_count: number
     duplicate_count: number
     fail_count: number
+    cache_hits?: number
+    cache_misses?: number
+    tier_counts?: Record<string, number>
+    latency?: Record<string, any> | null
 }
 
+/**
+ * 单个 PDF 的解析时限（秒）：异常文件超时后记为 timeout 错误，批次继续
+ */
+const PARSE_FILE_TIMEOUT_SECONDS = 120;
+
 // ============================================
 // PDF 解析核心逻辑
 // ============================================
@@ -132,12 +162,12 @@ export async function batchParsePdfInvoices(
 
         console.log('[InvoiceParse] Starting Python script for folder:', folderPath);
 
-        const output = await pythonService.runScript('main.py', ['parse', '--folder', folderPath], (event) => {
+        const output = await pythonService.runScript('main.py', ['parse', '--folder', folderPath, '--columnar', '--file_timeout', String(PARSE_FILE_TIMEOUT_SECONDS)], (event) => {
             if (event.type === 'progress') {
                 onProgress?.(event.current, event.total, event.file);
             } else if (event.type === 'result') {
                 // Intercept result event if emited as event
-                console.log('[InvoiceParse] Received result event from Python, invoices:', event.data?.invoices?.length ?? 'N/A');
+                console.log('[InvoiceParse] Received result event from Python, invoices:', event.data?.success_count ?? 'N/A');
                 finalResult = event.data;
             } else {
                 console.log('[InvoiceParse] Unknown event type:', event.type, JSON.stringify(event).slice(0, 200));
@@ -188,6 +218,116 @@ export async function batchParsePdfInvoices(
     }
 }
 
+/**
+ * 流式解析文件夹中的 PDF 发票
+ * Python 端每解析完一个文件就输出一条 invoice / duplicate / error 记录，
+ * 发票按 chunkSize 分组交给 onInvoices（按到达顺序串行执行），无需等待整批结束。
+ * 返回值中 invoices 为空，只包含统计信息、错误和重复记录。
+ */
+export async function streamParsePdfInvoices(
+    folderPath: string,
+    onInvoices: (chunk: InvoiceInfo[]) => Promise<void>,
+    onProgress?: (current: number, total: number, fileName: string) => void,
+    chunkSize = 200,
+): Promise<BatchParseResult> {
+    const envStatus = await pythonService.checkEnvironment();
+    if (!envStatus.available) {
+        throw new Error(`Python 环境检查失败: ${envStatus.error || '缺少依赖'}`);
+    }
+
+    let chunk: InvoiceInfo[] = [];
+    // Chunks are handed over strictly in order; failures surface after the run
+    let sink: Promise<void> = Promise.resolve();
+    const flush = () => {
+        if (chunk.length === 0) return;
+        const ready = chunk;
+        chunk = [];
+        sink = sink.then(() => onInvoices(ready));
+    };
+
+    const errors: BatchParseResult['errors'] = [];
+    const duplicates: DuplicateRecord[] = [];
+    // Assigned inside the callback, so keep TS from narrowing it to null
+    let summary = null as PythonBatchResult | null;
+
+    await pythonService.runScript('main.py', [
+        'parse', '--folder', folderPath, '--stream', '--file_timeout', String(PARSE_FILE_TIMEOUT_SECONDS),
+        // 保存版面快照：解析规则升级后可用 reextract 重新提取，无需再读 PDF
+        '--snapshots',
+    ], (event) => {
+        if (event.type === 'progress') {
+            onProgress?.(event.current, event.total, event.file);
+        } else if (event.type === 'invoice') {
+            chunk.push(mapPythonInvoiceToTs(event.data));
+            if (chunk.length >= chunkSize) flush();
+        } else if (event.type === 'duplicate') {
+            duplicates.push(mapPythonDuplicateToTs(event.data));
+        } else if (event.type === 'error' && event.data) {
+            errors.push({ filePath: event.data.file_path, error: event.data.error, reason: event.data.reason });
+        } else if (event.type === 'summary') {
+            summary = event.data;
+        }
+    });
+
+    flush();
+    await sink;
+
+    if (!summary) {
+        throw new Error('Python 流式解析未返回汇总信息');
+    }
+    const result = mapPythonResultToTs({ ...summary, invoices: [], errors: [], duplicates: [] });
+    return { ...result, errors, duplicates };
+}
+
+function mapPythonInvoiceToTs(inv: PythonInvoiceInfo): InvoiceInfo {
+    return {
+        filePath: inv.file_path,
+        fileName: inv.file_name,
+        invoiceCode: inv.invoice_code,
+        invoiceNumber: inv.invoice_number,
+        invoiceDate: inv.invoice_date,
+        buyerName: inv.buyer_name,
+        buyerTaxId: inv.buyer_tax_id,
+        sellerName: inv.seller_name,
+        sellerTaxId: inv.seller_tax_id,
+        amount: inv.amount,
+        taxAmount: inv.tax_amount,
+        totalAmount: inv.total_amount,
+        taxRate: inv.tax_rate,
+        invoiceType: inv.invoice_type,
+        itemName: inv.item_name,
+        totalAmountChinese: inv.total_amount_chinese,
+        parseSource: inv.parse_source
+    }
+}
+
+/**
+ * 将分列结果还原为逐条发票
+ */
+function rowsFromColumns(columns: NonNullable<PythonBatchResult['invoice_columns']>): PythonInvoiceInfo[] {
+    const fields = Object.keys(columns) as Array<keyof PythonInvoiceInfo>;
+    const count = fields.length > 0 ? columns[fields[0]].length : 0;
+    const rows: PythonInvoiceInfo[] = new Array(count);
+    for (let i = 0; i < count; i++) {
+        const row = {} as Record<string, unknown>;
+        for (const field of fields) {
+            row[field] = columns[field][i];
+        }
+        rows[i] = row as unknown as PythonInvoiceInfo;
+    }
+    return rows;
+}
+
+function mapPythonDuplicateToTs(d: PythonDuplicateRecord): DuplicateRecord {
+    return {
+        fileName: d.file_name,
+        invoiceNumber: d.invoice_number,
+        reason: d.reason,
+        firstBatchId: d.first_batch_id,
+        firstFilePath: d.first_file_path
+    }
+}
+
 function mapPythonResultToTs(pyResult: PythonBatchResult): BatchParseResult {
     return {
         success: pyResult.success,
@@ -195,34 +335,18 @@ function mapPythonResultToTs(pyResult: PythonBatchResult): BatchParseResult {
         successCount: pyResult.success_count,
         duplicateCount: pyResult.duplicate_count,
         failCount: pyResult.fail_count,
-        invoices: pyResult.invoices.map(inv => ({
-            filePath: inv.file_path,
-            fileName: inv.file_name,
-            invoiceCode: inv.invoice_code,
-            invoiceNumber: inv.invoice_number,
-            invoiceDate: inv.invoice_date,
-            buyerName: inv.buyer_name,
-            buyerTaxId: inv.buyer_tax_id,
-            sellerName: inv.seller_name,
-            sellerTaxId: inv.seller_tax_id,
-            amount: inv.amount,
-            taxAmount: inv.tax_amount,
-            totalAmount: inv.total_amount,
-            taxRate: inv.tax_rate,
-            invoiceType: inv.invoice_type,
-            itemName: inv.item_name,
-            totalAmountChinese: inv.total_amount_chinese,
-            parseSource: inv.parse_source
-        })),
+        cacheHits: pyResult.cache_hits,
+        cacheMisses: pyResult.cache_misses,
+        tierCounts: pyResult.tier_counts,
+        latency: pyResult.latency,
+        invoices: (pyResult.invoice_columns ? rowsFromColumns(pyResult.invoice_columns) : pyResult.invoices)
+            .map(mapPythonInvoiceToTs),
         errors: pyResult.errors.map(e => ({
             filePath: e.file_path,
-            error: e.error
+            error: e.error,
+            reason: e.reason
         })),
-        duplicates: pyResult.duplicates.map(d => ({
-            fileName: d.file_name,
-            invoiceNumber: d.invoice_number,
-            reason: d.reason
-        }))
+        duplicates: pyResult.duplicates.map(mapPythonDuplicateToTs)
     }
 }
 
@@ -230,110 +354,160 @@ function mapPythonResultToTs(pyResult: PythonBatchResult): BatchParseResult {
 // Excel 导出
 // ============================================
 
+type ExcelExportResult = { success: boolean; filePath?: string; error?: string }
+
 /**
- * 将发票数据导出为 Excel 文件
+ * 运行中的 Excel 导出进程：发票以 NDJSON 逐块写入 stdin，
+ * Python 端（openpyxl 流式写入）边读边写，finish() 后返回导出结果
  */
-export async function exportInvoicesToExcel(
-    invoices: InvoiceInfo[],
-    outputPath: string,
-): Promise<{ success: boolean; filePath?: string; error?: string }> {
-    // 1. Check Python environment
-    const envStatus = await pythonService.checkEnvironment();
-    if (!envStatus.available) {
-        return { success: false, error: `Python 环境检查失败: ${envStatus.error}` };
-    }
+interface ExcelExportProcess {
+    write: (invoices: InvoiceInfo[]) => Promise<void>
+    finish: () => Promise<ExcelExportResult>
+    abort: () => void
+}
 
-    try {
-        // Convert TS objects to Python-friendly dicts (mostly snake_case)
-        const pythonInvoices = invoices.map(inv => ({
-            file_path: inv.filePath,
-            file_name: inv.fileName,
-            invoice_code: inv.invoiceCode,
-            invoice_number: inv.invoiceNumber,
-            invoice_date: inv.invoiceDate,
-            buyer_name: inv.buyerName,
-            buyer_tax_id: inv.buyerTaxId,
-            seller_name: inv.sellerName,
-            seller_tax_id: inv.sellerTaxId,
-            amount: inv.amount,
-            tax_amount: inv.taxAmount,
-            total_amount: inv.totalAmount,
-            tax_rate: inv.taxRate,
-            invoice_type: inv.invoiceType,
-            item_name: inv.itemName,
-            total_amount_chinese: inv.totalAmountChinese,
-            parse_source: inv.parseSource
-        }));
-
-        const { spawn } = await import('node:child_process');
-        const { app } = await import('electron');
-
-        // Resolve Python path - check venv first, then fallback to system python3
-        let scriptDir: string;
-        if (app.isPackaged) {
-            scriptDir = path.join(globalThis.process.resourcesPath, 'python');
-        } else {
-            scriptDir = path.join(globalThis.process.cwd(), 'electron/python');
-        }
+function toPythonInvoice(inv: InvoiceInfo): PythonInvoiceInfo {
+    // Convert TS objects to Python-friendly dicts (mostly snake_case)
+    return {
+        file_path: inv.filePath,
+        file_name: inv.fileName,
+        invoice_code: inv.invoiceCode,
+        invoice_number: inv.invoiceNumber,
+        invoice_date: inv.invoiceDate,
+        buyer_name: inv.buyerName,
+        buyer_tax_id: inv.buyerTaxId,
+        seller_name: inv.sellerName,
+        seller_tax_id: inv.sellerTaxId,
+        amount: inv.amount,
+        tax_amount: inv.taxAmount,
+        total_amount: inv.totalAmount,
+        tax_rate: inv.taxRate,
+        invoice_type: inv.invoiceType,
+        item_name: inv.itemName,
+        total_amount_chinese: inv.totalAmountChinese,
+        parse_source: inv.parseSource
+    };
+}
 
-        // Resolve Python executable from unified service logic.
-        // Packaged app must use bundled Python, never fallback to system python.
-        const pyPath = pythonService.getPythonExecutable();
-        if (!pyPath) {
-            return { success: false, error: '打包环境缺少内置 Python 运行时（resources/python/.venv）' };
-        }
+/**
+ * 启动 main.py export 进程（调用前需已检查 Python 环境）
+ */
+async function spawnExcelExport(outputPath: string): Promise<ExcelExportProcess> {
+    const { spawn } = await import('node:child_process');
+    const { once } = await import('node:events');
+    const { app } = await import('electron');
+
+    // Resolve Python path - check venv first, then fallback to system python3
+    let scriptDir: string;
+    if (app.isPackaged) {
+        scriptDir = path.join(globalThis.process.resourcesPath, 'python');
+    } else {
+        scriptDir = path.join(globalThis.process.cwd(), 'electron/python');
+    }
 
-        const scriptFile = path.join(scriptDir, 'main.py');
-        if (!fs.existsSync(scriptFile)) {
-            return { success: false, error: `Python script not found at ${scriptFile}` };
-        }
+    // Resolve Python executable from unified service logic.
+    // Packaged app must use bundled Python, never fallback to system python.
+    const pyPath = pythonService.getPythonExecutable();
+    if (!pyPath) {
+        throw new Error('打包环境缺少内置 Python 运行时（resources/python/.venv）');
+    }
 
-        console.log(`[ExportExcel] Running: ${pyPath} ${scriptFile} export --output ${outputPath}`);
+    const scriptFile = path.join(scriptDir, 'main.py');
+    if (!fs.existsSync(scriptFile)) {
+        throw new Error(`Python script not found at ${scriptFile}`);
+    }
 
-        return new Promise((resolve, _reject) => {
-            const child = spawn(pyPath, [scriptFile, 'export', '--output', outputPath]);
+    console.log(`[ExportExcel] Running: ${pyPath} ${scriptFile} export --output ${outputPath}`);
 
-            let stdout = '';
-            let stderr = '';
+    const child = spawn(pyPath, [scriptFile, 'export', '--output', outputPath]);
 
-            child.stdout.on('data', d => stdout += d.toString());
-            child.stderr.on('data', d => stderr += d.toString());
+    let stdout = '';
+    let stderr = '';
+    child.stdout.on('data', d => stdout += d.toString());
+    child.stderr.on('data', d => stderr += d.toString());
+    // EPIPE if the exporter exits early; the exit code reports the failure
+    child.stdin.on('error', (err) => console.warn('[ExportExcel] stdin error:', err.message));
 
-            child.on('close', code => {
-                if (stderr) {
-                    console.warn('[ExportExcel] stderr:', stderr.slice(0, 500));
-                }
-                if (code !== 0) {
-                    resolve({ success: false, error: stderr || `Exited with code ${code}` });
-                } else {
-                    try {
-                        const res = JSON.parse(stdout);
-                        if (res.success) resolve({ success: true, filePath: res.file_path });
-                        else resolve({ success: false, error: res.message });
-                    } catch (e) {
-                        resolve({ success: false, error: "Invalid JSON response from Python" });
-                    }
+    const done = new Promise<ExcelExportResult>((resolve) => {
+        child.on('close', code => {
+            if (stderr) {
+                console.warn('[ExportExcel] stderr:', stderr.slice(0, 500));
+            }
+            if (code !== 0) {
+                resolve({ success: false, error: stderr || `Exited with code ${code}` });
+            } else {
+                try {
+                    const res = JSON.parse(stdout);
+                    if (res.success) resolve({ success: true, filePath: res.file_path });
+                    else resolve({ success: false, error: res.message });
+                } catch (e) {
+                    resolve({ success: false, error: "Invalid JSON response from Python" });
                 }
-            });
+            }
+        });
 
-            child.on('error', (err) => {
-                console.error('[ExportExcel] Spawn error:', err);
-                resolve({ success: false, error: err.message });
-            });
+        child.on('error', (err) => {
+            console.error('[ExportExcel] Spawn error:', err);
+            resolve({ success: false, error: err.message });
+        });
+    });
 
-            // Write invoice data to stdin
-            child.stdin.write(JSON.stringify(pythonInvoices));
+    return {
+        write: async (invoices) => {
+            if (invoices.length === 0 || child.stdin.destroyed) return;
+            const lines = invoices.map(inv => JSON.stringify(toPythonInvoice(inv))).join('\n') + '\n';
+            // Let the pipe drain before the next chunk; later chunks wait in streamParsePdfInvoices' queue
+            if (!child.stdin.write(lines)) {
+                await Promise.race([once(child.stdin, 'drain'), done]);
+            }
+        },
+        finish: () => {
             child.stdin.end();
-        });
+            return done;
+        },
+        abort: () => {
+            child.kill();
+            void done.then(() => fs.rmSync(outputPath, { force: true }));
+        },
+    };
+}
 
-    } catch (error: any) {
-        console.error('[ExportExcel] Error:', error);
-        return { success: false, error: error.message };
+/**
+ * 流式解析文件夹并导出为 Excel
+ * 解析出的发票按块直接写入导出进程，解析与写 Excel 同时进行，
+ * 主进程不保留整批发票。没有成功解析任何发票时不生成文件。
+ */
+export async function parseAndExportInvoicesToExcel(
+    folderPath: string,
+    outputPath: string,
+    onProgress?: (current: number, total: number, fileName: string) => void,
+): Promise<ExcelExportResult & { parseResult: BatchParseResult }> {
+    // Assigned inside the callback, so keep TS from narrowing it to null
+    let exporter = null as ExcelExportProcess | null;
+    let parseResult: BatchParseResult;
+    try {
+        parseResult = await streamParsePdfInvoices(folderPath, async (chunk) => {
+            if (!exporter) {
+                exporter = await spawnExcelExport(outputPath);
+            }
+            await exporter.write(chunk);
+        }, onProgress);
+    } catch (error) {
+        exporter?.abort();
+        throw error;
     }
+
+    if (!exporter) {
+        return { success: false, error: '没有成功解析任何发票', parseResult };
+    }
+    return { ...(await exporter.finish()), parseResult };
 }
 
+// 解析器支持的发票文件：PDF、OFD / XML 结构化电子发票，以及按成员解析的 zip / eml 包
+const INVOICE_FILE_EXTS = ['.pdf', '.ofd', '.xml', '.zip', '.eml']
+
 /**
- * 扫描文件夹中的 PDF 文件列表
+ * 扫描文件夹中的发票文件列表（PDF / OFD / XML / zip / eml）
  */
 export function scanPdfFiles(folderPath: string): {
     success: boolean
@@ -347,7 +521,7 @@ export function scanPdfFiles(folderPath: string): {
 
         const entries = fs.readdirSync(folderPath, { withFileTypes: true })
         const pdfFiles = entries
-            .filter(entry => entry.isFile() && path.extname(entry.name).toLowerCase() === '.pdf' && !entry.name.startsWith('.'))
+            .filter(entry => entry.isFile() && INVOICE_FILE_EXTS.includes(path.extname(entry.name).toLowerCase()) && !entry.name.startsWith('.'))
             .map(entry => {
                 const fullPath = path.join(folderPath, entry.name)
                 const stat = fs.statSync(fullPath)
@@ -402,6 +576,13 @@ export async function repairBrokenInvoices(
     let repaired = 0;
     let failed = 0;
 
+    // 一次请求并行提取全部文本（紧凑模式：压缩空白、去掉样板行，购销方/金额/明细排在前面）
+    const readablePaths = brokenInvoices
+        .map(inv => inv.sourceFilePath)
+        .filter((p): p is string => !!p && fs.existsSync(p));
+    onProgress?.(0, brokenInvoices.length, '正在提取发票文本...');
+    const rawTexts = await pythonService.extractTexts(readablePaths, { compact: true });
+
     for (let i = 0; i < brokenInvoices.length; i++) {
         const inv = brokenInvoices[i];
         onProgress?.(i + 1, brokenInvoices.length, `正在修复: ${path.basename(inv.sourceFilePath || '未知文件')}`);
@@ -414,7 +595,7 @@ export async function repairBrokenInvoices(
 
         try {
             // 2. Extract raw text
-            const rawText = await pythonService.extractText(inv.sourceFilePath);
+            const rawText = rawTexts.get(inv.sourceFilePath) ?? '';
             if (!rawText || rawText.length < 50) {
                 console.warn(`[AI Repair] insufficient text extracted for ${inv.sourceFilePath}`);
                 failed++;
@@ -1,6 +1,6 @@
 
 import { app } from 'electron';
-import { exec, spawn } from 'node:child_process';
+import { ChildProcessWithoutNullStreams, exec, spawn } from 'node:child_process';
 import fs from 'node:fs';
 import path from 'node:path';
 
@@ -14,10 +14,40 @@ export interface PythonEnvStatus {
 
 export type ProgressCallback = (data: any) => void;
 
+export interface ExtractTextOptions {
+    /** Character budget of the returned text (default 3000) */
+    maxChars?: number;
+    /** Squeeze whitespace/boilerplate and put buyer/seller, amounts and items first */
+    compact?: boolean;
+}
+
+/**
+ * Per-file records streamed by `main.py parse --stream`. Like progress
+ * events they go to the callback only and are never buffered, so stdout
+ * memory stays flat however large the batch is.
+ */
+function isStreamEvent(event: any): boolean {
+    return event.type === 'progress'
+        || event.type === 'invoice'
+        || event.type === 'duplicate'
+        || (event.type === 'error' && event.data !== undefined);
+}
+
+interface PendingRequest {
+    resolve: (data: any) => void;
+    reject: (err: Error) => void;
+    onProgress?: ProgressCallback;
+}
+
 export class PythonService {
     private pythonPath: string = 'python3'; // Default, could be configurable
     private scriptPath: string | null = null;
 
+    // Resident `main.py serve` worker (lazily started, reused across calls)
+    private daemon: ChildProcessWithoutNullStreams | null = null;
+    private daemonPending = new Map<string, PendingRequest>();
+    private daemonSeq = 0;
+
     constructor() {
         // Delay path resolution to avoid accessing 'app' before ready if possible, 
         // or just resolve defaults.
@@ -179,6 +209,9 @@ export class PythonService {
             console.log(`[PythonService] Running: ${this.pythonPath} ${scriptFile} ${args.join(' ')}`);
 
             const process = spawn(this.pythonPath, [scriptFile, ...args]);
+            // Python writes UTF-8 JSON lines; decode across chunk boundaries so
+            // a multi-byte character split between two chunks stays intact
+            process.stdout.setEncoding('utf8');
 
             let stdoutBuffer = '';
             let lineBuffer = ''; // Buffer for incomplete lines across chunks
@@ -201,7 +234,7 @@ export class PythonService {
                     if (onProgress) {
                         try {
                             const event = JSON.parse(line);
-                            if (event.type === 'progress') {
+                            if (isStreamEvent(event)) {
                                 // Known streaming event, pass to callback
                                 onProgress(event);
                             } else {
@@ -234,7 +267,7 @@ export class PythonService {
                     if (onProgress) {
                         try {
                             const event = JSON.parse(line);
-                            if (event.type === 'progress') {
+                            if (isStreamEvent(event)) {
                                 onProgress(event);
                             } else {
                                 onProgress(event);
@@ -265,16 +298,131 @@ export class PythonService {
             });
         });
     }
-    async extractText(filePath: string): Promise<string> {
-        return this.runScript('main.py', ['extract_text', '--file', filePath])
-            .then((output: string) => {
-                const res: any = JSON.parse(output);
-                if (res.success) {
-                    return res.text;
-                } else {
-                    throw new Error(res.message);
+    /**
+     * Start the resident Python worker if it is not running yet
+     */
+    private ensureDaemon(): ChildProcessWithoutNullStreams {
+        if (this.daemon) return this.daemon;
+
+        const resolvedPython = this.resolvePythonPath();
+        if (!resolvedPython) {
+            throw new Error('Bundled Python runtime not found in packaged app');
+        }
+
+        const scriptFile = path.join(this.getScriptPath(), 'main.py');
+        console.log(`[PythonService] Starting worker: ${this.pythonPath} ${scriptFile} serve`);
+
+        const child = spawn(this.pythonPath, [scriptFile, 'serve']);
+        this.daemon = child;
+        child.stdout.setEncoding('utf8');
+
+        let lineBuffer = '';
+        child.stdout.on('data', (data) => {
+            lineBuffer += data.toString();
+
+            let newlineIndex;
+            while ((newlineIndex = lineBuffer.indexOf('\n')) !== -1) {
+                const line = lineBuffer.slice(0, newlineIndex).trim();
+                lineBuffer = lineBuffer.slice(newlineIndex + 1);
+                if (!line) continue;
+
+                let message: any;
+                try {
+                    message = JSON.parse(line);
+                } catch (e) {
+                    console.warn('[PythonService] worker emitted non-JSON line:', line.slice(0, 200));
+                    continue;
                 }
-            });
+
+                const pending = message.id != null ? this.daemonPending.get(String(message.id)) : undefined;
+                if (!pending) continue;
+
+                if (message.type === 'progress') {
+                    pending.onProgress?.(message);
+                } else if (message.type === 'result') {
+                    this.daemonPending.delete(String(message.id));
+                    pending.resolve(message.data);
+                } else if (message.type === 'error') {
+                    this.daemonPending.delete(String(message.id));
+                    pending.reject(new Error(message.message));
+                }
+            }
+        });
+
+        child.stderr.on('data', (data) => {
+            console.warn('[PythonService] worker stderr:', data.toString().slice(0, 500));
+        });
+
+        const failAll = (err: Error) => {
+            if (this.daemon === child) this.daemon = null;
+            for (const pending of this.daemonPending.values()) {
+                pending.reject(err);
+            }
+            this.daemonPending.clear();
+        };
+
+        child.on('close', (code) => failAll(new Error(`Python worker exited with code ${code}`)));
+        child.on('error', (err) => {
+            console.error('[PythonService] Failed to spawn Python worker:', err);
+            failAll(err);
+        });
+
+        return child;
+    }
+
+    /**
+     * Send a request to the resident Python worker
+     * @param command serve command (parse_file / parse_folder / extract_text / export)
+     * @param params Command parameters
+     * @param onProgress Callback for progress events tagged with this request
+     */
+    async request<T = any>(command: string, params: Record<string, any>, onProgress?: ProgressCallback): Promise<T> {
+        const child = this.ensureDaemon();
+        const id = String(++this.daemonSeq);
+
+        return new Promise<T>((resolve, reject) => {
+            this.daemonPending.set(id, { resolve, reject, onProgress });
+            child.stdin.write(JSON.stringify({ id, command, params }) + '\n');
+        });
+    }
+
+    /**
+     * Stop the resident worker (closing stdin lets it finish in-flight work and exit)
+     */
+    stopDaemon(): void {
+        if (!this.daemon) return;
+        this.daemon.stdin.end();
+        this.daemon = null;
+    }
+
+    async extractText(filePath: string, options: ExtractTextOptions = {}): Promise<string> {
+        const res: any = await this.request('extract_text', {
+            file: filePath,
+            max_chars: options.maxChars ?? 3000,
+            compact: options.compact ?? false,
+        });
+        if (res.success) {
+            return res.text;
+        }
+        throw new Error(res.message);
+    }
+
+    /**
+     * Extract text of many PDFs in one request, in parallel on the worker pool
+     * @returns file path -> text ('' for files that could not be read)
+     */
+    async extractTexts(filePaths: string[], options: ExtractTextOptions = {}, onProgress?: ProgressCallback): Promise<Map<string, string>> {
+        const texts = new Map<string, string>();
+        if (filePaths.length === 0) return texts;
+        const res: any = await this.request('extract_text', {
+            files: filePaths,
+            max_chars: options.maxChars ?? 3000,
+            compact: options.compact ?? false,
+        }, onProgress);
+        for (const record of res.results) {
+            texts.set(record.file_path, record.success ? record.text : '');
+        }
+        return texts;
     }
 
     async runMain(command: string, args: string[]): Promise<any> {